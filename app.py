@@ -1,72 +1,45 @@
-import json
 import streamlit as st
 import folium
 from streamlit_folium import st_folium
 
+from dataset_registry import REGISTRY
+from line_store import LineStore
+from osm_geojson import SPAIN_BBOX
+from osm_voltage import class_style
+from tile_proxy import tile_url
+
 # -------------------------------------------------
 # 1. Load the GeoJSON with the transmission lines
 # -------------------------------------------------
-@st.cache_data
+def load_line_store(path: str = "line.geojson") -> LineStore:
+    # flat coordinate arrays, memory-mapped from line.store/ (built once per file)
+    return REGISTRY.get_file(("line_store", path), path, lambda: LineStore.load_or_build(path, bbox=SPAIN_BBOX))
+
+
 def load_lines(path: str = "line.geojson"):
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    return data
+    # one FeatureCollection per server process, shared read-only by all sessions
+    return REGISTRY.get_file(("line_geojson", path), path, lambda: load_line_store(path).to_geojson())
 
 
 # -------------------------------------------------
 # 2. Styling function (color by voltage)
 # -------------------------------------------------
 def style_function(feature):
+    # voltage_class is parsed once per feature when the line store is built
+    # (highest value of tags like "400000;220000")
     props = feature.get("properties", {})
-    voltage_raw = str(props.get("voltage", ""))
-
-    # Handle things like "400000" or "400000;220000"
-    try:
-        v = int(voltage_raw.split(";")[0])
-    except Exception:
-        v = None
-
-    color = "#666666"
-    weight = 2
-
-    if v is not None:
-        if v >= 380000:
-            color = "#d73027"   # red
-            weight = 3
-        elif v >= 220000:
-            color = "#fc8d59"   # orange
-            weight = 2.5
-        elif v >= 110000:
-            color = "#4575b4"   # blue
-
-    return {
-        "color": color,
-        "weight": weight,
-        "opacity": 0.9,
-    }
+    return class_style(props.get("voltage_class"))
 
 
 # -------------------------------------------------
 # 3. Helper: find a reasonable center for the map
 # -------------------------------------------------
-def compute_center(geojson_dict):
-    coords = []
-    for feat in geojson_dict.get("features", []):
-        geom = feat.get("geometry", {})
-        if geom.get("type") == "LineString":
-            coords.extend(geom.get("coordinates", []))
-        elif geom.get("type") == "MultiLineString":
-            for line in geom.get("coordinates", []):
-                coords.extend(line)
-
-    if not coords:
+def compute_center(store: LineStore):
+    center = store.center()
+    if center is None:
         # Fallback: Spain center
         return 40.0, -3.5
-
-    # GeoJSON is [lon, lat]
-    lats = [c[1] for c in coords]
-    lons = [c[0] for c in coords]
-    return sum(lats) / len(lats), sum(lons) / len(lons)
+    return center
 
 
 # -------------------------------------------------
@@ -84,12 +57,13 @@ def main():
     #     st.stop()
     # data = json.load(uploaded)
 
-    center_lat, center_lon = compute_center(data)
+    center_lat, center_lon = compute_center(load_line_store("line.geojson"))
 
     m = folium.Map(
         location=[center_lat, center_lon],
         zoom_start=6,
-        tiles="OpenStreetMap"
+        tiles=tile_url("osm"),
+        attr="&copy; OpenStreetMap contributors",
     )
 
     # Add the GeoJSON layer
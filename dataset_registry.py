@@ -0,0 +1,150 @@
+"""
+Process-wide registry of loaded datasets, shared by every Streamlit session.
+
+`st.cache_data` pickles its return value and hands each caller a fresh copy,
+so every session of a multi-user deployment ends up holding its own copy of
+the substation table, the line GeoJSON and the REE frames. The registry keeps
+exactly one instance per dataset instead:
+
+* tables are stored with read-only NumPy columns and handed out as shallow
+  (zero-copy) DataFrames – with pandas copy-on-write a caller that adds or
+  changes columns only changes its own view;
+* other payloads (GeoJSON dicts, marker lists) are shared as-is and must be
+  treated as read-only by callers;
+* each entry carries a version (the source file's mtime/size stamp, or a
+  content hash for uploads); a changed version reloads the entry on the next
+  get(), and invalidate() drops entries explicitly.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from map_cache import file_version
+
+MAX_ENTRIES = 64
+
+
+def freeze_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """DataFrame whose NumPy-backed columns are read-only (no copy where pandas allows it)."""
+    frozen = {}
+    for col in df.columns:
+        values = df[col]
+        arr = values.to_numpy() if isinstance(values.dtype, np.dtype) else None
+        if arr is not None and arr.dtype != object:
+            arr = arr.view()
+            arr.flags.writeable = False
+            frozen[col] = pd.Series(arr, index=df.index, name=col, copy=False)
+        else:
+            frozen[col] = values
+    return pd.DataFrame(frozen, index=df.index, copy=False)
+
+
+class _Entry:
+    __slots__ = ("version", "value", "loaded_at", "load_seconds", "hits")
+
+    def __init__(self, version, value, load_seconds):
+        self.version = version
+        self.value = value
+        self.loaded_at = time.time()
+        self.load_seconds = load_seconds
+        self.hits = 0
+
+
+class DatasetRegistry:
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _drop_key_lock(self, key):
+        """Forget the load lock of a key without an entry (call with self._lock held)."""
+        lock = self._key_locks.get(key)
+        if lock is not None and not lock.locked() and key not in self._entries:
+            del self._key_locks[key]
+
+    def get(self, key, loader, version=None):
+        """
+        Shared value for `key`, loading it with `loader()` if it is missing or
+        its stored version differs from `version`. Concurrent callers of the
+        same key wait for one load instead of loading in parallel.
+        """
+        entry = self._lookup(key, version)
+        if entry is None:
+            try:
+                with self._key_lock(key):
+                    entry = self._lookup(key, version)   # loaded while we waited?
+                    if entry is None:
+                        t0 = time.perf_counter()
+                        value = loader()
+                        if isinstance(value, pd.DataFrame):
+                            value = freeze_frame(value)
+                        entry = _Entry(version, value, time.perf_counter() - t0)
+                        with self._lock:
+                            self._entries[key] = entry
+                            self._entries.move_to_end(key)
+                            while len(self._entries) > self.max_entries:
+                                evicted, _ = self._entries.popitem(last=False)
+                                self._drop_key_lock(evicted)
+            finally:
+                if entry is None:   # the loader failed
+                    with self._lock:
+                        self._drop_key_lock(key)
+
+        value = entry.value
+        if isinstance(value, pd.DataFrame):
+            return value.copy(deep=False)
+        return value
+
+    def get_file(self, key, path: str, loader):
+        """get() versioned by the stamp of the file at `path` (reloads when it changes on disk)."""
+        return self.get(key, loader, version=file_version(path))
+
+    def _lookup(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.version != version:
+                return None
+            entry.hits += 1
+            self._entries.move_to_end(key)
+            return entry
+
+    def version(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.version if entry is not None else None
+
+    def invalidate(self, predicate=None) -> int:
+        """Drop all entries, or those whose key matches `predicate(key)`; returns how many."""
+        with self._lock:
+            keys = [k for k in self._entries if predicate is None or predicate(k)]
+            for k in keys:
+                del self._entries[k]
+                self._drop_key_lock(k)
+            return len(keys)
+
+    def stats(self) -> pd.DataFrame:
+        with self._lock:
+            rows = [
+                {
+                    "dataset": str(k),
+                    "version": str(e.version),
+                    "hits": e.hits,
+                    "load_s": round(e.load_seconds, 3),
+                    "loaded": time.strftime("%H:%M:%S", time.localtime(e.loaded_at)),
+                }
+                for k, e in self._entries.items()
+            ]
+        return pd.DataFrame(rows, columns=["dataset", "version", "hits", "load_s", "loaded"])
+
+
+# one registry per server process (modules are imported once and shared by all sessions)
+REGISTRY = DatasetRegistry()
@@ -5,6 +5,8 @@ from folium.plugins import MarkerCluster
 from streamlit_folium import st_folium
 from pyproj import Transformer
 
+from tile_proxy import tile_url
+
 # ========= UTM -> WGS84 (Spain, zone 30N) =========
 utm30_to_wgs84 = Transformer.from_crs("EPSG:32630", "EPSG:4326", always_xy=True)
 
@@ -154,7 +156,7 @@ else:
 
     # --- Base OSM ---
     folium.TileLayer(
-        tiles="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png",
+        tiles=tile_url("osm"),
         name="OpenStreetMap",
         attr="&copy; OpenStreetMap contributors",
     ).add_to(m)
@@ -162,7 +164,7 @@ else:
     # --- OpenInfraMap grid tiles ---
     # Main power grid (HV/MV/LV lines, substations, plants)
     folium.TileLayer(
-        tiles="https://tiles.openinframap.org/power/{z}/{x}/{y}.png",
+        tiles=tile_url("oim-power"),
         name="OpenInfraMap – Power",
         attr="&copy; OpenInfraMap, OpenStreetMap contributors",
         overlay=True,
@@ -171,7 +173,7 @@ else:
 
     # Low voltage grid (separate layer on OIM, optional)
     folium.TileLayer(
-        tiles="https://tiles.openinframap.org/power-lowvoltage/{z}/{x}/{y}.png",
+        tiles=tile_url("oim-lowvoltage"),
         name="OpenInfraMap – Low voltage",
         attr="&copy; OpenInfraMap, OpenStreetMap contributors",
         overlay=True,
@@ -180,7 +182,7 @@ else:
 
     # Substations only layer (optional – still raster, but useful)
     folium.TileLayer(
-        tiles="https://tiles.openinframap.org/substations/{z}/{x}/{y}.png",
+        tiles=tile_url("oim-substations"),
         name="OpenInfraMap – Substations",
         attr="&copy; OpenInfraMap, OpenStreetMap contributors",
         overlay=True,
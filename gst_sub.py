@@ -1,173 +1,150 @@
-import json
+import io
 import math
 
 import streamlit as st
 import pandas as pd
 import folium
-from folium.plugins import MarkerCluster
-from streamlit_folium import st_folium
-from pyproj import Transformer
 
-# ========= UTM -> WGS84 (Spain, zone 30N) =========
-utm30_to_wgs84 = Transformer.from_crs("EPSG:32630", "EPSG:4326", always_xy=True)
+from line_index import LineIndex, voltage_class_labels
+from map_layers import (
+    ALL_LAYERS,
+    DEFAULT_LAYERS,
+    LAYER_LINES,
+    LAYER_REE,
+    LAYER_SUBSTATIONS,
+    add_base_layer,
+    add_line_layer,
+    add_raster_overlays,
+    add_ree_layer,
+    add_substation_layer,
+    enrich_lines,
+    ree_markers,
+    ree_visibility_group,
+    substation_markers,
+)
+from line_store import LineStore
+from osm_geojson import SPAIN_BBOX, load_substation_table
+from osm_partitions import FeaturePartitions, classes_at_or_above
+from osm_voltage import VOLTAGE_CLASSES
+from map_cache import MapCache, bytes_version, cache_key, file_version, show_map
+from dataset_registry import REGISTRY
+from ingest_worker import current_manifest, ingested_ree_sources, load_ingested_table, read_artifact
+from proximity import ProximityIndex, filter_ree, ree_points, substation_points, summarize, transformer_points
+from ree_capacity import convert_spain_to_wgs84, keep_valid_coords, ree_columns
 
+# ========= Shared datasets =========
+# Loaded once per server process into dataset_registry.REGISTRY and handed to
+# every session without copying; each entry is versioned by its source file's
+# stamp, so editing a file on disk reloads it on the next rerun.
 
-def convert_spain_to_wgs84(df: pd.DataFrame, source_name: str | None = None) -> pd.DataFrame:
-    """
-    Convert standard REE-style Spain capacity file with
-    'Coordenada UTM X' / 'Coordenada UTM Y' to WGS84 lat/lon.
-    Creates 'lon_wgs', 'lat_wgs', and optional 'source_file'.
-    """
-    df = df.copy()
-    required_cols = ["Coordenada UTM X", "Coordenada UTM Y"]
-    for c in required_cols:
-        if c not in df.columns:
-            raise ValueError(f"Missing required column '{c}' in Spain file '{source_name or ''}'.")
+def load_substations(path: str) -> pd.DataFrame:
+    """Valid substations (known voltage) in the Spain bounding box, streamed from the GeoJSON."""
+    def load():
+        table = load_ingested_table(path, bbox=SPAIN_BBOX)   # published by ingest_worker.py
+        return table if table is not None else load_substation_table(path, bbox=SPAIN_BBOX)
 
-    df["Coordenada UTM X"] = pd.to_numeric(df["Coordenada UTM X"], errors="coerce")
-    df["Coordenada UTM Y"] = pd.to_numeric(df["Coordenada UTM Y"], errors="coerce")
+    return REGISTRY.get_file(("substations", path), path, load)
 
-    xs = df["Coordenada UTM X"].values
-    ys = df["Coordenada UTM Y"].values
-    lons, lats = utm30_to_wgs84.transform(xs, ys)
 
-    df["lon_wgs"] = lons
-    df["lat_wgs"] = lats
+def load_substation_partitions(path: str = "spain_substations.geojson") -> FeaturePartitions:
+    return REGISTRY.get_file(
+        ("substation_partitions", path), path, lambda: FeaturePartitions.from_table(load_substations(path))
+    )
 
-    if source_name is not None:
-        df["source_file"] = source_name
 
-    # keep only valid coords
-    df.loc[
-        ~(
-            (df["lat_wgs"].between(-90, 90))
-            & (df["lon_wgs"].between(-180, 180))
-        ),
-        ["lat_wgs", "lon_wgs"],
-    ] = pd.NA
+def build_substation_markers(path: str = "spain_substations.geojson"):
+    return REGISTRY.get_file(("substation_markers", path), path, lambda: substation_markers(load_substations(path)))
 
-    return df
 
+# ========= Transformers (for proximity search) =========
 
-# ========= Substations (GeoJSON) helpers =========
+def load_transformer_points(path: str = "transformers_with_coords.xlsx") -> pd.DataFrame:
+    return REGISTRY.get_file(("transformer_points", path), path, lambda: transformer_points(pd.read_excel(path)))
 
-@st.cache_data
-def load_substations(path: str):
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    return data
 
+def load_proximity_index(key: str, build) -> ProximityIndex:
+    """Proximity index shared by every session with the same data versions and OSM filters (`key`)."""
+    return REGISTRY.get(("proximity", key), build)
 
-def is_valid_feature(feature):
+
+def most_recent_click(map_state: dict | None, key: str = "grid_map_clicks") -> dict | None:
     """
-    Return True only if the feature has clean geometry + relevant info.
-    Filters OUT all substations where voltage is not known.
+    The newer of last_clicked / last_object_clicked: the one that changed since
+    the previous run (st_folium keeps both, so the older one can be stale).
     """
-    geom = feature.get("geometry")
-    if not geom:
-        return False
+    map_state = map_state or {}
+    clicks = st.session_state.setdefault(key, {"seen": {}, "latest": None})
+    for field in ("last_clicked", "last_object_clicked"):   # object clicks win a tie
+        value = map_state.get(field)
+        if value and value != clicks["seen"].get(field):
+            clicks["latest"] = value
+        clicks["seen"][field] = value
+    if not any(clicks["seen"].values()):   # new map component: nothing clicked yet
+        clicks["latest"] = None
+    return clicks["latest"]
 
-    if geom.get("type") != "Point":
-        return False
 
-    coords = geom.get("coordinates")
-    if not coords or len(coords) != 2:
-        return False
+# ========= Transmission lines (GeoJSON) helpers =========
 
-    lon, lat = coords
-    if (
-        lon is None or lat is None
-        or lon in ["", "N/A"] or lat in ["", "N/A"]
-    ):
-        return False
+def load_line_store(path: str = "line.geojson") -> LineStore:
+    """Memory-mapped line arrays (line.store/ next to the GeoJSON)."""
+    return REGISTRY.get_file(("line_store", path), path, lambda: LineStore.load_or_build(path, bbox=SPAIN_BBOX))
 
-    props = feature.get("properties", {})
-    name = props.get("name")
-    voltage = props.get("voltage")
-    operator = props.get("operator")
 
-    # require a non-empty voltage value
-    if not voltage:
-        return False
+def load_line_layer(path: str = "line.geojson"):
+    """line.geojson with voltage_kv + popup voltage label per feature, built once per file (read-only)."""
+    return REGISTRY.get_file(("line_layer", path), path, lambda: enrich_lines(load_line_store(path).to_geojson()))
 
-    # basic quality requirement
-    if not name and not operator:
-        return False
 
-    return True
+def load_line_partitions(path: str = "line.geojson") -> FeaturePartitions:
+    return REGISTRY.get_file(
+        ("line_partitions", path), path, lambda: FeaturePartitions.from_table(load_line_store(path).properties)
+    )
 
 
-# ========= Transmission lines (GeoJSON) helpers =========
+def load_filtered_line_layer(path: str, classes: tuple, operators: tuple):
+    """Only the line features in the selected voltage classes / operators (shares the feature dicts)."""
+    def build():
+        lines = load_line_layer(path)
+        positions = load_line_partitions(path).select(classes, operators)
+        if len(positions) == len(lines["features"]):
+            return lines
+        features = lines["features"]
+        return {"type": "FeatureCollection", "features": [features[i] for i in positions]}
+
+    return REGISTRY.get_file(("line_layer", path, classes, operators), path, build)
+
+
+def load_line_index(path: str = "line.geojson") -> LineIndex:
+    """Segment STRtree over line.geojson, persisted next to the file."""
+    return REGISTRY.get_file(("line_index", path), path, lambda: LineIndex.load_or_build(path, bbox=SPAIN_BBOX))
+
+
+def load_ree_file(name: str, data: bytes, version: str) -> pd.DataFrame:
+    """One converted REE upload, shared by every session that uploads the same bytes."""
+    return REGISTRY.get(
+        ("ree", version), lambda: convert_spain_to_wgs84(pd.read_excel(io.BytesIO(data)), source_name=name), version
+    )
+
+
+def load_ingested_ree(manifest: dict, name: str) -> pd.DataFrame:
+    """One REE export pre-parsed by ingest_worker.py (converted, numeric, valid coordinates)."""
+    artifact = manifest["sources"][name]["artifact"]
+    return REGISTRY.get(("ree_ingested", artifact), lambda: read_artifact(manifest, name), artifact)
+
+
+# ========= Cached layer payloads (only computed for layers that are switched on) =========
 
 @st.cache_data
-def load_lines(path: str = "line.geojson"):
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+def build_ree_markers(spain_df: pd.DataFrame, name_col, volt_col, cap_avail_col, cap_occ_col, prov_col, muni_col):
+    return ree_markers(spain_df, name_col, volt_col, cap_avail_col, cap_occ_col, prov_col, muni_col)
 
 
-def line_style_function(feature):
-    """Color OSM lines by voltage."""
-    props = feature.get("properties", {})
-    v_raw = str(props.get("voltage", ""))
+# ========= Serialized map cache (shared by all sessions of this process) =========
 
-    try:
-        v = int(v_raw.split(";")[0])   # handle "400000;220000"
-    except Exception:
-        v = None
-
-    color = "#666666"
-    weight = 2
-
-    if v is not None:
-        if v >= 380000:
-            color, weight = "#d73027", 3      # ~400 kV
-        elif v >= 220000:
-            color, weight = "#fc8d59", 2.5    # ~220 kV
-        elif v >= 110000:
-            color = "#4575b4"                 # ~110 kV
-
-    return {"color": color, "weight": weight, "opacity": 0.9}
-
-
-def build_line_popup_html(props: dict) -> str:
-    """Card-style popup for each transmission line."""
-    name = props.get("name", "Transmission line")
-    operator = props.get("operator", "Unknown")
-    voltage_raw = str(props.get("voltage", "Unknown"))
-    voltage_kv = props.get("voltage_kv")
-    circuits = props.get("circuits", "N/A")
-    cables = props.get("cables", "N/A")
-    freq = props.get("frequency", "N/A")
-
-    voltage_str = f"{voltage_kv:.1f} kV" if isinstance(voltage_kv, (int, float)) and not pd.isna(voltage_kv) else voltage_raw
-
-    popup_html = f"""
-    <div style="font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif;
-                width: 260px; padding: 8px 10px;">
-      <div style="font-size:16px; font-weight:600; margin-bottom:2px;">{name}</div>
-      <div style="font-size:12px; color:#666; margin-bottom:6px;">
-        ⚙️ Operator: {operator}
-      </div>
-      <div style="height:1px; background-color:#555; margin:4px 0 8px 0;"></div>
-
-      <div style="border-radius:8px; background:#f7f7f9; padding:8px; margin-bottom:6px;">
-        <div style="font-size:12px; font-weight:600; margin-bottom:4px;">
-          ⚡ Electrical characteristics
-        </div>
-        <div style="font-size:12px; color:#333;">
-          <b>Voltage:</b> {voltage_str}<br>
-          <b>Circuits:</b> {circuits}<br>
-          <b>Cables:</b> {cables}<br>
-          <b>Frequency:</b> {freq}
-        </div>
-      </div>
-
-      <div style="font-size:10px; color:#999;">
-        Data: OpenStreetMap / OpenInfraMap
-      </div>
-    </div>
-    """
-    return popup_html
+@st.cache_resource
+def get_map_cache() -> MapCache:
+    return MapCache(max_entries=16)
 
 
 # ========= Streamlit app =========
@@ -175,9 +152,75 @@ def build_line_popup_html(props: dict) -> str:
 st.set_page_config(page_title="Grid Screening Tool – Spain", layout="wide")
 st.title("🛰️ Ingrid Capacity – Grid Screening Tool")
 
-# ------ Sidebar: optional OSM line layer ------
-st.sidebar.header("🧩 Optional layers")
-show_lines = st.sidebar.checkbox("Show OSM transmission lines (line.geojson)", value=False)
+# ------ Sidebar: map layers (only selected layers are built and sent to the browser) ------
+st.sidebar.header("🧩 Map layers")
+selected_layers = st.sidebar.multiselect(
+    "Layers to build",
+    options=ALL_LAYERS,
+    default=DEFAULT_LAYERS,
+    help="Layers that are not selected are not built at all, which keeps the map fast.",
+)
+show_lines = LAYER_LINES in selected_layers
+live_updates = st.sidebar.checkbox(
+    "Keep map loaded while filtering",
+    value=True,
+    help="Slider changes only show/hide REE points instead of reloading the whole map.",
+)
+show_line_distance = st.sidebar.checkbox(
+    "Distance from connection points to nearest OSM line",
+    value=False,
+    help="Uses a spatial index over line.geojson (built once, cached on disk).",
+)
+
+# ------ Sidebar: OSM voltage class / operator filters (substations + lines) ------
+st.sidebar.header("⚡ OSM grid filters")
+osm_min_class = st.sidebar.select_slider(
+    "Minimum OSM voltage",
+    options=["All"] + [label for _, label, _, _ in reversed(VOLTAGE_CLASSES)],
+    value="All",
+    help="Only OSM substations and lines at or above this voltage class are sent to the map.",
+)
+osm_classes = tuple(classes_at_or_above(None if osm_min_class == "All" else osm_min_class))
+
+# line operators only when the line layer is on: otherwise line.geojson is never parsed
+operator_sources = [(load_substation_partitions, "spain_substations.geojson")]
+if show_lines:
+    operator_sources.append((load_line_partitions, "line.geojson"))
+
+osm_operator_options = []
+for partitions_loader, path in operator_sources:
+    try:
+        for op in partitions_loader(path).operators():
+            if op not in osm_operator_options:
+                osm_operator_options.append(op)
+    except FileNotFoundError:
+        pass   # missing file: reported where the layer is loaded
+
+osm_operators = tuple(
+    st.sidebar.multiselect(
+        "OSM operators",
+        options=osm_operator_options,
+        default=[],
+        help="Leave empty to show every operator.",
+    )
+)
+
+st.sidebar.header("📍 Proximity search")
+search_radius_km = st.sidebar.slider(
+    "Radius around clicked location (km)",
+    min_value=1,
+    max_value=100,
+    value=25,
+    help="Click anywhere on the map to list REE nodes, OSM substations and transformers nearby.",
+)
+
+with st.sidebar.expander("🗄️ Shared data"):
+    st.caption("Datasets loaded once per server and shared by every session.")
+    st.dataframe(REGISTRY.stats(), hide_index=True)
+    if st.button("Reload data from disk"):
+        REGISTRY.invalidate()
+        get_map_cache().clear()
+        st.rerun()
 
 st.markdown(
     """
@@ -185,7 +228,7 @@ This app shows on **one map**:
 
 - 🔌 **Spain grid connection points** (one or more REE capacity exports)  
 - 🏭 **OSM substations** from `spain_substations.geojson` (only with known voltage)  
-- 🌐 **OSM transmission lines** from `line.geojson` (optional checkbox, click line → card popup)  
+- 🌐 **OSM transmission lines** from `line.geojson` (optional layer, click line → card popup)  
 - On top of **OpenStreetMap + OpenInfraMap** grid tiles
 """
 )
@@ -199,22 +242,43 @@ spain_files = st.sidebar.file_uploader(
     accept_multiple_files=True,
 )
 
+ingest_manifest = current_manifest()
+ingested_files = []
+if ingested_ree_sources(ingest_manifest):
+    ingested_files = st.sidebar.multiselect(
+        "…or pick already ingested exports",
+        options=ingested_ree_sources(ingest_manifest),
+        default=[],
+        help=f"Parsed in the background by ingest_worker.py (version {ingest_manifest['version']}).",
+    )
+
 spain_df = None
+spain_df_all = None   # before slider filters (base map in live-update mode)
 name_col = volt_col = cap_avail_col = cap_occ_col = None
 prov_col = muni_col = None
+vsel = min_cap = None
+data_versions = []
 
-if spain_files:
+if spain_files or ingested_files:
     converted = []
     read_errors = []
 
-    for f in spain_files:
+    for name in ingested_files:
+        try:
+            data_versions.append(ingest_manifest["sources"][name]["artifact"])
+            converted.append(load_ingested_ree(ingest_manifest, name))
+        except Exception as e:
+            read_errors.append(f"{name}: {e}")
+
+    for f in spain_files or []:
         try:
-            df_raw = pd.read_excel(f)
-            if df_raw.empty:
+            version = bytes_version(f.name, f.getvalue())
+            data_versions.append(version)
+            df_conv = load_ree_file(f.name, f.getvalue(), version)
+            if df_conv.empty:
                 read_errors.append(f"{f.name}: file is empty")
                 continue
 
-            df_conv = convert_spain_to_wgs84(df_raw, source_name=f.name)
             converted.append(df_conv)
 
         except Exception as e:
@@ -226,14 +290,14 @@ if spain_files:
     if converted:
         spain_df = pd.concat(converted, ignore_index=True)
 
-        # Typical REE column names
-        cols = spain_df.columns
-        name_col       = "Nombre Subestación"         if "Nombre Subestación"         in cols else None
-        volt_col       = "Nivel de Tensión (kV)"      if "Nivel de Tensión (kV)"      in cols else None
-        cap_avail_col  = "Capacidad disponible (MW)"  if "Capacidad disponible (MW)"  in cols else None
-        cap_occ_col    = "Capacidad ocupada (MW)"     if "Capacidad ocupada (MW)"     in cols else None
-        prov_col       = "Provincia"                  if "Provincia"                  in cols else None
-        muni_col       = "Municipio"                  if "Municipio"                  in cols else None
+        # Typical REE column names (None where missing)
+        cols = ree_columns(spain_df)
+        name_col       = cols["name"]
+        volt_col       = cols["voltage"]
+        cap_avail_col  = cols["cap_avail"]
+        cap_occ_col    = cols["cap_occ"]
+        prov_col       = cols["province"]
+        muni_col       = cols["municipality"]
 
         # Make numeric for filtering
         if volt_col:
@@ -243,6 +307,8 @@ if spain_files:
         if cap_occ_col:
             spain_df[cap_occ_col] = pd.to_numeric(spain_df[cap_occ_col], errors="coerce")
 
+        spain_df_all = spain_df
+
         st.sidebar.subheader("Filters")
 
         # ------- Voltage filter (robust) -------
@@ -287,23 +353,21 @@ if spain_files:
                 )
 
         # final coordinate clean
-        spain_df = spain_df.dropna(subset=["lat_wgs", "lon_wgs"])
-        spain_df = spain_df[
-            (spain_df["lat_wgs"].between(-90, 90))
-            & (spain_df["lon_wgs"].between(-180, 180))
-        ]
+        spain_df = keep_valid_coords(spain_df)
+        spain_df_all = keep_valid_coords(spain_df_all)
 
 # ------ Load substations GeoJSON ------
 substations = None
+substation_positions = None
 substation_coords = []
 
 try:
     substations = load_substations("spain_substations.geojson")
-    for feature in substations.get("features", []):
-        if not is_valid_feature(feature):
-            continue
-        lon, lat = feature["geometry"]["coordinates"]
-        substation_coords.append((lat, lon))
+    substation_positions = load_substation_partitions("spain_substations.geojson").select(
+        osm_classes, osm_operators
+    )
+    substations = substations.iloc[substation_positions]
+    substation_coords = list(zip(substations["lat"], substations["lon"]))
 except FileNotFoundError:
     st.warning("spain_substations.geojson not found in this folder. OSM substation layer will be missing.")
 except Exception as e:
@@ -311,19 +375,48 @@ except Exception as e:
     substations = None
     substation_coords = []
 
+# ------ Optional: distance from REE points to nearest OSM line (per voltage class) ------
+line_distance_df = None
+
+if show_line_distance and spain_df is not None and not spain_df.empty:
+    try:
+        line_index = load_line_index("line.geojson")
+        lats = spain_df["lat_wgs"].to_numpy(dtype="float64")
+        lons = spain_df["lon_wgs"].to_numpy(dtype="float64")
+
+        line_distance_df = pd.DataFrame(
+            {
+                "Connection point": spain_df[name_col].to_numpy() if name_col else "",
+                "Voltage (kV)": spain_df[volt_col].to_numpy() if volt_col else None,
+            }
+        )
+        for label in voltage_class_labels():
+            nearest = line_index.nearest(lats, lons, label)
+            line_distance_df[f"Nearest {label} line (km)"] = nearest["distance_km"].round(2).to_numpy()
+    except FileNotFoundError:
+        st.warning("line.geojson not found in this folder. Line distances are not available.")
+    except Exception as e:
+        st.warning(f"Could not compute distances to line.geojson: {e}")
+
 # ------ Metrics ------
 st.metric("REE connection points on map (all files)", len(spain_df) if spain_df is not None else 0)
 st.metric("OSM substations (known voltage) on map", len(substation_coords))
 
 st.subheader("🗺️ Grid Screening Map")
 
+# In live-update mode the base map holds every REE point and slider changes only
+# send the ids to show/hide: the map key does not change, so the serialized base
+# map is a cache hit and the only thing built per rerun is the small delta script
+# (a few ms), while the map (tiles, lines, substations) stays mounted.
+ree_map_df = spain_df_all if live_updates else spain_df
+
 # ------ Decide center based on all available coords ------
 all_lat = []
 all_lon = []
 
-if spain_df is not None and not spain_df.empty:
-    all_lat.extend(spain_df["lat_wgs"].tolist())
-    all_lon.extend(spain_df["lon_wgs"].tolist())
+if ree_map_df is not None and not ree_map_df.empty:
+    all_lat.extend(ree_map_df["lat_wgs"].tolist())
+    all_lon.extend(ree_map_df["lon_wgs"].tolist())
 
 for lat, lon in substation_coords:
     all_lat.append(lat)
@@ -336,227 +429,122 @@ else:
     center_lat = sum(all_lat) / len(all_lat)
     center_lon = sum(all_lon) / len(all_lon)
 
-# ------ Build Folium map ------
-m = folium.Map(
-    location=[center_lat, center_lon],
-    zoom_start=7,
-    tiles=None,
+# ------ Build Folium map (or reuse an identical one serialized earlier) ------
+def build_map() -> folium.Map:
+    m = folium.Map(
+        location=[center_lat, center_lon],
+        zoom_start=7,
+        tiles=None,
+    )
+
+    add_base_layer(m)
+
+    # OpenInfraMap tiles + Natura 2000 – protected areas (hard constraints)
+    add_raster_overlays(m, selected_layers)
+
+    # ------ Optional: OSM transmission lines (GeoJSON, card popup) ------
+    if show_lines:
+        try:
+            add_line_layer(m, load_filtered_line_layer("line.geojson", osm_classes, osm_operators))
+        except FileNotFoundError:
+            st.warning("line.geojson not found in this folder. Transmission line layer will be missing.")
+        except Exception as e:
+            st.warning(f"Could not load line.geojson: {e}")
+
+    # ------ Add OSM substations (blue circles, only known voltage) ------
+    if substations is not None and LAYER_SUBSTATIONS in selected_layers:
+        markers = build_substation_markers("spain_substations.geojson")
+        add_substation_layer(m, [markers[i] for i in substation_positions])
+
+    # ------ Add REE capacity points (red plug markers with "card" popup, ALL FILES) ------
+    if ree_map_df is not None and not ree_map_df.empty and LAYER_REE in selected_layers:
+        add_ree_layer(
+            m,
+            build_ree_markers(ree_map_df, name_col, volt_col, cap_avail_col, cap_occ_col, prov_col, muni_col),
+            registry=live_updates,
+        )
+
+    # ------ Layer control ------
+    folium.LayerControl().add_to(m)
+    return m
+
+
+map_key = cache_key(
+    ree_files=sorted(data_versions),
+    substations=file_version("spain_substations.geojson"),
+    lines=file_version("line.geojson") if show_lines else None,
+    osm_classes=osm_classes,
+    osm_operators=sorted(osm_operators),
+    voltage_range=None if live_updates else vsel,
+    min_capacity=None if live_updates else min_cap,
+    layers=sorted(selected_layers),
+    live_updates=live_updates,
+)
+cached_map = get_map_cache().get_or_build(map_key, build_map)
+
+ree_delta = None
+if live_updates and LAYER_REE in selected_layers and spain_df_all is not None and not spain_df_all.empty:
+    ree_delta = ree_visibility_group(spain_df_all.index, spain_df.index)
+
+# ------ Render (a cache hit only serializes the REE delta, not the map) ------
+map_state = show_map(
+    cached_map,
+    key="grid_map",
+    width=900,
+    height=650,
+    returned_objects=["last_clicked", "last_object_clicked"],
+    feature_group_to_add=ree_delta,
 )
 
-# Base OSM
-folium.TileLayer(
-    tiles="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png",
-    name="OpenStreetMap",
-    attr="&copy; OpenStreetMap contributors",
-).add_to(m)
-
-# OpenInfraMap tiles
-folium.TileLayer(
-    tiles="https://tiles.openinframap.org/power/{z}/{x}/{y}.png",
-    name="OpenInfraMap – Power",
-    attr="&copy; OpenInfraMap, OpenStreetMap contributors",
-    overlay=True,
-    control=True,
-).add_to(m)
-
-folium.TileLayer(
-    tiles="https://tiles.openinframap.org/power-lowvoltage/{z}/{x}/{y}.png",
-    name="OpenInfraMap – Low voltage",
-    attr="&copy; OpenInfraMap, OpenStreetMap contributors",
-    overlay=True,
-    control=True,
-).add_to(m)
-
-folium.TileLayer(
-    tiles="https://tiles.openinframap.org/substations/{z}/{x}/{y}.png",
-    name="OpenInfraMap – Substations tile",
-    attr="&copy; OpenInfraMap, OpenStreetMap contributors",
-    overlay=True,
-    control=True,
-).add_to(m)
-
-
-# =======================================================
-# 1) Natura 2000 – protected areas (hard constraints)
-# =======================================================
-folium.WmsTileLayer(
-    url="https://wms.mapama.gob.es/sig/Biodiversidad/RedNatura",
-    name="Natura 2000 (protected sites)",
-    layers="PS.ProtectedSite",        # from service metadata
-    fmt="image/png",
-    transparent=True,
-    version="1.3.0",
-    attr="© MITECO – Red Natura 2000",
-    overlay=True,
-    control=True,
-).add_to(m)
-
-# =======================================================
-# 2) Land cover / land use (forest, wetlands, etc.)
-#    (example: Soil Occupation / CORINE+SIOSE WMS)
-# =======================================================
-
-
-# ------ Optional: OSM transmission lines (GeoJSON, card popup) ------
-if show_lines:
-    try:
-        lines = load_lines("line.geojson")
-
-        # Enrich properties with voltage in kV and prebuild popup html
-        for feat in lines.get("features", []):
-            props = feat.get("properties", {})
-            v_raw = str(props.get("voltage", ""))
-            try:
-                props["voltage_kv"] = int(v_raw.split(";")[0]) / 1000.0
-            except Exception:
-                props["voltage_kv"] = None
-
-            props["popup_html"] = build_line_popup_html(props)
-
-        folium.GeoJson(
-            lines,
-            name="OSM transmission lines",
-            style_function=line_style_function,
-            highlight_function=lambda feat: {
-                "weight": 5,
-                "color": "#000000",
-                "opacity": 1.0,
-            },
-            # NO tooltip -> no annoying hover box, only click popup
-            popup=folium.GeoJsonPopup(
-                fields=["popup_html"],
-                aliases=[""],
-                localize=True,
-                labels=False,
-                max_width=320,
-            ),
-        ).add_to(m)
+# ------ Proximity search around the clicked location ------
+clicked = most_recent_click(map_state)
 
-    except FileNotFoundError:
-        st.warning("line.geojson not found in this folder. Transmission line layer will be missing.")
-    except Exception as e:
-        st.warning(f"Could not load line.geojson: {e}")
-
-# ------ Add OSM substations (blue circles, only known voltage) ------
-if substations is not None:
-    fg_sub = folium.FeatureGroup(name="OSM Substations (GeoJSON, known voltage)")
-    for feature in substations.get("features", []):
-        if not is_valid_feature(feature):
-            continue
-
-        props = feature.get("properties", {})
-        lon, lat = feature["geometry"]["coordinates"]
-
-        name = props.get("name", "Substation")
-        voltage = props.get("voltage", "Unknown")
-        operator = props.get("operator", "Unknown")
-
-        popup_html = f"""
-        <b>{name}</b><br>
-        Voltage: {voltage}<br>
-        Operator: {operator}
-        """
-
-        folium.CircleMarker(
-            location=[lat, lon],
-            radius=5,
-            fill=True,
-            fill_opacity=0.85,
-            popup=popup_html,
-            tooltip=name,
-            color="blue",
-        ).add_to(fg_sub)
-
-    fg_sub.add_to(m)
-
-# ------ Add REE capacity points (red plug markers with "card" popup, ALL FILES) ------
-if spain_df is not None and not spain_df.empty:
-    fg_es = folium.FeatureGroup(name="Spain connection points (REE, all files)")
-    mc_es = MarkerCluster().add_to(fg_es)
-
-    for _, row in spain_df.iterrows():
-        lat = float(row["lat_wgs"])
-        lon = float(row["lon_wgs"])
-
-        source = row.get("source_file", "")
-
-        # Base info
-        name = row.get(name_col, "Connection point") if name_col else "Connection point"
-        province = row.get(prov_col, "") if prov_col else ""
-        municipio = row.get(muni_col, "") if muni_col else ""
-        location_text = ", ".join([x for x in [province, municipio] if x])
-
-        voltage_val = row.get(volt_col, "") if volt_col else ""
-        voltage_str = f"{voltage_val} kV" if voltage_val != "" else "N/A"
-
-        # Capacity info
-        avail = float(row.get(cap_avail_col, 0) or 0) if cap_avail_col else 0.0
-        occ   = float(row.get(cap_occ_col, 0) or 0)   if cap_occ_col   else 0.0
-        total = avail + occ
-
-        util_pct = (occ / total * 100) if total > 0 else 0.0
-        util_str = f"{util_pct:.1f}%"
-        avail_str = f"{avail:.1f} MW"
-        occ_str   = f"{occ:.1f} MW"
-        no_capacity_flag = (avail <= 0.0)
-
-        # Card-style popup HTML
-        popup_html = f"""
-        <div style="font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif;
-                    width: 260px; padding: 8px 10px;">
-          <div style="font-size:16px; font-weight:600; margin-bottom:2px;">{name}</div>
-          <div style="font-size:12px; color:#666; margin-bottom:3px;">
-            📍 {location_text if location_text else "Spain"}
-          </div>
-          <div style="font-size:10px; color:#999; margin-bottom:6px;">
-            Source: {source}
-          </div>
-          <div style="height:1px; background-color:#e33; margin:4px 0 8px 0;"></div>
-
-          <div style="display:flex; justify-content:space-between; margin-bottom:10px;">
-            <div style="flex:1; margin-right:4px; padding:6px 4px; background:#f7f7f9; border-radius:6px; text-align:center;">
-              <div style="font-size:10px; color:#888; text-transform:uppercase;">Voltage level</div>
-              <div style="font-size:18px; font-weight:600; margin-top:2px;">{voltage_str}</div>
-            </div>
-            <div style="flex:1; margin-left:4px; padding:6px 4px; background:#f7f7f9; border-radius:6px; text-align:center;">
-              <div style="font-size:10px; color:#888; text-transform:uppercase;">Utilization</div>
-              <div style="font-size:18px; font-weight:600; margin-top:2px;">{util_str}</div>
-            </div>
-          </div>
-
-          <div style="border-radius:8px; border-left:4px solid #ffb01f; background:#fff8e6; padding:8px 8px 6px 8px; margin-bottom:8px;">
-            <div style="font-size:12px; font-weight:600; margin-bottom:4px;">
-              ⚡ Capacity Overview (MW)
-            </div>
-            <div style="display:flex; justify-content:space-between; font-size:12px;">
-              <div>
-                <div style="color:#666;">Available Capacity</div>
-                <div style="font-size:14px; font-weight:600; color:{'#d00' if no_capacity_flag else '#111'};">
-                  {avail_str}
-                </div>
-                {"<div style='font-size:10px; color:#d00;'>● No usable capacity</div>" if no_capacity_flag else ""}
-              </div>
-              <div style="text-align:right;">
-                <div style="color:#666;">Occupied Capacity</div>
-                <div style="font-size:14px; font-weight:600; color:#d33636;">
-                  {occ_str}
-                </div>
-                <div style="font-size:10px; color:#888;">{util_str} utilized</div>
-              </div>
-            </div>
-          </div>
-        </div>
-        """
-
-        folium.Marker(
-            location=[lat, lon],
-            popup=folium.Popup(popup_html, max_width=300),
-            tooltip=name,
-            icon=folium.Icon(icon="plug", prefix="fa", color="red"),
-        ).add_to(mc_es)
-
-    fg_es.add_to(m)
-
-# ------ Layer control + render ------
-folium.LayerControl().add_to(m)
-st_folium(m, width=900, height=650)
+if clicked:
+    def build_proximity_index():
+        try:
+            transformers_layer = load_transformer_points("transformers_with_coords.xlsx")
+        except Exception:
+            transformers_layer = None
+        return ProximityIndex.from_layers(
+            ree_points(spain_df_all, name_col, volt_col, cap_avail_col),
+            substation_points(substations),
+            transformers_layer,
+        )
+
+    prox_key = cache_key(
+        ree_files=sorted(data_versions),
+        substations=file_version("spain_substations.geojson"),
+        transformers=file_version("transformers_with_coords.xlsx"),
+        osm_classes=osm_classes,
+        osm_operators=sorted(osm_operators),
+    )
+    # one index per data / OSM filter version; the sliders only mask the result
+    prox_index = load_proximity_index(prox_key, build_proximity_index)
+    nearby = filter_ree(
+        prox_index.query(clicked["lat"], clicked["lng"], search_radius_km),
+        voltage_range=vsel,
+        min_capacity=min_cap,
+    )
+    summary = summarize(nearby)
+
+    st.subheader(
+        f"📍 Within {search_radius_km} km of ({clicked['lat']:.4f}, {clicked['lng']:.4f})"
+    )
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Available capacity (REE, MW)", f"{summary['total_available_mw']:.1f}")
+    c2.metric("REE connection points", summary["counts"].get("REE connection point", 0))
+    c3.metric("OSM substations", summary["counts"].get("OSM substation", 0))
+    c4.metric("Transformers", summary["counts"].get("Transformer", 0))
+
+    if nearby.empty:
+        st.info("Nothing found within the selected radius.")
+    else:
+        st.dataframe(
+            nearby[["layer", "name", "distance_km", "voltage_kv", "available_mw", "detail"]].round(
+                {"distance_km": 2, "voltage_kv": 1, "available_mw": 1}
+            )
+        )
+
+if line_distance_df is not None:
+    with st.expander("📏 Distance to nearest OSM transmission line", expanded=False):
+        st.dataframe(line_distance_df)
@@ -0,0 +1,143 @@
+"""
+Case-insensitive "contains" search over a few ID columns, backed by an n-gram
+index held in sorted arrays.
+
+Every 1-, 2- and 3-character substring of the (lowercased) IDs is packed,
+together with the row it occurs in, into one int64 key; a single sort of the
+keys yields each gram's sorted row list. A query of up to 3 characters is a
+single lookup; a longer query intersects the row lists of its
+trigrams and only those candidates are checked with a real substring test.
+Nothing scans the full table per keystroke.
+"""
+
+import numpy as np
+import pandas as pd
+
+GRAM = 3
+_SEP = "\x1f"   # between fields, so no n-gram spans two IDs
+_KEY_BITS = 63  # non-negative int64 keys
+
+
+def _encode(chars: np.ndarray, bits: int) -> np.ndarray:
+    """Pack (..., n<=3) alphabet codes (0 = padding) into int64 gram codes."""
+    code = np.zeros(chars.shape[:-1], dtype="int64")
+    for j in range(GRAM):
+        col = chars[..., j] if j < chars.shape[-1] else 0
+        code = (code << bits) | col
+    return code
+
+
+def _dedupe_sorted(*arrays) -> np.ndarray:
+    """Mask of the first element of every run of equal entries in sorted arrays."""
+    keep = np.ones(len(arrays[0]), dtype=bool)
+    if len(keep) > 1:
+        keep[1:] = np.logical_or.reduce([a[1:] != a[:-1] for a in arrays])
+    return keep
+
+
+class SubstringIndex:
+    def __init__(self, *columns):
+        text = None
+        for col in columns:
+            values = pd.Series(col).fillna("").astype(str).reset_index(drop=True)
+            text = values if text is None else text + _SEP + values
+        if text is None:
+            text = pd.Series([], dtype=str)
+        self.text = text.str.lower().to_numpy(dtype=str)
+        self.n_rows = len(self.text)
+
+        # (rows, max_len) matrix of code points, 0-padded
+        width = max(self.text.dtype.itemsize // 4, 1)
+        chars = np.ascontiguousarray(self.text, dtype=f"<U{width}").view(np.uint32)
+        chars = chars.reshape(self.n_rows, width).astype("int64")
+        usable = (chars != 0) & (chars != ord(_SEP))
+
+        # number the characters that occur (1..A, 0 = padding) so a gram needs
+        # only 3 * bits and still leaves room for the row in one int64 key
+        self.alphabet = np.flatnonzero(np.bincount(chars[usable], minlength=1))
+        self._bits = max(len(self.alphabet).bit_length(), 1)
+        lookup = np.zeros(int(self.alphabet[-1]) + 1 if len(self.alphabet) else 1, dtype="int64")
+        lookup[self.alphabet] = np.arange(1, len(self.alphabet) + 1)
+        chars = np.where(usable, lookup[np.where(usable, chars, 0)], 0)
+
+        shift = max(self.n_rows.bit_length(), 1)
+        packed = GRAM * self._bits + shift <= _KEY_BITS
+        keys, codes, rows = [], [], []
+        row_ids = np.arange(self.n_rows, dtype="int64")
+        for n in range(1, GRAM + 1):
+            if width < n:
+                break
+            windows = np.lib.stride_tricks.sliding_window_view(chars, n, axis=1)
+            ok = np.lib.stride_tricks.sliding_window_view(usable, n, axis=1).all(axis=2)
+            gram = _encode(windows, self._bits)[ok]
+            row = np.broadcast_to(row_ids[:, None], ok.shape)[ok]
+            if packed:
+                keys.append((gram << shift) | row)
+            else:
+                codes.append(gram)
+                rows.append(row)
+            del windows, ok, gram, row
+        del chars, usable
+
+        if packed:
+            # one int64 key per (gram, row): a plain sort orders by gram, then row
+            keys = np.sort(np.concatenate(keys)) if keys else np.empty(0, dtype="int64")
+            keys = keys[_dedupe_sorted(keys)]
+            gram_of, self.rows = keys >> shift, keys & ((1 << shift) - 1)
+        else:
+            # very large alphabets: the key does not fit, sort the pair instead
+            gram_of = np.concatenate(codes) if codes else np.empty(0, dtype="int64")
+            rows = np.concatenate(rows) if rows else np.empty(0, dtype="int64")
+            order = np.lexsort((rows, gram_of))
+            gram_of, rows = gram_of[order], rows[order]
+            keep = _dedupe_sorted(gram_of, rows)
+            gram_of, self.rows = gram_of[keep], rows[keep]
+
+        starts = np.flatnonzero(_dedupe_sorted(gram_of))
+        self.grams = gram_of[starts]
+        self.offsets = np.append(starts, len(gram_of)).astype("int64")
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, columns):
+        return cls(*[df[c] if c in df.columns else pd.Series([""] * len(df)) for c in columns])
+
+    def _gram_code(self, gram: str) -> int | None:
+        cps = np.array([ord(c) for c in gram], dtype="int64")
+        pos = np.searchsorted(self.alphabet, cps)
+        if (pos >= len(self.alphabet)).any() or (self.alphabet[np.minimum(pos, len(self.alphabet) - 1)] != cps).any():
+            return None   # a character no ID contains
+        return int(_encode((pos + 1)[None, :], self._bits)[0])
+
+    def _postings(self, gram: str) -> np.ndarray:
+        code = self._gram_code(gram)
+        if code is None:
+            return np.empty(0, dtype="int64")
+        i = np.searchsorted(self.grams, code)
+        if i >= len(self.grams) or self.grams[i] != code:
+            return np.empty(0, dtype="int64")
+        return self.rows[self.offsets[i]:self.offsets[i + 1]]
+
+    def search(self, query: str) -> np.ndarray:
+        """Sorted row positions whose IDs contain `query` (case-insensitive)."""
+        q = query.strip().lower()
+        if not q:
+            return np.arange(self.n_rows)
+        if len(q) <= GRAM:
+            return self._postings(q)
+
+        postings = sorted((self._postings(q[k:k + GRAM]) for k in range(len(q) - GRAM + 1)), key=len)
+        candidates = postings[0]
+        for p in postings[1:]:
+            if not len(candidates):
+                break
+            candidates = np.intersect1d(candidates, p, assume_unique=True)
+        if not len(candidates):
+            return candidates
+        hit = np.char.find(self.text[candidates], q) >= 0
+        return candidates[hit]
+
+    def mask(self, query: str) -> np.ndarray:
+        """Boolean row mask version of search()."""
+        m = np.zeros(self.n_rows, dtype=bool)
+        m[self.search(query)] = True
+        return m
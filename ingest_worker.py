@@ -0,0 +1,299 @@
+"""
+Background ingestion of the data folder, so no Streamlit session pays for a
+cold parse.
+
+The worker polls a data directory (stdlib only, no file-watch dependency) for
+REE exports (*_generacion.xlsx) and OSM GeoJSON files. A new or changed file
+goes through the same pipeline the apps would otherwise run on first use:
+
+* REE exports – Excel read, UTM 30N -> WGS84, numeric columns, coordinate
+  cleaning (ree_capacity.load_ree_files); one pickled table per file;
+* point GeoJSON (substations) – validation + voltage parsing
+  (osm_geojson.load_substation_table); one pickled table;
+* line GeoJSON – the memory-mapped line store and the segment index, which
+  are persisted next to the source (line_store.py / line_index.py).
+
+Each run that changes anything is published as a new numbered manifest that
+lists every source with its file stamp and artifact. Artifacts are written
+first, then the manifest, and only then is CURRENT replaced (os.replace), so
+readers always see one complete version. Older manifests beyond KEEP_VERSIONS
+and the artifacts only they reference are removed.
+
+    python ingest_worker.py --data-dir . --interval 10
+    python ingest_worker.py --once
+
+Run one worker per artifact directory.
+"""
+
+import argparse
+import datetime
+import fnmatch
+import json
+import os
+import pickle
+import time
+
+import pandas as pd
+
+from line_index import LineIndex, index_path_for
+from line_store import LineStore, store_path_for
+from osm_geojson import SPAIN_BBOX, iter_features, load_substation_table
+from ree_capacity import load_ree_files
+
+ARTIFACTS_ENV = "GST_ARTIFACTS"
+DEFAULT_ARTIFACT_DIR = "artifacts"
+CURRENT = "CURRENT"
+REE_PATTERN = "*_generacion.xlsx"
+GEOJSON_PATTERN = "*.geojson"
+POLL_INTERVAL = 10    # seconds between scans
+SETTLE_SECONDS = 2    # files modified more recently are still being copied
+KEEP_VERSIONS = 3
+
+KIND_REE = "ree"
+KIND_SUBSTATIONS = "substations"
+KIND_LINES = "lines"
+
+
+def artifact_dir() -> str:
+    return os.environ.get(ARTIFACTS_ENV, DEFAULT_ARTIFACT_DIR)
+
+
+def _source_stamp(path: str) -> list[int]:
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _manifest_name(version: int) -> str:
+    return f"manifest-{version:06d}.json"
+
+
+# ========= Reading published versions (used by the apps) =========
+
+def current_manifest(root: str | None = None) -> dict | None:
+    """The manifest CURRENT points to, or None if nothing has been published yet."""
+    root = root or artifact_dir()
+    try:
+        with open(os.path.join(root, CURRENT), "r", encoding="utf-8") as f:
+            name = f.read().strip()
+        with open(os.path.join(root, name), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def ingested_ree_sources(manifest: dict | None) -> list[str]:
+    """Names of the REE exports with a usable table in `manifest`."""
+    if not manifest:
+        return []
+    return sorted(
+        name for name, entry in manifest["sources"].items()
+        if entry["kind"] == KIND_REE and entry["artifact"]
+    )
+
+
+def read_artifact(manifest: dict, name: str, root: str | None = None) -> pd.DataFrame:
+    """Table ingested from source file `name`."""
+    root = root or artifact_dir()
+    return pd.read_pickle(os.path.join(root, manifest["sources"][name]["artifact"]))
+
+
+def load_ingested_table(path: str, bbox=None, root: str | None = None) -> pd.DataFrame | None:
+    """
+    The ingested table for data file `path` if the current version holds one
+    built from exactly this file (same stamp, same bbox); None otherwise, so
+    callers fall back to parsing the file themselves.
+    """
+    manifest = current_manifest(root)
+    if manifest is None:
+        return None
+    entry = manifest["sources"].get(os.path.basename(path))
+    if not entry or not entry["artifact"] or entry["kind"] == KIND_LINES:
+        return None
+    if os.path.abspath(os.path.dirname(path)) != manifest["data_dir"]:
+        return None
+    if (list(bbox) if bbox else None) != manifest["bbox"]:
+        return None
+    try:
+        if entry["stamp"] != _source_stamp(path):
+            return None
+        return read_artifact(manifest, os.path.basename(path), root)
+    except OSError:
+        return None   # source removed, or artifact pruned by a newer version
+
+
+# ========= Ingestion =========
+
+def classify(path: str) -> str | None:
+    """KIND_* of a data file (GeoJSON by the geometry of its first feature), None if not ingested."""
+    name = os.path.basename(path)
+    if fnmatch.fnmatch(name, REE_PATTERN):
+        return KIND_REE
+    if fnmatch.fnmatch(name, GEOJSON_PATTERN):
+        for feature in iter_features(path):
+            geom_type = (feature.get("geometry") or {}).get("type")
+            if geom_type == "Point":
+                return KIND_SUBSTATIONS
+            if geom_type in ("LineString", "MultiLineString"):
+                return KIND_LINES
+    return None
+
+
+def scan_sources(data_dir: str) -> list[str]:
+    """REE exports and GeoJSON files in `data_dir` that are not being written right now."""
+    now = time.time()
+    paths = []
+    for name in sorted(os.listdir(data_dir)):
+        if not (fnmatch.fnmatch(name, REE_PATTERN) or fnmatch.fnmatch(name, GEOJSON_PATTERN)):
+            continue
+        path = os.path.join(data_dir, name)
+        if os.path.isfile(path) and now - os.path.getmtime(path) >= SETTLE_SECONDS:
+            paths.append(path)
+    return paths
+
+
+def ingest_source(path: str, root: str, bbox=None) -> dict:
+    """Run the pipeline for one data file; returns its manifest entry."""
+    name = os.path.basename(path)
+    stamp = _source_stamp(path)
+    entry = {"kind": classify(path), "stamp": stamp, "artifact": None, "rows": 0, "errors": []}
+    t0 = time.perf_counter()
+
+    table = None
+    if entry["kind"] == KIND_REE:
+        table, entry["errors"] = load_ree_files([path])
+    elif entry["kind"] == KIND_SUBSTATIONS:
+        table = load_substation_table(path, bbox=bbox)
+    elif entry["kind"] == KIND_LINES:
+        store = LineStore.load_or_build(path, bbox=bbox)
+        LineIndex.load_or_build(path, bbox=bbox)
+        entry["rows"] = len(store)
+        entry["sidecars"] = [store_path_for(path), index_path_for(path)]
+
+    if table is not None and not table.empty:
+        artifact = os.path.join("data", f"{entry['kind']}-{name}-{stamp[0]}-{stamp[1]}.pkl")
+        os.makedirs(os.path.join(root, "data"), exist_ok=True)
+        _write_atomic(os.path.join(root, artifact), pickle.dumps(table, protocol=pickle.HIGHEST_PROTOCOL))
+        entry["artifact"] = artifact
+        entry["rows"] = len(table)
+
+    entry["seconds"] = round(time.perf_counter() - t0, 2)
+    return entry
+
+
+def publish(root: str, sources: dict, data_dir: str, bbox=None) -> dict:
+    """Write the next manifest and point CURRENT at it."""
+    previous = current_manifest(root)
+    version = previous["version"] + 1 if previous else 1
+    manifest = {
+        "version": version,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "data_dir": os.path.abspath(data_dir),
+        "bbox": list(bbox) if bbox else None,
+        "sources": sources,
+    }
+    os.makedirs(root, exist_ok=True)
+    name = _manifest_name(version)
+    _write_atomic(os.path.join(root, name), json.dumps(manifest, indent=1).encode("utf-8"))
+    _write_atomic(os.path.join(root, CURRENT), name.encode("utf-8"))
+    prune(root)
+    return manifest
+
+
+def prune(root: str, keep: int = KEEP_VERSIONS):
+    """Remove manifests older than the last `keep` and artifacts none of the kept ones use."""
+    manifests = sorted(n for n in os.listdir(root) if fnmatch.fnmatch(n, "manifest-*.json"))
+    for name in manifests[:-keep]:
+        os.remove(os.path.join(root, name))
+
+    used = set()
+    for name in manifests[-keep:]:
+        with open(os.path.join(root, name), "r", encoding="utf-8") as f:
+            used.update(e["artifact"] for e in json.load(f)["sources"].values() if e["artifact"])
+    data = os.path.join(root, "data")
+    if os.path.isdir(data):
+        for name in os.listdir(data):
+            if os.path.join("data", name) not in used:
+                os.remove(os.path.join(data, name))
+
+
+def run_once(data_dir: str = ".", root: str | None = None, bbox=SPAIN_BBOX) -> dict | None:
+    """Ingest new / changed files and publish a version; None if nothing changed."""
+    root = root or artifact_dir()
+    previous = current_manifest(root)
+    same_setup = (
+        previous is not None
+        and previous["data_dir"] == os.path.abspath(data_dir)
+        and previous["bbox"] == (list(bbox) if bbox else None)
+    )
+    old = previous["sources"] if same_setup else {}
+
+    sources = {}
+    changed = False
+    for path in scan_sources(data_dir):
+        name = os.path.basename(path)
+        entry = old.get(name)
+        if entry and entry["stamp"] == _source_stamp(path) and (
+            not entry["artifact"] or os.path.exists(os.path.join(root, entry["artifact"]))
+        ):
+            sources[name] = entry
+            continue
+        try:
+            sources[name] = ingest_source(path, root, bbox=bbox)
+        except Exception as e:
+            sources[name] = {
+                "kind": None, "stamp": _source_stamp(path), "artifact": None, "rows": 0, "errors": [str(e)],
+            }
+        changed = True
+
+    if not changed and sources.keys() == old.keys() and same_setup:
+        return None
+    return publish(root, sources, data_dir, bbox=bbox)
+
+
+def watch(data_dir: str = ".", root: str | None = None, interval: float = POLL_INTERVAL, bbox=SPAIN_BBOX,
+          stop=None):
+    """Poll `data_dir` every `interval` seconds until `stop` (a threading.Event) is set."""
+    while True:
+        t0 = time.perf_counter()
+        manifest = run_once(data_dir, root, bbox=bbox)
+        if manifest is not None:
+            print(f"Published version {manifest['version']} in {time.perf_counter() - t0:.1f}s")
+            for name, entry in manifest["sources"].items():
+                for err in entry["errors"]:
+                    print(f"  {name}: {err}")
+        if stop is not None:
+            if stop.wait(interval):
+                return
+        else:
+            time.sleep(interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Watch the data folder and publish pre-parsed datasets.")
+    parser.add_argument("--data-dir", default=".")
+    parser.add_argument("--artifacts", default=artifact_dir(), help=f"Output folder (or ${ARTIFACTS_ENV}).")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="Seconds between scans.")
+    parser.add_argument("--once", action="store_true", help="Ingest once and exit.")
+    args = parser.parse_args(argv)
+
+    if args.once:
+        manifest = run_once(args.data_dir, args.artifacts) or current_manifest(args.artifacts)
+        if manifest is None:
+            print("Nothing to ingest.")
+            return
+        for name, entry in manifest["sources"].items():
+            print(f"{name}: {entry['kind']}, {entry['rows']} rows" + "".join(f"\n  {e}" for e in entry["errors"]))
+        print(f"Version {manifest['version']} is current in {args.artifacts}")
+    else:
+        watch(args.data_dir, args.artifacts, interval=args.interval)
+
+
+if __name__ == "__main__":
+    main()
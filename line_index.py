@@ -0,0 +1,215 @@
+"""
+Segment-level spatial index over the OSM transmission lines (`line.geojson`).
+
+Every LineString / MultiLineString is split into its individual 2-point
+segments, projected to UTM 30N (metres) and stored in one STRtree per voltage
+class, so "how far is this point from the nearest 400 kV line" can be answered
+for thousands of points in one call.
+
+The segment arrays are saved next to the GeoJSON (`line.segments.npz`) and
+reused as long as the source file is unchanged.
+"""
+
+import os
+import threading
+import zipfile
+
+import numpy as np
+import pandas as pd
+import shapely
+from pyproj import Transformer
+
+from line_store import LineStore
+from osm_voltage import VOLTAGE_CLASSES
+
+# ========= WGS84 -> UTM (Spain, zone 30N) =========
+wgs84_to_utm30 = Transformer.from_crs("EPSG:4326", "EPSG:32630", always_xy=True)
+
+INDEX_FORMAT = 3
+ALL_CLASSES = "all"
+
+
+def index_path_for(geojson_path: str) -> str:
+    """Sidecar file the segment index for `geojson_path` is persisted to."""
+    return os.path.splitext(geojson_path)[0] + ".segments.npz"
+
+
+def _source_stamp(path: str) -> tuple[int, int]:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+class LineIndex:
+    """
+    STRtree index over line segments, partitioned by voltage class.
+
+    `segments` is an (n, 2, 2) float64 array of UTM 30N coordinates,
+    `feature_pos` the position of the owning feature in the GeoJSON and
+    `classes` its voltage class label (see osm_voltage.VOLTAGE_CLASSES).
+    """
+
+    def __init__(self, segments, feature_pos, classes, osm_ids):
+        self.segments = np.asarray(segments, dtype="float64").reshape(-1, 2, 2)
+        self.feature_pos = np.asarray(feature_pos, dtype="int64")
+        self.classes = np.asarray(classes, dtype=str)
+        self.osm_ids = np.asarray(osm_ids, dtype=str)
+        self.geoms = shapely.linestrings(self.segments)
+        self._trees = {}
+
+    # ------ construction / persistence ------
+
+    @classmethod
+    def from_line_store(cls, store):
+        """Build from a line_store.LineStore (flat coordinate buffer + offsets)."""
+        coords = np.asarray(store.coords)
+        part_offsets = np.asarray(store.part_offsets)
+
+        # a vertex starts a segment unless it is the last vertex of its part
+        starts_mask = np.ones(len(coords), dtype=bool)
+        starts_mask[part_offsets[1:] - 1] = False
+        starts = np.flatnonzero(starts_mask)
+        feature_pos = store.feature_of_vertex()[starts]
+
+        xs, ys = wgs84_to_utm30.transform(coords[:, 0], coords[:, 1])
+        projected = np.column_stack([xs, ys])
+        segments = np.stack([projected[starts], projected[starts + 1]], axis=1)
+
+        feat_classes = np.asarray(store.properties["voltage_class"], dtype=str)
+        osm_ids = store.properties["@id"].fillna("").astype(str).to_numpy()
+        return cls(
+            segments,
+            feature_pos,
+            feat_classes[feature_pos] if len(feature_pos) else np.empty(0, dtype=str),
+            osm_ids,
+        )
+
+    def save(self, path: str, source_path: str | None = None, bbox=None):
+        mtime_ns, size = _source_stamp(source_path) if source_path else (0, 0)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        try:
+            np.savez(
+                tmp_path,
+                format=INDEX_FORMAT,
+                source_mtime_ns=mtime_ns,
+                source_size=size,
+                bbox=np.asarray(bbox if bbox is not None else [], dtype="float64"),
+                segments=self.segments,
+                feature_pos=self.feature_pos,
+                classes=self.classes,
+                osm_ids=self.osm_ids,
+            )
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str, source_path: str | None = None, bbox=None):
+        """Load a saved index; returns None if it is stale or unreadable."""
+        try:
+            with np.load(path, allow_pickle=False) as z:
+                if int(z["format"]) != INDEX_FORMAT:
+                    return None
+                if source_path is not None:
+                    stamp = (int(z["source_mtime_ns"]), int(z["source_size"]))
+                    if stamp != _source_stamp(source_path):
+                        return None
+                if list(z["bbox"]) != list(bbox if bbox is not None else []):
+                    return None
+                return cls(z["segments"], z["feature_pos"], z["classes"], z["osm_ids"])
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            return None
+
+    @classmethod
+    def load_or_build(cls, geojson_path: str = "line.geojson", index_path: str | None = None, bbox=None):
+        """Reuse the persisted index if it matches `geojson_path` and `bbox`, else rebuild and save it."""
+        index_path = index_path or index_path_for(geojson_path)
+        index = cls.load(index_path, source_path=geojson_path, bbox=bbox)
+        if index is not None:
+            return index
+
+        index = cls.from_line_store(LineStore.load_or_build(geojson_path, bbox=bbox))
+        try:
+            index.save(index_path, source_path=geojson_path, bbox=bbox)
+        except OSError:
+            pass  # read-only folder: keep the in-memory index
+        return index
+
+    # ------ queries ------
+
+    def _tree(self, voltage_cls: str):
+        if voltage_cls not in self._trees:
+            if voltage_cls == ALL_CLASSES:
+                idx = np.arange(len(self.geoms))
+            else:
+                idx = np.flatnonzero(self.classes == voltage_cls)
+            self._trees[voltage_cls] = (shapely.STRtree(self.geoms[idx]), idx)
+        return self._trees[voltage_cls]
+
+    @staticmethod
+    def _points(lats, lons):
+        xs, ys = wgs84_to_utm30.transform(
+            np.asarray(lons, dtype="float64"), np.asarray(lats, dtype="float64")
+        )
+        return shapely.points(xs, ys)
+
+    def nearest(self, lats, lons, voltage_cls: str = ALL_CLASSES) -> pd.DataFrame:
+        """
+        Nearest line of the given voltage class for each (lat, lon).
+        Returns one row per input point with 'distance_km', 'feature_pos' and
+        'osm_id' (NaN / -1 / "" if the class has no segments).
+        """
+        points = self._points(lats, lons)
+        n = len(points)
+        out = pd.DataFrame(
+            {
+                "distance_km": np.full(n, np.nan),
+                "feature_pos": np.full(n, -1, dtype="int64"),
+                "osm_id": np.full(n, "", dtype=object),
+            }
+        )
+        tree, idx = self._tree(voltage_cls)
+        if n == 0 or len(idx) == 0:
+            return out
+
+        (pt_i, seg_i), dist = tree.query_nearest(points, return_distance=True, all_matches=False)
+        seg_i = idx[seg_i]
+        out.loc[pt_i, "distance_km"] = dist / 1000.0
+        out.loc[pt_i, "feature_pos"] = self.feature_pos[seg_i]
+        out.loc[pt_i, "osm_id"] = self.osm_ids[self.feature_pos[seg_i]]
+        return out
+
+    def within(self, lats, lons, radius_km: float, voltage_cls: str = ALL_CLASSES) -> pd.DataFrame:
+        """
+        All lines of the given voltage class within `radius_km` of each point.
+        Returns one row per (point, line) pair with the closest segment distance,
+        sorted by point then distance.
+        """
+        points = self._points(lats, lons)
+        tree, idx = self._tree(voltage_cls)
+        cols = ["point", "feature_pos", "osm_id", "voltage_class", "distance_km"]
+        if len(points) == 0 or len(idx) == 0:
+            return pd.DataFrame(columns=cols)
+
+        pt_i, seg_i = tree.query(points, predicate="dwithin", distance=radius_km * 1000.0)
+        seg_i = idx[seg_i]
+        dist = shapely.distance(points[pt_i], self.geoms[seg_i]) / 1000.0
+
+        pairs = pd.DataFrame(
+            {
+                "point": pt_i,
+                "feature_pos": self.feature_pos[seg_i],
+                "osm_id": self.osm_ids[self.feature_pos[seg_i]],
+                "voltage_class": self.classes[seg_i],
+                "distance_km": dist,
+            }
+        )
+        # keep the closest segment of each (point, line) pair
+        pairs = pairs.sort_values(["point", "distance_km"], kind="stable")
+        pairs = pairs.drop_duplicates(["point", "feature_pos"])
+        return pairs.reset_index(drop=True)[cols]
+
+
+def voltage_class_labels() -> list[str]:
+    return [label for _, label, _, _ in VOLTAGE_CLASSES]
@@ -0,0 +1,332 @@
+"""
+Compact, memory-mappable store for the OSM line network.
+
+Instead of nested `[lon, lat]` lists inside GeoJSON dicts, the lines are held
+as
+
+* `coords`        – one (n, 2) float64 buffer of all vertices,
+* `part_offsets`  – vertices of part i are coords[part_offsets[i]:part_offsets[i + 1]],
+* `feature_parts` – parts of feature j are feature_parts[j]:feature_parts[j + 1],
+* a columnar properties table (UTF-8 string columns as data + offsets,
+  numeric columns as plain .npy arrays).
+
+Saved as a directory of .npy files (`line.store/` next to the GeoJSON), which
+np.load opens with mmap_mode="r": several worker processes then share one
+copy of the geometry through the page cache. Each save writes a new
+`data-*/` version and switches the `CURRENT` file to it with os.replace, so
+readers never see a half-written or missing store.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from osm_geojson import LINE_PROPERTY_FIELDS, load_line_arrays
+from osm_voltage import VOLTAGE_COLUMNS
+
+STORE_FORMAT = 3   # 3: no one-point parts
+CURRENT_FILE = "CURRENT"
+NUMERIC_COLUMNS = ["voltage_kv", "voltage_min_kv", "voltage_count"]
+
+
+def store_path_for(geojson_path: str) -> str:
+    """Directory the line store for `geojson_path` is saved to."""
+    return os.path.splitext(geojson_path)[0] + ".store"
+
+
+def _source_stamp(path: str) -> list[int]:
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _current_data_name(directory: str) -> str | None:
+    """Name of the data-*/ version CURRENT points to, None if there is none yet."""
+    try:
+        with open(os.path.join(directory, CURRENT_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _prune_versions(directory: str, keep: set):
+    """
+    Remove data-*/ versions not in `keep` and files of the old flat layout.
+    The previous version is kept for readers that opened it just before the switch.
+    """
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.startswith("data-") and name not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+        elif name == "meta.json" or name.endswith(".npy"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _encode_strings(values) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """UTF-8 data buffer, int64 offsets and a null mask for a column of str/None."""
+    chunks = []
+    offsets = np.zeros(len(values) + 1, dtype="int64")
+    nulls = np.zeros(len(values), dtype=bool)
+    total = 0
+    for i, value in enumerate(values):
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            nulls[i] = True
+        else:
+            b = str(value).encode("utf-8")
+            chunks.append(b)
+            total += len(b)
+        offsets[i + 1] = total
+    return np.frombuffer(b"".join(chunks), dtype="uint8"), offsets, nulls
+
+
+def _decode_strings(data: np.ndarray, offsets: np.ndarray, nulls: np.ndarray) -> list:
+    raw = data.tobytes()
+    return [
+        None if nulls[i] else raw[offsets[i]:offsets[i + 1]].decode("utf-8")
+        for i in range(len(nulls))
+    ]
+
+
+class LineStore:
+    def __init__(self, coords, part_offsets, feature_parts, properties: pd.DataFrame):
+        self.coords = coords
+        self.part_offsets = part_offsets
+        self.feature_parts = feature_parts
+        self.properties = properties
+
+    def __len__(self):
+        return len(self.feature_parts) - 1
+
+    # ------ construction / persistence ------
+
+    @classmethod
+    def from_arrays(cls, arrays: dict):
+        return cls(
+            arrays["coords"],
+            arrays["part_offsets"],
+            arrays["feature_parts"],
+            arrays["properties"].reset_index(drop=True),
+        )
+
+    @classmethod
+    def from_geojson(cls, path: str, bbox=None):
+        """Stream a line GeoJSON into a store (see osm_geojson.load_line_arrays)."""
+        return cls.from_arrays(load_line_arrays(path, bbox=bbox))
+
+    def save(self, directory: str, source_path: str | None = None, bbox=None):
+        """
+        Write the store as a new data-*/ version inside `directory` and switch
+        CURRENT to it, so `directory` never disappears while other processes read it.
+        """
+        os.makedirs(directory, exist_ok=True)
+        stamp = f"{os.getpid()}-{threading.get_ident()}-{time.time_ns()}"
+        tmp_dir = os.path.join(directory, f"tmp-{stamp}")
+        data_name = f"data-{stamp}"
+        try:
+            os.makedirs(tmp_dir)
+            self._write_arrays(tmp_dir, source_path, bbox)
+            os.replace(tmp_dir, os.path.join(directory, data_name))
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        previous = _current_data_name(directory)
+        current_tmp = os.path.join(directory, f"{CURRENT_FILE}.{stamp}.tmp")
+        with open(current_tmp, "w", encoding="utf-8") as f:
+            f.write(data_name)
+        os.replace(current_tmp, os.path.join(directory, CURRENT_FILE))
+        _prune_versions(directory, keep={data_name, previous})
+
+    def _write_arrays(self, tmp_dir: str, source_path: str | None, bbox):
+        np.save(os.path.join(tmp_dir, "coords.npy"), np.ascontiguousarray(self.coords, dtype="float64"))
+        np.save(os.path.join(tmp_dir, "part_offsets.npy"), np.asarray(self.part_offsets, dtype="int64"))
+        np.save(os.path.join(tmp_dir, "feature_parts.npy"), np.asarray(self.feature_parts, dtype="int64"))
+
+        string_columns = []
+        for col in self.properties.columns:
+            values = self.properties[col]
+            if col in NUMERIC_COLUMNS:
+                np.save(os.path.join(tmp_dir, f"prop.{col}.npy"), values.to_numpy())
+                continue
+            data, offsets, nulls = _encode_strings(values.tolist())
+            np.save(os.path.join(tmp_dir, f"prop.{col}.data.npy"), data)
+            np.save(os.path.join(tmp_dir, f"prop.{col}.offsets.npy"), offsets)
+            np.save(os.path.join(tmp_dir, f"prop.{col}.nulls.npy"), nulls)
+            string_columns.append(col)
+
+        meta = {
+            "format": STORE_FORMAT,
+            "source": _source_stamp(source_path) if source_path else None,
+            "bbox": list(bbox) if bbox is not None else None,
+            "string_columns": string_columns,
+            "numeric_columns": [c for c in self.properties.columns if c in NUMERIC_COLUMNS],
+            "columns": list(self.properties.columns),
+        }
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, directory: str, source_path: str | None = None, bbox=None, mmap: bool = True):
+        """Open the current saved version (memory-mapped); returns None if it is stale or unreadable."""
+        try:
+            data_name = _current_data_name(directory)
+            if data_name is None:
+                return None
+            data_dir = os.path.join(directory, data_name)
+            with open(os.path.join(data_dir, "meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("format") != STORE_FORMAT:
+                return None
+            if source_path is not None and meta.get("source") != _source_stamp(source_path):
+                return None
+            if (list(bbox) if bbox is not None else None) != meta.get("bbox"):
+                return None
+
+            mode = "r" if mmap else None
+
+            def arr(name):
+                return np.load(os.path.join(data_dir, name), mmap_mode=mode, allow_pickle=False)
+
+            columns = {}
+            for col in meta["string_columns"]:
+                columns[col] = _decode_strings(
+                    arr(f"prop.{col}.data.npy"), arr(f"prop.{col}.offsets.npy"), arr(f"prop.{col}.nulls.npy")
+                )
+            for col in meta["numeric_columns"]:
+                columns[col] = arr(f"prop.{col}.npy")
+            properties = pd.DataFrame({col: columns[col] for col in meta["columns"]})
+
+            return cls(arr("coords.npy"), arr("part_offsets.npy"), arr("feature_parts.npy"), properties)
+        except (OSError, KeyError, ValueError):
+            return None
+
+    @classmethod
+    def load_or_build(cls, geojson_path: str = "line.geojson", store_dir: str | None = None, bbox=None):
+        """Open the saved store if it matches `geojson_path` and `bbox`, else stream, save and reopen it."""
+        store_dir = store_dir or store_path_for(geojson_path)
+        store = cls.load(store_dir, source_path=geojson_path, bbox=bbox)
+        if store is not None:
+            return store
+
+        store = cls.from_geojson(geojson_path, bbox=bbox)
+        try:
+            store.save(store_dir, source_path=geojson_path, bbox=bbox)
+        except OSError:
+            return store  # read-only folder: keep the in-memory store
+        return cls.load(store_dir, source_path=geojson_path, bbox=bbox) or store
+
+    # ------ vectorized helpers ------
+
+    def part_of_vertex(self) -> np.ndarray:
+        return np.repeat(np.arange(len(self.part_offsets) - 1), np.diff(self.part_offsets))
+
+    def feature_of_part(self) -> np.ndarray:
+        return np.repeat(np.arange(len(self)), np.diff(self.feature_parts))
+
+    def feature_of_vertex(self) -> np.ndarray:
+        return self.feature_of_part()[self.part_of_vertex()]
+
+    def center(self) -> tuple[float, float] | None:
+        """(lat, lon) mean of all vertices, or None for an empty store."""
+        if len(self.coords) == 0:
+            return None
+        lon, lat = np.asarray(self.coords).mean(axis=0)
+        return float(lat), float(lon)
+
+    def feature_bounds(self) -> np.ndarray:
+        """(n_features, 4) array of per-feature (min_lon, min_lat, max_lon, max_lat)."""
+        if len(self) == 0:
+            return np.empty((0, 4))
+        starts = np.asarray(self.part_offsets)[np.asarray(self.feature_parts)[:-1]]
+        lo = np.minimum.reduceat(self.coords, starts, axis=0)
+        hi = np.maximum.reduceat(self.coords, starts, axis=0)
+        return np.column_stack([lo, hi])
+
+    def bbox_mask(self, bbox) -> np.ndarray:
+        """Features whose envelope overlaps bbox (min_lon, min_lat, max_lon, max_lat)."""
+        fb = self.feature_bounds()
+        min_lon, min_lat, max_lon, max_lat = bbox
+        return ~(
+            (fb[:, 2] < min_lon) | (fb[:, 0] > max_lon)
+            | (fb[:, 3] < min_lat) | (fb[:, 1] > max_lat)
+        )
+
+    def select(self, mask) -> "LineStore":
+        """New (in-memory) store with only the features where `mask` is True."""
+        feat_idx = np.flatnonzero(np.asarray(mask, dtype=bool))
+        feature_parts = np.asarray(self.feature_parts)
+        part_offsets = np.asarray(self.part_offsets)
+
+        part_counts = np.diff(feature_parts)[feat_idx]
+        part_idx = _ranges(feature_parts[feat_idx], part_counts)
+        vertex_counts = np.diff(part_offsets)[part_idx]
+        vertex_idx = _ranges(part_offsets[part_idx], vertex_counts)
+
+        return LineStore(
+            np.asarray(self.coords)[vertex_idx],
+            np.concatenate([[0], np.cumsum(vertex_counts)]).astype("int64"),
+            np.concatenate([[0], np.cumsum(part_counts)]).astype("int64"),
+            self.properties.iloc[feat_idx].reset_index(drop=True),
+        )
+
+    def simplify(self, tolerance_deg: float) -> "LineStore":
+        """Douglas–Peucker simplification of every part (tolerance in degrees)."""
+        if len(self.coords) == 0:
+            return self
+        parts = shapely.linestrings(np.asarray(self.coords), indices=self.part_of_vertex())
+        parts = shapely.simplify(parts, tolerance_deg, preserve_topology=False)
+        coords, idx = shapely.get_coordinates(parts, return_index=True)
+        counts = np.bincount(idx, minlength=len(parts))
+        return LineStore(
+            coords,
+            np.concatenate([[0], np.cumsum(counts)]).astype("int64"),
+            np.asarray(self.feature_parts),
+            self.properties,
+        )
+
+    def to_geojson(self, mask=None) -> dict:
+        """FeatureCollection (for Folium) of all features, or of those where `mask` is True."""
+        store = self.select(mask) if mask is not None else self
+        coords = np.asarray(store.coords).tolist()
+        part_offsets = np.asarray(store.part_offsets).tolist()
+        feature_parts = np.asarray(store.feature_parts).tolist()
+        records = store.properties.to_dict("records")
+
+        features = []
+        for j, props in enumerate(records):
+            parts = [
+                coords[part_offsets[i]:part_offsets[i + 1]]
+                for i in range(feature_parts[j], feature_parts[j + 1])
+            ]
+            props = {
+                k: v for k, v in props.items()
+                if v is not None and not (isinstance(v, float) and np.isnan(v))
+                and (k in LINE_PROPERTY_FIELDS or k in VOLTAGE_COLUMNS)
+            }
+            geometry = (
+                {"type": "LineString", "coordinates": parts[0]}
+                if len(parts) == 1
+                else {"type": "MultiLineString", "coordinates": parts}
+            )
+            # a stable id, so Folium never has to write one into (shared) feature dicts
+            features.append({"type": "Feature", "id": j, "properties": props, "geometry": geometry})
+        return {"type": "FeatureCollection", "features": features}
+
+
+def _ranges(starts, counts) -> np.ndarray:
+    """Concatenation of arange(s, s + c) for every (s, c) pair, without a Python loop."""
+    starts = np.asarray(starts, dtype="int64")
+    counts = np.asarray(counts, dtype="int64")
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype="int64")
+    offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts)
+    return offsets + np.arange(total)
@@ -0,0 +1,323 @@
+"""
+Load / concurrency test for gst_sub.py.
+
+Drives the app headlessly with Streamlit's AppTest: every simulated analyst
+is its own session that runs the script, then performs random steps – upload
+a random subset of the bundled 2025_11_*_generacion.xlsx exports, move a
+slider, change the map layers or flip a checkbox – and reruns after each one.
+
+    python load_test.py --sessions 8 --steps 20
+    python load_test.py --sessions 4 --mode processes --out load.json
+
+--mode threads (default) runs all sessions in one process, like one
+Streamlit server: shared caches and the dataset registry are in play, and
+CPU time / RSS are measured for the whole process and divided by the number
+of sessions (the script is run once beforehand, so it is compiled before the
+threads start together). --mode processes gives every session its own
+process, so CPU time and peak RSS are exact per session but nothing is shared.
+
+Reports p50 / p95 rerun latency per session and overall; --max-p95-ms turns
+the run into a check for scaling regressions (non-zero exit when exceeded).
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:   # Windows
+    resource = None
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gst_sub.py")
+REE_GLOB = "2025_11_*_generacion.xlsx"
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+ACTIONS = ("upload", "slider", "layers", "checkbox")
+RUN_TIMEOUT = 600   # seconds for a single rerun
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process (peak RSS where /proc is not available)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        if resource is None:
+            return float("nan")
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return rss_mb()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def read_ree_files(data_dir: str, pattern: str = REE_GLOB) -> list[tuple]:
+    """(name, bytes, mime) of the exports to upload, read once and shared by all sessions."""
+    files = []
+    for path in sorted(glob.glob(os.path.join(data_dir, pattern))):
+        with open(path, "rb") as f:
+            files.append((os.path.basename(path), f.read(), XLSX_MIME))
+    return files
+
+
+# ========= One simulated analyst =========
+
+def _random_slider_value(widget, rng: random.Random):
+    if widget.type == "select_slider":
+        options = list(widget.options)
+        if isinstance(widget.value, (list, tuple)):
+            i, j = sorted(rng.sample(range(len(options)), 2))
+            return options[i], options[j]
+        return rng.choice(options)
+
+    value = widget.value[0] if isinstance(widget.value, (list, tuple)) else widget.value
+    if isinstance(value, int):
+        pick = lambda: rng.randint(int(widget.min), int(widget.max))
+    else:
+        pick = lambda: rng.uniform(widget.min, widget.max)
+    if isinstance(widget.value, (list, tuple)):
+        return tuple(sorted((pick(), pick())))
+    return pick()
+
+
+def random_step(at, rng: random.Random, ree_files: list) -> str:
+    """Apply one random user action to the AppTest `at`; returns what was done."""
+    action = rng.choice(ACTIONS)
+    if action == "upload" and at.sidebar.file_uploader and ree_files:
+        picks = rng.sample(ree_files, rng.randint(1, len(ree_files)))
+        at.sidebar.file_uploader[0].set_value(picks)
+        return f"upload {len(picks)}"
+
+    if action == "slider":
+        sliders = list(at.sidebar.slider) + list(at.sidebar.select_slider)
+        if sliders:
+            widget = rng.choice(sliders)
+            widget.set_value(_random_slider_value(widget, rng))
+            return f"slider {widget.label}"
+
+    if action == "layers":
+        layers = [m for m in at.sidebar.multiselect if m.label == "Layers to build"]
+        if layers:
+            options = list(layers[0].options)
+            layers[0].set_value(rng.sample(options, rng.randint(0, len(options))))
+            return "layers"
+
+    checkbox = rng.choice(list(at.sidebar.checkbox))
+    checkbox.set_value(not checkbox.value)
+    return f"checkbox {checkbox.label}"
+
+
+def warm_up():
+    """
+    Run the app once before the sessions start: Streamlit compiles the script
+    on first use, and compiling it from several threads at once can fail
+    (SystemError from the AST constructor).
+    """
+    from streamlit.testing.v1 import AppTest
+
+    AppTest.from_file(APP, default_timeout=RUN_TIMEOUT).run()
+
+
+def crashed_session(session: int, error: BaseException) -> dict:
+    return {"session": session, "first_ms": None, "latencies_ms": [], "actions": [],
+            "errors": [f"session crashed: {error!r}"], "cpu_s": 0.0, "rss_mb": 0.0, "crashed": True}
+
+
+def run_session(session: int, steps: int, seed: int, ree_files: list, start=None) -> dict:
+    """Run one session (first load + `steps` random reruns) and time every run."""
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed + session)
+    at = AppTest.from_file(APP, default_timeout=RUN_TIMEOUT)
+    if start is not None:
+        start.wait()   # all sessions hit the app at the same time
+
+    cpu0 = time.process_time()
+    t0 = time.perf_counter()
+    at.run()
+    first_ms = (time.perf_counter() - t0) * 1000
+
+    latencies = []
+    actions = []
+    errors = [str(e.value) for e in at.exception]
+    for _ in range(steps):
+        actions.append(random_step(at, rng, ree_files))
+        t0 = time.perf_counter()
+        at.run()
+        latencies.append((time.perf_counter() - t0) * 1000)
+        errors += [f"{actions[-1]}: {e.value}" for e in at.exception]
+
+    return {
+        "session": session,
+        "first_ms": first_ms,
+        "latencies_ms": latencies,
+        "actions": actions,
+        "errors": errors,
+        "cpu_s": time.process_time() - cpu0,   # per process (exact only in processes mode)
+        "rss_mb": peak_rss_mb(),
+        "crashed": False,
+    }
+
+
+def _run_session_process(args) -> dict:
+    try:
+        return run_session(*args)
+    except Exception as e:   # report it instead of failing the whole pool
+        return crashed_session(args[0], e)
+
+
+# ========= Runners =========
+
+def run_threads(sessions: int, steps: int, seed: int, ree_files: list) -> tuple[list[dict], dict]:
+    """All sessions as threads of this process (one Streamlit server)."""
+    results = [None] * sessions
+    start = threading.Event()
+    warm_up()   # compile the script once, before the threads run it together
+
+    def worker(i):
+        try:
+            results[i] = run_session(i, steps, seed, ree_files, start)
+        except Exception as e:   # keep the other sessions going
+            results[i] = crashed_session(i, e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(sessions)]
+    for t in threads:
+        t.start()
+    rss0 = rss_mb()
+    cpu0 = time.process_time()
+    t0 = time.perf_counter()
+    start.set()
+    for t in threads:
+        t.join()
+
+    process = {
+        "wall_s": time.perf_counter() - t0,
+        "cpu_s": time.process_time() - cpu0,
+        "rss_mb": rss_mb(),
+        "rss_growth_mb": rss_mb() - rss0,
+    }
+    for r in results:   # process-wide numbers, shared out evenly
+        r["cpu_s"] = process["cpu_s"] / sessions
+        r["rss_mb"] = process["rss_growth_mb"] / sessions
+    return results, process
+
+
+def run_processes(sessions: int, steps: int, seed: int, ree_files: list) -> tuple[list[dict], dict]:
+    """Every session in its own process (exact CPU / RSS, no shared caches)."""
+    t0 = time.perf_counter()
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(sessions) as pool:
+        results = pool.map(_run_session_process, [(i, steps, seed, ree_files) for i in range(sessions)])
+    process = {
+        "wall_s": time.perf_counter() - t0,
+        "cpu_s": sum(r["cpu_s"] for r in results),
+        "rss_mb": sum(r["rss_mb"] for r in results),
+    }
+    return results, process
+
+
+def _percentile(values, q: float) -> int | None:
+    values = np.asarray(values, dtype="float64")
+    values = values[np.isfinite(values)]
+    return round(float(np.percentile(values, q))) if len(values) else None
+
+
+def _round(value, digits: int = 0):
+    if value is None or not np.isfinite(value):
+        return None
+    return round(value, digits) if digits else round(value)
+
+
+def summarize_runs(results: list[dict]) -> pd.DataFrame:
+    rows = []
+    for r in results:
+        lat = np.asarray(r["latencies_ms"])
+        rows.append(
+            {
+                "session": r["session"],
+                "status": "crashed" if r.get("crashed") else "ok",
+                "reruns": len(lat),
+                "errors": len(r["errors"]),
+                "first_ms": _round(r["first_ms"]),
+                "p50_ms": _percentile(lat, 50),
+                "p95_ms": _percentile(lat, 95),
+                "cpu_s": _round(r["cpu_s"], 2),
+                "rss_mb": _round(r["rss_mb"], 1),
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent analysts on gst_sub.py.")
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--steps", type=int, default=10, help="Random actions (reruns) per session.")
+    parser.add_argument("--mode", choices=["threads", "processes"], default="threads")
+    parser.add_argument("--data-dir", default=".", help="Folder with the GeoJSON files and REE exports.")
+    parser.add_argument("--ree", default=REE_GLOB, help="Glob of REE exports to upload (in --data-dir).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write the raw timings as JSON.")
+    parser.add_argument("--max-p95-ms", type=float, help="Exit with status 1 if the overall p95 is higher.")
+    args = parser.parse_args(argv)
+
+    if args.steps < 1:
+        parser.error("--steps must be at least 1")
+    out = os.path.abspath(args.out) if args.out else None
+
+    os.chdir(args.data_dir)   # the app reads its data files from the working directory
+    ree_files = read_ree_files(".", args.ree)
+    runner = run_threads if args.mode == "threads" else run_processes
+    results, process = runner(args.sessions, args.steps, args.seed, ree_files)
+
+    table = summarize_runs(results)
+    all_latencies = np.concatenate([np.asarray(r["latencies_ms"], dtype="float64") for r in results])
+    overall = {
+        "sessions": args.sessions,
+        "mode": args.mode,
+        "reruns": len(all_latencies),
+        "p50_ms": _percentile(all_latencies, 50),
+        "p95_ms": _percentile(all_latencies, 95),
+        "errors": int(table["errors"].sum()),
+        "crashed": int((table["status"] == "crashed").sum()),
+        **process,
+    }
+
+    print(table.to_string(index=False))
+    print(
+        f"\n{args.sessions} sessions ({args.mode}), {overall['reruns']} reruns in {process['wall_s']:.1f}s: "
+        f"p50 {overall['p50_ms']} ms, p95 {overall['p95_ms']} ms, "
+        f"CPU {process['cpu_s']:.1f}s, RSS {process['rss_mb']:.0f} MB, {overall['errors']} errors, "
+        f"{overall['crashed']} crashed sessions"
+    )
+    for r in results:
+        for err in r["errors"][:3]:
+            print(f"session {r['session']}: {err}")
+
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump({"overall": overall, "sessions": results}, f, indent=1)
+
+    if args.max_p95_ms is not None:
+        if overall["crashed"]:
+            print(f"{overall['crashed']} sessions crashed")
+            sys.exit(1)
+        if overall["p95_ms"] is None or overall["p95_ms"] > args.max_p95_ms:
+            print(f"p95 {overall['p95_ms']} ms exceeds --max-p95-ms {args.max_p95_ms:.0f}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
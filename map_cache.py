@@ -0,0 +1,228 @@
+"""
+Process-wide LRU cache of serialized Folium maps.
+
+The Streamlit apps key each map on the data version (which files are loaded)
+plus the filter parameters, so sessions looking at the same view – typically
+the default "all Spain, all voltages" map – reuse one map instead of
+rebuilding thousands of markers on every rerun.
+
+What is cached is not the folium.Map but the strings st_folium would send to
+the browser for it (leaflet script, header, html, css/js links, map id). A
+map is built and serialized once per key; a hit hands those strings straight
+to the streamlit-folium component (show_map), so neither the markers nor the
+Jinja templates are touched again. Only a small feature group (e.g. the REE
+visibility delta) is serialized per rerun.
+
+This relies on streamlit-folium internals (requirements.txt pins the tested
+release). They are checked once at import; if any is missing the cache keeps
+the folium.Map itself and show_map falls back to plain st_folium.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import folium
+import streamlit as st
+import streamlit_folium
+from streamlit_folium import st_folium
+
+_PRIVATE_API = (
+    "_get_html", "_get_header", "_get_map_string", "_get_feature_group_string",
+    "_component_func", "generate_js_hash", "get_full_id",
+)
+# False on streamlit-folium releases that renamed or dropped any of the above
+PRIVATE_API_OK = all(callable(getattr(streamlit_folium, name, None)) for name in _PRIVATE_API)
+
+
+def cache_key(**parts) -> str:
+    """Stable hash of the keyword arguments (order-independent, JSON-ish values)."""
+    blob = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+def file_version(path: str) -> str:
+    """Cheap version stamp for a file on disk (missing files are a version too)."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return f"{path}:missing"
+    return f"{path}:{st.st_mtime_ns}:{st.st_size}"
+
+
+def bytes_version(name: str, data: bytes) -> str:
+    """Content version stamp for an uploaded file."""
+    return f"{name}:{hashlib.sha1(data).hexdigest()}"
+
+
+class MapPayload:
+    """Serialized component inputs for one map (what st_folium computes on every call)."""
+
+    def __init__(self, m: folium.Map):
+        self.map = None
+        if not PRIVATE_API_OK:
+            # fallback: keep the map, st_folium renders it on every call
+            self.map = m
+            self._render_lock = threading.Lock()
+            self.nbytes = 0
+            return
+
+        m.get_root().render()
+        # same order as st_folium: html / header before _get_map_string rewrites the element ids
+        self.html = streamlit_folium._get_html(m)
+        self.header = streamlit_folium._get_header(m)
+        self.script = streamlit_folium._get_map_string(m)
+        self.map_id = streamlit_folium.get_full_id(m)
+        self.zoom = m.options.get("zoom")
+        south_west, north_east = m.get_bounds()
+        self.bounds = {
+            "_southWest": {"lat": south_west[0], "lng": south_west[1]},
+            "_northEast": {"lat": north_east[0], "lng": north_east[1]},
+        }
+
+        css_links, js_links = [], []
+        for element in _walk(m):
+            css_links.extend(href for _, href in getattr(element, "default_css", []))
+            js_links.extend(src for _, src in getattr(element, "default_js", []))
+        self.css_links = list(dict.fromkeys(css_links))
+        self.js_links = list(dict.fromkeys(js_links))
+        self.nbytes = len(self.script) + len(self.header) + len(self.html)
+        self._hashes = {}
+
+    def component_key(self, key: str | None) -> str:
+        """streamlit-folium's component key for this script (hashing MBs of JS, so memoized)."""
+        if key not in self._hashes:
+            self._hashes[key] = streamlit_folium.generate_js_hash(self.script, key, False)
+        return self._hashes[key]
+
+
+def _walk(element):
+    yield element
+    for child in getattr(element, "_children", {}).values():
+        yield from _walk(child)
+
+
+def feature_group_script(feature_group: folium.FeatureGroup) -> str:
+    """Serialize a FeatureGroup for st_folium's `feature_group_to_add`, without the base map."""
+    # only the stand-in map's id ends up in the script, and st_folium rewrites it to map_div
+    return streamlit_folium._get_feature_group_string(feature_group, map=folium.Map(tiles=None))
+
+
+def show_map(payload: MapPayload, key: str, width: int | None = 500, height: int = 700,
+             returned_objects=None, feature_group_to_add: folium.FeatureGroup | None = None) -> dict:
+    """
+    st_folium() for a cached MapPayload: same component, same arguments and
+    return value, but the map itself is not re-rendered.
+    """
+    if payload.map is not None:
+        with payload._render_lock:
+            return st_folium(payload.map, key=key, width=width, height=height,
+                             returned_objects=returned_objects, feature_group_to_add=feature_group_to_add)
+
+    defaults = {
+        "last_clicked": None,
+        "last_object_clicked": None,
+        "last_object_clicked_count": None,
+        "last_object_clicked_tooltip": None,
+        "last_object_clicked_popup": None,
+        "all_drawings": None,
+        "last_active_drawing": None,
+        "bounds": payload.bounds,
+        "zoom": payload.zoom,
+        "last_circle_radius": None,
+        "last_circle_polygon": None,
+        "selected_layers": None,
+        "selected_tags": None,
+        "last_geocoder_result": None,
+    }
+    if returned_objects is not None:
+        defaults = {k: v for k, v in defaults.items() if k in returned_objects}
+
+    hash_key = payload.component_key(key)
+
+    def on_change():
+        st.session_state[key] = st.session_state.get(hash_key, {})
+
+    return streamlit_folium._component_func(
+        script=payload.script,
+        header=payload.header,
+        html=payload.html,
+        id=payload.map_id,
+        key=hash_key,
+        height=height,
+        width=width,
+        returned_objects=returned_objects,
+        default=defaults,
+        zoom=None,
+        center=None,
+        feature_group=feature_group_script(feature_group_to_add) if feature_group_to_add is not None else None,
+        return_on_hover=False,
+        layer_control=None,
+        pixelated=False,
+        css_links=payload.css_links,
+        js_links=payload.js_links,
+        on_change=on_change,
+        wrap_longitude=False,
+    )
+
+
+class MapCache:
+    """Bounded LRU of MapPayload entries, safe to share between sessions."""
+
+    def __init__(self, max_entries: int = 16):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, MapPayload] = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_locks = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> MapPayload | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return entry
+
+    def put(self, key: str, payload: MapPayload) -> MapPayload:
+        with self._lock:
+            self._entries[key] = payload
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return payload
+
+    def get_or_build(self, key: str, build) -> MapPayload:
+        """
+        Return the cached payload for `key`, or call `build()` (which must
+        return a folium.Map), serialize it once and store it. Sessions asking
+        for the same key at the same time wait for one build.
+        """
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+        with build_lock:
+            entry = self.get(key)
+            if entry is None:
+                with self._lock:
+                    self.misses += 1
+                entry = self.put(key, MapPayload(build()))
+        with self._lock:
+            self._build_locks.pop(key, None)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
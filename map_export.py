@@ -0,0 +1,386 @@
+"""
+Static PNG / SVG export of screening maps, without a browser.
+
+A region is rendered by stitching basemap (and optional OpenInfraMap) tiles
+from the tile_proxy.py cache, then drawing OSM lines (same colours / weights
+as map_layers.line_style_function), OSM substations (blue circles) and REE
+connection points (red, as the plug markers) on top.
+
+Regions are independent, so a batch is spread over worker processes; each
+worker opens the line store memory-mapped (line.store/) instead of
+re-reading line.geojson. Missing tiles are downloaded on the fly except for
+osm: tile.openstreetmap.org does not allow bulk downloads, so OSM tiles come
+from the cache only unless --upstream osm=... points at another server.
+
+    python map_export.py --regions regions.json --ree 2025_11_*_generacion.xlsx \
+        --min-class "220 kV" --format png svg --out exports
+
+regions.json: [{"name": "madrid", "bbox": [-4.0, 40.0, -3.4, 40.7]}, ...]
+"""
+
+import argparse
+import base64
+import glob
+import io
+import json
+import math
+import os
+import time
+import urllib.error
+from concurrent.futures import ProcessPoolExecutor
+from html import escape
+
+import numpy as np
+import pandas as pd
+from PIL import Image, ImageDraw
+
+from line_store import LineStore, store_path_for
+from osm_geojson import SPAIN_BBOX, load_substation_table
+from osm_partitions import classes_at_or_above
+from osm_voltage import class_style
+from ree_capacity import load_ree_files, ree_columns
+from tile_proxy import (
+    DEFAULT_CACHE_DIR,
+    TileStore,
+    bulk_fetch_allowed,
+    fetch_tile,
+    lonlat_to_tile,
+    parse_upstream_overrides,
+    upstream_templates,
+)
+
+TILE_SIZE = 256
+DEFAULT_WIDTH = 1600
+REE_COLOR = "#d63e2a"          # folium.Icon(color="red")
+SUBSTATION_COLOR = "#0000ff"   # CircleMarker color="blue"
+MISSING_TILE_COLOR = (235, 235, 235, 255)
+
+
+# ========= Web Mercator pixel maths =========
+
+def lonlat_to_pixels(lons, lats, z: int) -> tuple[np.ndarray, np.ndarray]:
+    """Global pixel coordinates of lon/lat arrays at zoom z (256px tiles)."""
+    lons = np.asarray(lons, dtype="float64")
+    lats = np.clip(np.asarray(lats, dtype="float64"), -85.0511, 85.0511)
+    scale = TILE_SIZE * 2 ** z
+    x = (lons + 180.0) / 360.0 * scale
+    y = (1.0 - np.arcsinh(np.tan(np.radians(lats))) / math.pi) / 2.0 * scale
+    return x, y
+
+
+def pick_zoom(bbox, width: int, max_zoom: int = 16) -> int:
+    """Highest zoom at which the bbox is at most `width` pixels wide (tiles get downscaled, never up)."""
+    min_lon, _, max_lon, _ = bbox
+    for z in range(max_zoom, -1, -1):
+        x0, _ = lonlat_to_pixels(min_lon, 0, z)
+        x1, _ = lonlat_to_pixels(max_lon, 0, z)
+        if x1 - x0 <= width * 1.5:
+            return z
+    return 0
+
+
+# ========= Basemap =========
+
+def compose_basemap(tiles: TileStore, layers, bbox, z: int, upstreams=None) -> tuple[Image.Image, float, float]:
+    """
+    Stitch the tiles of `layers` (bottom first) covering bbox at zoom z.
+    Missing tiles of layers in `upstreams` are fetched into the cache, others are left blank.
+    Returns (image cropped to bbox, global pixel x / y of its top-left corner).
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    tx0, ty0 = lonlat_to_tile(min_lon, max_lat, z)
+    tx1, ty1 = lonlat_to_tile(max_lon, min_lat, z)
+    canvas = Image.new("RGBA", ((tx1 - tx0 + 1) * TILE_SIZE, (ty1 - ty0 + 1) * TILE_SIZE), MISSING_TILE_COLOR)
+
+    for layer in layers:
+        for tx in range(tx0, tx1 + 1):
+            for ty in range(ty0, ty1 + 1):
+                data = tiles.get(layer, z, tx, ty)
+                if data is None and upstreams and layer in upstreams:
+                    try:
+                        data = fetch_tile(upstreams[layer], z, tx, ty)
+                        tiles.put(layer, z, tx, ty, data)
+                    except (urllib.error.URLError, OSError):
+                        data = None
+                if data is None:
+                    continue
+                try:
+                    tile = Image.open(io.BytesIO(data)).convert("RGBA")
+                except OSError:
+                    continue   # not an image (e.g. a WMS error document)
+                canvas.alpha_composite(tile, ((tx - tx0) * TILE_SIZE, (ty - ty0) * TILE_SIZE))
+
+    x0, y0 = lonlat_to_pixels(min_lon, max_lat, z)
+    x1, y1 = lonlat_to_pixels(max_lon, min_lat, z)
+    left, top = float(x0) - tx0 * TILE_SIZE, float(y0) - ty0 * TILE_SIZE
+    box = (int(left), int(top), int(math.ceil(left + x1 - x0)), int(math.ceil(top + y1 - y0)))
+    return canvas.crop(box), float(x0), float(y0)
+
+
+# ========= Vector content of a region =========
+
+def region_features(bbox, lines: LineStore | None, substations: pd.DataFrame | None,
+                    ree: pd.DataFrame | None, min_class: str | None = None, operators=None,
+                    tolerance_deg: float = 0.0) -> dict:
+    """Lines (grouped by voltage class), substations and REE points inside bbox, filtered."""
+    classes = classes_at_or_above(min_class)
+    min_lon, min_lat, max_lon, max_lat = bbox
+
+    out = {"lines": [], "substations": np.empty((0, 2)), "ree": np.empty((0, 2))}
+    if lines is not None and len(lines):
+        mask = lines.bbox_mask(bbox) & lines.properties["voltage_class"].isin(classes).to_numpy()
+        if operators:
+            mask &= lines.properties["operator"].isin(operators).to_numpy()
+        sel = lines.select(mask)
+        if tolerance_deg > 0:
+            sel = sel.simplify(tolerance_deg)
+        coords = np.asarray(sel.coords)
+        offsets = np.asarray(sel.part_offsets)
+        feature_of_part = sel.feature_of_part()
+        labels = sel.properties["voltage_class"].to_numpy()
+        # draw low voltage first so the 400 kV network ends up on top
+        for label in reversed(classes):
+            parts = np.flatnonzero(labels[feature_of_part] == label)
+            if len(parts):
+                out["lines"].append((label, [coords[offsets[i]:offsets[i + 1]] for i in parts]))
+
+    def points_in_bbox(lon, lat):
+        keep = (lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat)
+        return np.column_stack([lon[keep], lat[keep]])
+
+    if substations is not None and len(substations):
+        subs = substations[substations["voltage_class"].isin(classes)]
+        if operators:
+            subs = subs[subs["operator"].isin(operators)]
+        out["substations"] = points_in_bbox(subs["lon"].to_numpy(), subs["lat"].to_numpy())
+    if ree is not None and len(ree):
+        out["ree"] = points_in_bbox(
+            ree["lon_wgs"].to_numpy(dtype="float64"), ree["lat_wgs"].to_numpy(dtype="float64")
+        )
+    return out
+
+
+def filter_ree(ree: pd.DataFrame, voltage_range=None, min_capacity=None) -> pd.DataFrame:
+    """Same voltage / available-capacity filters as the gst_sub.py sliders."""
+    cols = ree_columns(ree)
+    if voltage_range and cols["voltage"]:
+        ree = ree[ree[cols["voltage"]].between(*voltage_range)]
+    if min_capacity is not None and cols["cap_avail"]:
+        ree = ree[ree[cols["cap_avail"]] >= min_capacity]
+    return ree
+
+
+# ========= Writers =========
+
+def _to_image_xy(lonlat, z, origin_x, origin_y, scale):
+    x, y = lonlat_to_pixels(lonlat[:, 0], lonlat[:, 1], z)
+    return (x - origin_x) * scale, (y - origin_y) * scale
+
+
+def render_png(path: str, basemap: Image.Image, features: dict, z: int, origin_x: float, origin_y: float, scale: float):
+    img = basemap.copy()
+    overlay = Image.new("RGBA", img.size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+
+    for label, parts in features["lines"]:
+        style = class_style(label)
+        width = max(1, round(style["weight"]))
+        color = style["color"]
+        for part in parts:
+            if len(part) < 2:
+                continue
+            xs, ys = _to_image_xy(part, z, origin_x, origin_y, scale)
+            draw.line(list(zip(xs.tolist(), ys.tolist())), fill=color, width=width, joint="curve")
+    img.alpha_composite(Image.blend(Image.new("RGBA", img.size, (0, 0, 0, 0)), overlay, 0.9))
+
+    draw = ImageDraw.Draw(img)
+    for key, color, r in (("substations", SUBSTATION_COLOR, 5), ("ree", REE_COLOR, 6)):
+        if not len(features[key]):
+            continue
+        xs, ys = _to_image_xy(features[key], z, origin_x, origin_y, scale)
+        for x, y in zip(xs.tolist(), ys.tolist()):
+            draw.ellipse((x - r, y - r, x + r, y + r), fill=color, outline="white" if key == "ree" else color)
+
+    img.convert("RGB").save(path, "PNG", optimize=True)
+
+
+def render_svg(path: str, basemap: Image.Image, features: dict, z: int, origin_x: float, origin_y: float, scale: float):
+    buf = io.BytesIO()
+    basemap.convert("RGB").save(buf, "PNG", optimize=True)
+    w, h = basemap.size
+    out = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{w}" height="{h}" viewBox="0 0 {w} {h}">',
+        f'<image width="{w}" height="{h}" href="data:image/png;base64,{base64.b64encode(buf.getvalue()).decode()}"/>',
+    ]
+    for label, parts in features["lines"]:
+        style = class_style(label)
+        out.append(
+            f'<g class="lines" data-class="{escape(label)}" fill="none" stroke="{style["color"]}" '
+            f'stroke-width="{style["weight"]}" stroke-opacity="{style["opacity"]}" stroke-linejoin="round">'
+        )
+        for part in parts:
+            if len(part) < 2:
+                continue
+            xs, ys = _to_image_xy(part, z, origin_x, origin_y, scale)
+            out.append('<polyline points="' + " ".join(f"{x:.1f},{y:.1f}" for x, y in zip(xs, ys)) + '"/>')
+        out.append("</g>")
+    for key, color, r, stroke in (("substations", SUBSTATION_COLOR, 5, SUBSTATION_COLOR), ("ree", REE_COLOR, 6, "white")):
+        if not len(features[key]):
+            continue
+        xs, ys = _to_image_xy(features[key], z, origin_x, origin_y, scale)
+        out.append(f'<g class="{key}" fill="{color}" fill-opacity="0.85" stroke="{stroke}">')
+        out.extend(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="{r}"/>' for x, y in zip(xs, ys))
+        out.append("</g>")
+    out.append("</svg>")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(out))
+
+
+# ========= One region / a batch of regions =========
+
+_WORKER = {}
+
+
+def online_upstreams(options: dict) -> dict:
+    """
+    Upstream templates of the tile layers that may be fetched on a cache miss:
+    none with --offline, and never a server that forbids bulk downloads
+    (osm is read from the cache only, unless --upstream points it elsewhere).
+    """
+    if options.get("offline"):
+        return {}
+    upstreams = upstream_templates(options.get("upstreams"))
+    return {
+        layer: upstreams[layer]
+        for layer in options.get("tile_layers", ["osm"])
+        if layer in upstreams and bulk_fetch_allowed(upstreams[layer])
+    }
+
+
+def _init_worker(line_store_dir, lines_path, substations, ree, options):
+    """
+    Per-process state: the line store is memory-mapped, the small tables arrive
+    pickled once and the tile cache is opened once (TileStore scans its tree).
+    """
+    lines = None
+    if line_store_dir and os.path.isdir(line_store_dir):
+        lines = LineStore.load(line_store_dir, source_path=lines_path, bbox=SPAIN_BBOX)
+    tiles = TileStore(options.get("cache_dir", DEFAULT_CACHE_DIR))
+    _WORKER.update(lines=lines, substations=substations, ree=ree, options=options, tiles=tiles,
+                   upstreams=online_upstreams(options))
+
+
+def render_region(name: str, bbox, out_dir: str, formats=("png",)) -> list[str]:
+    """Render one region with the worker state set up by _init_worker; returns written paths."""
+    opts = _WORKER["options"]
+    width = opts.get("width", DEFAULT_WIDTH)
+    z = pick_zoom(bbox, width)
+
+    basemap, origin_x, origin_y = compose_basemap(
+        _WORKER["tiles"], opts.get("tile_layers", ["osm"]), bbox, z, _WORKER["upstreams"]
+    )
+
+    scale = width / basemap.width
+    basemap = basemap.resize((width, max(1, round(basemap.height * scale))), Image.LANCZOS)
+
+    # half an output pixel, in degrees: finer detail would not be visible
+    tolerance_deg = 0.5 * (bbox[2] - bbox[0]) / width
+    features = region_features(
+        bbox, _WORKER["lines"], _WORKER["substations"], _WORKER["ree"],
+        min_class=opts.get("min_class"), operators=opts.get("operators"), tolerance_deg=tolerance_deg,
+    )
+
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    for fmt in formats:
+        path = os.path.join(out_dir, f"{name}.{fmt}")
+        writer = render_png if fmt == "png" else render_svg
+        writer(path, basemap, features, z, origin_x, origin_y, scale)
+        written.append(path)
+    return written
+
+
+def render_regions(regions, out_dir: str, lines_path: str | None = "line.geojson",
+                   substations_path: str | None = "spain_substations.geojson", ree: pd.DataFrame | None = None,
+                   formats=("png",), workers: int | None = None, **options) -> list[str]:
+    """
+    Render every {"name", "bbox"} region. The line store is built once here
+    (if needed) and then memory-mapped by each worker process.
+    """
+    line_store_dir = None
+    if lines_path and os.path.exists(lines_path):
+        LineStore.load_or_build(lines_path, bbox=SPAIN_BBOX)
+        line_store_dir = store_path_for(lines_path)
+    substations = (
+        load_substation_table(substations_path, bbox=SPAIN_BBOX)
+        if substations_path and os.path.exists(substations_path) else None
+    )
+
+    initargs = (line_store_dir, lines_path, substations, ree, options)
+    workers = workers or min(len(regions), os.cpu_count() or 1)
+    if workers <= 1:
+        _init_worker(*initargs)
+        return [p for r in regions for p in render_region(r["name"], r["bbox"], out_dir, formats)]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+        futures = [pool.submit(render_region, r["name"], r["bbox"], out_dir, formats) for r in regions]
+        return [p for fut in futures for p in fut.result()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export screening maps of regions as PNG / SVG.")
+    parser.add_argument("--regions", help='JSON file: [{"name": ..., "bbox": [min_lon, min_lat, max_lon, max_lat]}]')
+    parser.add_argument("--bbox", type=float, nargs=4, metavar=("MIN_LON", "MIN_LAT", "MAX_LON", "MAX_LAT"))
+    parser.add_argument("--name", default="map", help="File name for --bbox.")
+    parser.add_argument("--ree", nargs="*", default=[], help="REE capacity exports (glob patterns allowed).")
+    parser.add_argument("--lines", default="line.geojson")
+    parser.add_argument("--substations", default="spain_substations.geojson")
+    parser.add_argument("--min-class", default=None, help='Minimum OSM voltage class, e.g. "220 kV".')
+    parser.add_argument("--operator", action="append", help="Only OSM features of this operator (repeatable).")
+    parser.add_argument("--voltage-range", type=float, nargs=2, metavar=("MIN_KV", "MAX_KV"))
+    parser.add_argument("--min-capacity", type=float, help="Min available capacity (MW) for REE points.")
+    parser.add_argument("--tile-layers", nargs="+", default=["osm"], help="Tile layers, bottom first.")
+    parser.add_argument("--format", nargs="+", default=["png"], choices=["png", "svg"])
+    parser.add_argument("--width", type=int, default=DEFAULT_WIDTH)
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--offline", action="store_true", help="Only use cached tiles (always the case for osm).")
+    parser.add_argument("--upstream", action="append", metavar="LAYER=URL", help="Override an upstream URL template.")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--out", default="exports")
+    args = parser.parse_args(argv)
+
+    if args.regions:
+        with open(args.regions, "r", encoding="utf-8") as f:
+            regions = json.load(f)
+    elif args.bbox:
+        regions = [{"name": args.name, "bbox": args.bbox}]
+    else:
+        parser.error("give --regions or --bbox")
+
+    ree = None
+    ree_paths = sorted(p for pattern in args.ree for p in glob.glob(pattern))
+    if ree_paths:
+        ree, errors = load_ree_files(ree_paths)
+        for err in errors:
+            print(f"skipped {err}")
+        ree = filter_ree(ree, args.voltage_range, args.min_capacity)
+
+    options = {"tile_layers": args.tile_layers, "offline": args.offline,
+               "upstreams": parse_upstream_overrides(args.upstream)}
+    cache_only = [layer for layer in args.tile_layers if layer not in online_upstreams(options)]
+    if cache_only and not args.offline:
+        print(f"Tile layers {', '.join(cache_only)} are read from {args.cache_dir} only (their server does not "
+              f"allow bulk downloads): view the regions through tile_proxy.py first or use --upstream.")
+
+    t0 = time.perf_counter()
+    written = render_regions(
+        regions, args.out, args.lines, args.substations, ree, formats=args.format, workers=args.workers,
+        min_class=args.min_class, operators=args.operator, tile_layers=args.tile_layers,
+        width=args.width, cache_dir=args.cache_dir, offline=args.offline,
+        upstreams=parse_upstream_overrides(args.upstream),
+    )
+    print(f"Wrote {len(written)} files to {args.out} in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""
+Layer definitions and builders for the grid screening map.
+
+Each layer is built in two steps:
+
+* a *payload* step that turns the source data into plain Python values
+  (marker tuples, an enriched GeoJSON dict) – this is the expensive part and
+  is what the Streamlit apps cache;
+* an `add_*` step that materializes the payload as Folium objects on a map.
+
+Only layers the user has switched on go through either step, so a hidden
+layer costs neither Python time nor HTML bytes.
+"""
+
+import json
+
+import folium
+import pandas as pd
+from branca.element import MacroElement
+from folium.plugins import MarkerCluster
+from jinja2 import Template
+
+from osm_voltage import class_style, parse_voltage_column
+from popup_templates import CARD_LINE, CARD_REE, CARD_SUBSTATION, CardPopups, add_popup_templates
+from tile_proxy import NATURA_2000_WMS_LAYER, NATURA_2000_WMS_URL, proxy_url, tile_url
+
+# ========= Layer names (also shown in the sidebar and LayerControl) =========
+
+LAYER_OIM_POWER = "OpenInfraMap – Power"
+LAYER_OIM_LOW_VOLTAGE = "OpenInfraMap – Low voltage"
+LAYER_OIM_SUBSTATIONS = "OpenInfraMap – Substations tile"
+LAYER_NATURA_2000 = "Natura 2000 (protected sites)"
+LAYER_SUBSTATIONS = "OSM Substations (GeoJSON, known voltage)"
+LAYER_LINES = "OSM transmission lines"
+LAYER_REE = "Spain connection points (REE, all files)"
+
+# ========= Raster layers (through the local tile proxy if GST_TILE_PROXY is set) =========
+
+OSM_BASE = {
+    "tiles": tile_url("osm"),
+    "name": "OpenStreetMap",
+    "attr": "&copy; OpenStreetMap contributors",
+}
+
+TILE_OVERLAYS = {
+    LAYER_OIM_POWER: tile_url("oim-power"),
+    LAYER_OIM_LOW_VOLTAGE: tile_url("oim-lowvoltage"),
+    LAYER_OIM_SUBSTATIONS: tile_url("oim-substations"),
+}
+OIM_ATTR = "&copy; OpenInfraMap, OpenStreetMap contributors"
+
+NATURA_2000_WMS = {
+    "url": NATURA_2000_WMS_URL,
+    "name": LAYER_NATURA_2000,
+    "layers": NATURA_2000_WMS_LAYER,     # from service metadata
+    "fmt": "image/png",
+    "transparent": True,
+    "version": "1.3.0",
+    "attr": "© MITECO – Red Natura 2000",
+}
+
+ALL_LAYERS = [
+    LAYER_OIM_POWER,
+    LAYER_OIM_LOW_VOLTAGE,
+    LAYER_OIM_SUBSTATIONS,
+    LAYER_NATURA_2000,
+    LAYER_SUBSTATIONS,
+    LAYER_LINES,
+    LAYER_REE,
+]
+# line.geojson is large, so it stays opt-in as before
+DEFAULT_LAYERS = [layer for layer in ALL_LAYERS if layer != LAYER_LINES]
+
+
+def add_base_layer(m: folium.Map):
+    folium.TileLayer(**OSM_BASE).add_to(m)
+
+
+def add_raster_overlays(m: folium.Map, selected):
+    """OpenInfraMap tiles + Natura 2000 WMS, only for the selected layer names."""
+    for name, url in TILE_OVERLAYS.items():
+        if name in selected:
+            folium.TileLayer(
+                tiles=url,
+                name=name,
+                attr=OIM_ATTR,
+                overlay=True,
+                control=True,
+            ).add_to(m)
+
+    if LAYER_NATURA_2000 in selected:
+        cached_url = proxy_url("natura2000")
+        if cached_url:
+            # the proxy serves the WMS as cached 256px EPSG:3857 tiles
+            folium.TileLayer(
+                tiles=cached_url,
+                name=LAYER_NATURA_2000,
+                attr=NATURA_2000_WMS["attr"],
+                overlay=True,
+                control=True,
+            ).add_to(m)
+        else:
+            folium.WmsTileLayer(**NATURA_2000_WMS, overlay=True, control=True).add_to(m)
+
+
+# ========= OSM substations =========
+
+def substation_markers(substations: pd.DataFrame) -> list[tuple]:
+    """(lat, lon, card values, tooltip) for every row of a osm_geojson.load_substation_table() table."""
+    markers = []
+    for lat, lon, name, voltage, operator in zip(
+        substations["lat"], substations["lon"], substations["name"],
+        substations["voltage"], substations["operator"],
+    ):
+        markers.append((lat, lon, [name, voltage, operator], name))
+    return markers
+
+
+def add_substation_layer(m: folium.Map, markers):
+    fg_sub = folium.FeatureGroup(name=LAYER_SUBSTATIONS)
+    for lat, lon, card, name in markers:
+        marker = folium.CircleMarker(
+            location=[lat, lon],
+            radius=5,
+            fill=True,
+            fill_opacity=0.85,
+            tooltip=name,
+            color="blue",
+        )
+        marker.options["card"] = card   # CircleMarker drops unknown keyword options
+        marker.add_to(fg_sub)
+    CardPopups(CARD_SUBSTATION).add_to(fg_sub)
+    add_popup_templates(m)
+    fg_sub.add_to(m)
+
+
+# ========= OSM transmission lines =========
+
+def line_style_function(feature):
+    """Color OSM lines by their precomputed voltage class (see enrich_lines)."""
+    props = feature.get("properties", {})
+    return class_style(props.get("voltage_class"))
+
+
+def line_voltage_label(props: dict) -> str:
+    """"400.0 kV", "400.0 / 220.0 kV" for multi-voltage lines, else the raw OSM tag."""
+    voltage_kv = props.get("voltage_kv")
+    voltage_min_kv = props.get("voltage_min_kv")
+    if isinstance(voltage_kv, (int, float)) and not pd.isna(voltage_kv):
+        if isinstance(voltage_min_kv, (int, float)) and voltage_min_kv < voltage_kv:
+            return f"{voltage_kv:.1f} / {voltage_min_kv:.1f} kV"
+        return f"{voltage_kv:.1f} kV"
+    return str(props.get("voltage", "Unknown"))
+
+
+def enrich_lines(lines: dict) -> dict:
+    """
+    Add the parsed voltage columns (if the features do not carry them yet) and
+    the voltage label of the popup card to every line feature (in place).
+    """
+    features = lines.get("features", [])
+    missing = [f for f in features if "voltage_class" not in f.get("properties", {})]
+    if missing:
+        parsed = parse_voltage_column(f.get("properties", {}).get("voltage") for f in missing)
+        for feat, row in zip(missing, parsed.to_dict("records")):
+            props = feat.setdefault("properties", {})
+            props.update({k: v for k, v in row.items() if not (isinstance(v, float) and pd.isna(v))})
+
+    for feat in features:
+        props = feat.get("properties", {})
+        props["voltage_label"] = line_voltage_label(props)
+    return lines
+
+
+def add_line_layer(m: folium.Map, lines: dict):
+    layer = folium.GeoJson(
+        lines,
+        name=LAYER_LINES,
+        style_function=line_style_function,
+        highlight_function=lambda feat: {
+            "weight": 5,
+            "color": "#000000",
+            "opacity": 1.0,
+        },
+        # NO tooltip -> no annoying hover box, only click popup (card filled from the properties)
+    ).add_to(m)
+    CardPopups(CARD_LINE, max_width=320).add_to(layer)
+    add_popup_templates(m)
+
+
+# ========= REE capacity points =========
+
+def ree_card_values(name, location_text, source, voltage_str, avail, occ) -> list:
+    """Values of a REE connection point card, in CARD_FIELDS["ree"] order."""
+    total = avail + occ
+    util_pct = (occ / total * 100) if total > 0 else 0.0
+    return [
+        str(name),
+        location_text,
+        source,
+        voltage_str,
+        f"{util_pct:.1f}%",
+        f"{avail:.1f} MW",
+        f"{occ:.1f} MW",
+        "gst-empty" if avail <= 0.0 else "",   # no usable capacity
+    ]
+
+
+def ree_markers(spain_df: pd.DataFrame, name_col=None, volt_col=None, cap_avail_col=None,
+                cap_occ_col=None, prov_col=None, muni_col=None) -> list[tuple]:
+    """(row_id, lat, lon, card values, tooltip) for every REE connection point (row_id = index label)."""
+    markers = []
+    for row_id, row in spain_df.iterrows():
+        lat = float(row["lat_wgs"])
+        lon = float(row["lon_wgs"])
+
+        source = row.get("source_file", "")
+
+        # Base info
+        name = row.get(name_col, "Connection point") if name_col else "Connection point"
+        province = row.get(prov_col, "") if prov_col else ""
+        municipio = row.get(muni_col, "") if muni_col else ""
+        location_text = ", ".join([x for x in [province, municipio] if x])
+
+        voltage_val = row.get(volt_col, "") if volt_col else ""
+        voltage_str = f"{voltage_val} kV" if voltage_val != "" else "N/A"
+
+        # Capacity info
+        avail = float(row.get(cap_avail_col, 0) or 0) if cap_avail_col else 0.0
+        occ   = float(row.get(cap_occ_col, 0) or 0)   if cap_occ_col   else 0.0
+
+        card = ree_card_values(name, location_text, source, voltage_str, avail, occ)
+        markers.append((int(row_id), lat, lon, card, name))
+    return markers
+
+
+class ReeMarkerRegistry(MacroElement):
+    """
+    Child of the REE MarkerCluster: indexes its markers by `reeId` in the
+    browser so a later ReeVisibility delta can show/hide them without
+    re-sending the markers.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            window.gstReeCluster = {{ this._parent.get_name() }};
+            window.gstReeMarkers = {};
+            {{ this._parent.get_name() }}.eachLayer(function (mk) {
+                window.gstReeMarkers[mk.options.reeId] = mk;
+            });
+        {% endmacro %}
+        """
+    )
+
+
+class ReeVisibility(MacroElement):
+    """
+    Show only part of the registered REE markers. `ids` are either the ids to
+    show (mode "show") or the ids to hide (mode "hide"), whichever is shorter.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            (function () {
+                var cluster = window.gstReeCluster, markers = window.gstReeMarkers;
+                if (!cluster || !markers) { return; }
+                var listed = new Set({{ this.ids_json }});
+                var show = {{ "true" if this.mode == "show" else "false" }};
+                var toAdd = [], toRemove = [];
+                for (var id in markers) {
+                    var visible = listed.has(+id) === show;
+                    if (visible && !cluster.hasLayer(markers[id])) { toAdd.push(markers[id]); }
+                    if (!visible && cluster.hasLayer(markers[id])) { toRemove.push(markers[id]); }
+                }
+                cluster.removeLayers(toRemove);
+                cluster.addLayers(toAdd);
+            })();
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, ids, mode: str = "show"):
+        super().__init__()
+        self._name = "ReeVisibility"
+        self.ids_json = json.dumps([int(i) for i in ids])
+        self.mode = mode
+
+
+def add_ree_layer(m: folium.Map, markers, registry: bool = False):
+    """
+    Red plug markers with "card" popup (filled in the browser), clustered. With `registry=True` the
+    markers are indexed in the browser for ree_visibility_group() deltas.
+    """
+    fg_es = folium.FeatureGroup(name=LAYER_REE)
+    mc_es = MarkerCluster().add_to(fg_es)
+
+    for ree_id, lat, lon, card, name in markers:
+        folium.Marker(
+            location=[lat, lon],
+            tooltip=name,
+            icon=folium.Icon(icon="plug", prefix="fa", color="red"),
+            ree_id=ree_id,
+            card=card,
+        ).add_to(mc_es)
+    CardPopups(CARD_REE).add_to(mc_es)
+    add_popup_templates(m)
+
+    if registry:
+        ReeMarkerRegistry().add_to(mc_es)
+
+    fg_es.add_to(m)
+
+
+def ree_visibility_group(all_ids, visible_ids) -> folium.FeatureGroup:
+    """
+    Empty FeatureGroup carrying the REE visibility delta, for show_map's
+    `feature_group_to_add`: it is the only part serialized on a slider rerun,
+    and the base map stays mounted in the browser.
+    """
+    all_ids = pd.Index(all_ids)
+    visible_ids = pd.Index(visible_ids)
+    hidden_ids = all_ids.difference(visible_ids)
+
+    fg = folium.FeatureGroup(name="REE filter", control=False)
+    if len(hidden_ids) < len(visible_ids):
+        ReeVisibility(hidden_ids, mode="hide").add_to(fg)
+    else:
+        ReeVisibility(visible_ids, mode="show").add_to(fg)
+    return fg
@@ -0,0 +1,291 @@
+"""
+Streaming loaders for large OSM GeoJSON exports (Overpass / OpenInfraMap).
+
+`json.load` on a full-Europe `line.geojson` materializes the whole file as
+Python dicts before anything is filtered. Here the `features` array is read
+feature by feature from fixed-size chunks, each feature is validated and
+bounding-box filtered as soon as it is decoded, and only what is kept ends up
+in the output (typed NumPy arrays / a pandas table). Peak memory therefore
+follows the size of the output, not of the raw JSON.
+"""
+
+import json
+from array import array
+
+import numpy as np
+import pandas as pd
+
+from osm_voltage import parse_voltage_column
+
+# (min_lon, min_lat, max_lon, max_lat)
+SPAIN_BBOX = (-18.5, 27.5, 4.5, 44.0)   # incl. Canary Islands
+
+CHUNK_SIZE = 1 << 20
+_WHITESPACE = " \t\r\n"
+
+LINE_PROPERTY_FIELDS = ["@id", "name", "operator", "voltage", "circuits", "cables", "frequency"]
+
+
+# ========= Feature-by-feature reader =========
+
+def _seek_features(f, decoder, chunk_size: int, path: str):
+    """
+    Read `f` up to the top-level "features" array and return (buf, pos) with
+    pos just past its '[' (None if there is none). Other top-level members are
+    decoded and dropped, so a "features" key nested in them is not picked up.
+    """
+    buf = ""
+    pos = 0
+    eof = False
+    state = "start"   # start -> key -> colon -> value -> key ...
+    key = None
+    while True:
+        while pos < len(buf) and buf[pos] in _WHITESPACE:
+            pos += 1
+        try:
+            if pos >= len(buf):
+                raise json.JSONDecodeError("need more data", buf, pos)
+            c = buf[pos]
+            if state == "start":
+                if c != "{":
+                    return None
+                pos += 1
+                state = "key"
+            elif state == "key":
+                if c == "}":
+                    return None
+                if c == ",":
+                    pos += 1
+                    continue
+                key, pos = decoder.raw_decode(buf, pos)
+                state = "colon"
+            elif state == "colon":
+                if c != ":":
+                    raise ValueError(f"Invalid GeoJSON in {path}")
+                pos += 1
+                state = "value"
+            else:
+                if key == "features" and c == "[":
+                    return buf, pos + 1
+                _, end = decoder.raw_decode(buf, pos)
+                if end == len(buf) and not eof:   # a number may continue in the next chunk
+                    raise json.JSONDecodeError("need more data", buf, pos)
+                pos = end
+                state = "key"
+        except json.JSONDecodeError:
+            if eof:
+                raise ValueError(f"Truncated GeoJSON in {path}")
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+
+
+def iter_features(path: str, bbox=None, chunk_size: int = CHUNK_SIZE):
+    """
+    Yield the features of a GeoJSON FeatureCollection one at a time.
+    With `bbox` (min_lon, min_lat, max_lon, max_lat) only features whose
+    coordinate envelope overlaps the box are yielded.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        found = _seek_features(f, decoder, chunk_size, path)
+        if found is None:
+            return
+        buf, pos = found
+        eof = False
+
+        while True:
+            # skip separators
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return
+
+            try:
+                if pos >= len(buf):
+                    raise json.JSONDecodeError("need more data", buf, pos)
+                feature, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise ValueError(f"Truncated GeoJSON in {path}")
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buf = buf[pos:] + chunk
+                pos = 0
+                continue
+
+            pos = end
+            if bbox is None or feature_in_bbox(feature, bbox):
+                yield feature
+
+            # drop what has been consumed so the buffer stays ~chunk_size
+            if pos > chunk_size:
+                buf = buf[pos:]
+                pos = 0
+
+
+def _iter_positions(coords):
+    """All [lon, lat] positions of a (nested) GeoJSON coordinates array."""
+    if coords and isinstance(coords[0], (int, float)):
+        yield coords
+        return
+    for c in coords or []:
+        yield from _iter_positions(c)
+
+
+def feature_in_bbox(feature, bbox) -> bool:
+    """True if the envelope of the feature's coordinates overlaps `bbox`."""
+    geom = feature.get("geometry") or {}
+    min_lon, min_lat, max_lon, max_lat = bbox
+    lons = []
+    lats = []
+    for pos in _iter_positions(geom.get("coordinates")):
+        if len(pos) < 2 or not isinstance(pos[0], (int, float)) or not isinstance(pos[1], (int, float)):
+            continue
+        lons.append(pos[0])
+        lats.append(pos[1])
+    if not lons:
+        return False
+    return not (
+        max(lons) < min_lon or min(lons) > max_lon
+        or max(lats) < min_lat or min(lats) > max_lat
+    )
+
+
+# ========= Substations =========
+
+def is_valid_feature(feature):
+    """
+    Return True only if the feature has clean geometry + relevant info.
+    Filters OUT all substations where voltage is not known.
+    """
+    geom = feature.get("geometry")
+    if not geom:
+        return False
+
+    if geom.get("type") != "Point":
+        return False
+
+    coords = geom.get("coordinates")
+    if not coords or len(coords) != 2:
+        return False
+
+    lon, lat = coords
+    if (
+        lon is None or lat is None
+        or lon in ["", "N/A"] or lat in ["", "N/A"]
+    ):
+        return False
+
+    props = feature.get("properties", {})
+    name = props.get("name")
+    voltage = props.get("voltage")
+    operator = props.get("operator")
+
+    # require a non-empty voltage value
+    if not voltage:
+        return False
+
+    # basic quality requirement
+    if not name and not operator:
+        return False
+
+    return True
+
+
+def load_substation_table(path: str, bbox=None) -> pd.DataFrame:
+    """
+    Valid substations (see is_valid_feature) as a compact table:
+    float64 'lat' / 'lon', categorical 'name', 'voltage', 'operator' and the
+    parsed voltage columns of osm_voltage.parse_voltage_column().
+    """
+    lats = array("d")
+    lons = array("d")
+    names = []
+    voltages = []
+    operators = []
+
+    for feature in iter_features(path, bbox=bbox):
+        if not is_valid_feature(feature):
+            continue
+        props = feature.get("properties", {})
+        lon, lat = feature["geometry"]["coordinates"]
+        try:
+            lons.append(float(lon))
+            lats.append(float(lat))
+        except (TypeError, ValueError):
+            continue
+        names.append(props.get("name", "Substation"))
+        voltages.append(str(props.get("voltage", "Unknown")))
+        operators.append(props.get("operator", "Unknown"))
+
+    table = pd.DataFrame(
+        {
+            "lat": np.frombuffer(lats, dtype="float64"),
+            "lon": np.frombuffer(lons, dtype="float64"),
+            "name": pd.Categorical(names),
+            "voltage": pd.Categorical(voltages),
+            "operator": pd.Categorical(operators),
+        }
+    )
+    return table.join(parse_voltage_column(voltages))
+
+
+# ========= Transmission lines =========
+
+def load_line_arrays(path: str, bbox=None) -> dict:
+    """
+    Stream LineString / MultiLineString features into flat arrays:
+
+    * 'coords'        – (n, 2) float64 [lon, lat] of every vertex
+    * 'part_offsets'  – int64, vertices of part i are coords[part_offsets[i]:part_offsets[i + 1]]
+    * 'feature_parts' – int64, parts of feature j are feature_parts[j]:feature_parts[j + 1]
+    * 'properties'    – DataFrame (one row per feature) of LINE_PROPERTY_FIELDS +
+                        the parsed voltage columns (see osm_voltage.VOLTAGE_COLUMNS)
+    """
+    coords = array("d")
+    part_offsets = array("q", [0])
+    feature_parts = array("q", [0])
+    props_cols = {field: [] for field in LINE_PROPERTY_FIELDS}
+
+    for feature in iter_features(path, bbox=bbox):
+        geom = feature.get("geometry") or {}
+        if geom.get("type") == "LineString":
+            parts = [geom.get("coordinates") or []]
+        elif geom.get("type") == "MultiLineString":
+            parts = geom.get("coordinates") or []
+        else:
+            continue
+
+        n_parts = 0
+        for part in parts:
+            n_vertices = 0
+            for pos in part:
+                if pos is None or len(pos) < 2:
+                    continue
+                coords.append(float(pos[0]))
+                coords.append(float(pos[1]))
+                n_vertices += 1
+            if n_vertices >= 2:
+                part_offsets.append(part_offsets[-1] + n_vertices)
+                n_parts += 1
+            elif n_vertices:
+                del coords[-2:]   # a one-point part is not a line: drop its vertex
+        if not n_parts:
+            continue
+        feature_parts.append(feature_parts[-1] + n_parts)
+
+        props = feature.get("properties") or {}
+        for field in LINE_PROPERTY_FIELDS:
+            value = props.get(field)
+            props_cols[field].append(None if value is None else str(value))
+
+    properties = pd.DataFrame(props_cols).join(parse_voltage_column(props_cols["voltage"]))
+    return {
+        "coords": np.frombuffer(coords, dtype="float64").reshape(-1, 2),
+        "part_offsets": np.frombuffer(part_offsets, dtype="int64"),
+        "feature_parts": np.frombuffer(feature_parts, dtype="int64"),
+        "properties": properties,
+    }
+
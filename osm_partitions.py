@@ -0,0 +1,63 @@
+"""
+Precomputed partitions of the OSM substation / line tables by voltage class and
+operator, so the map can ship only the features a user is screening for
+(e.g. "≥220 kV only") without rescanning the tables on every rerun.
+"""
+
+import numpy as np
+import pandas as pd
+
+from osm_voltage import OTHER_CLASS, class_labels, voltage_class_index
+
+
+def classes_at_or_above(min_class: str | None) -> list[str]:
+    """Voltage class labels at or above `min_class` (all labels, incl. 'other', for None)."""
+    labels = class_labels()
+    if min_class is None or min_class == OTHER_CLASS:
+        return labels
+    return labels[: labels.index(min_class) + 1]
+
+
+class FeaturePartitions:
+    """Row positions of a feature table grouped by voltage class and by operator."""
+
+    def __init__(self, voltage_class, operator):
+        self.n = len(voltage_class)
+        self.by_class = voltage_class_index(voltage_class)
+
+        operator = pd.Series(np.asarray(operator, dtype=object)).fillna("Unknown").astype(str)
+        codes, uniques = pd.factorize(operator)
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        self.by_operator = {
+            op: order[bounds[i]:bounds[i + 1]] for i, op in enumerate(uniques)
+        }
+
+    @classmethod
+    def from_table(cls, table: pd.DataFrame):
+        """Partitions of a table with 'voltage_class' and 'operator' columns."""
+        return cls(table["voltage_class"], table["operator"])
+
+    def operators(self) -> list[str]:
+        """Operator names, most features first."""
+        return sorted(self.by_operator, key=lambda op: (-len(self.by_operator[op]), op))
+
+    def select(self, classes=None, operators=None) -> np.ndarray:
+        """
+        Sorted row positions in any of `classes` and (if given) any of `operators`.
+        None / empty operators means no operator filter.
+        """
+        if classes is None:
+            mask = np.ones(self.n, dtype=bool)
+        else:
+            mask = np.zeros(self.n, dtype=bool)
+            for label in classes:
+                mask[self.by_class.get(label, [])] = True
+
+        if operators:
+            op_mask = np.zeros(self.n, dtype=bool)
+            for op in operators:
+                op_mask[self.by_operator.get(op, [])] = True
+            mask &= op_mask
+
+        return np.flatnonzero(mask)
@@ -0,0 +1,82 @@
+"""
+Helpers for the OSM `voltage` tag (values in volts, e.g. "400000" or
+"400000;220000") and the voltage classes used to style and index lines.
+"""
+
+import numpy as np
+import pandas as pd
+
+# (lower bound in V, class label, line colour, line weight) – highest first
+VOLTAGE_CLASSES = [
+    (380000, "400 kV", "#d73027", 3),     # ~400 kV
+    (220000, "220 kV", "#fc8d59", 2.5),   # ~220 kV
+    (110000, "110 kV", "#4575b4", 2),     # ~110 kV
+]
+OTHER_CLASS = "other"
+OTHER_STYLE = ("#666666", 2)
+
+# typed columns added next to the raw `voltage` tag by parse_voltage_column()
+VOLTAGE_COLUMNS = ["voltage_kv", "voltage_min_kv", "voltage_count", "voltage_class"]
+
+
+def class_style(label: str) -> dict:
+    """Leaflet path style for a voltage class label."""
+    color, weight = OTHER_STYLE
+    for _, cls_label, cls_color, cls_weight in VOLTAGE_CLASSES:
+        if cls_label == label:
+            color, weight = cls_color, cls_weight
+            break
+    return {"color": color, "weight": weight, "opacity": 0.9}
+
+
+# ========= Vectorized parsing (whole columns at once) =========
+
+def parse_voltage_column(values) -> pd.DataFrame:
+    """
+    Parse a column of raw OSM voltage tags in one pass.
+
+    Every ';'-separated value is read (so "400000;220000" keeps both), values
+    that are not numeric are ignored instead of discarding the whole tag.
+    Returns one row per input with float64 'voltage_kv' (highest value),
+    'voltage_min_kv', int 'voltage_count' and the categorical 'voltage_class'
+    of the highest value.
+    """
+    raw = pd.Series(list(values), dtype="string")
+    parts = raw.str.split(";").explode()
+    volts = pd.to_numeric(
+        parts.str.extract(r"^\s*(\d+(?:\.\d+)?)\s*(?:[vV])?\s*$", expand=False),
+        errors="coerce",
+    )
+    grouped = volts.groupby(level=0)
+    vmax = grouped.max().reindex(raw.index).to_numpy(dtype="float64")
+    vmin = grouped.min().reindex(raw.index).to_numpy(dtype="float64")
+    count = grouped.count().reindex(raw.index, fill_value=0).to_numpy(dtype="int64")
+
+    return pd.DataFrame(
+        {
+            "voltage_kv": vmax / 1000.0,
+            "voltage_min_kv": vmin / 1000.0,
+            "voltage_count": count,
+            "voltage_class": voltage_classes(vmax),
+        }
+    )
+
+
+def class_labels() -> list[str]:
+    """All voltage class labels, highest first, ending with 'other'."""
+    return [label for _, label, _, _ in VOLTAGE_CLASSES] + [OTHER_CLASS]
+
+
+def voltage_classes(volts) -> pd.Categorical:
+    """VOLTAGE_CLASSES label (or 'other') for each voltage in volts (NaN -> 'other')."""
+    volts = np.asarray(volts, dtype="float64")
+    labels = class_labels()
+    conditions = [volts >= lower for lower, _, _, _ in VOLTAGE_CLASSES]
+    codes = np.select(conditions, np.arange(len(VOLTAGE_CLASSES)), default=len(VOLTAGE_CLASSES))
+    return pd.Categorical.from_codes(codes, categories=labels)
+
+
+def voltage_class_index(classes) -> dict[str, np.ndarray]:
+    """Row positions per voltage class label, e.g. {"400 kV": array([...]), ...}."""
+    classes = np.asarray(classes, dtype=object)
+    return {label: np.flatnonzero(classes == label) for label in class_labels()}
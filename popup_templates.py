@@ -0,0 +1,208 @@
+"""
+Popup cards for the map, rendered in the browser from shared templates.
+
+Building a full inline-styled HTML card per feature in Python made every REE
+marker, substation and line carry its own copy of the same markup, both in
+the cached payloads and in the page. Here the CSS and one template per card
+type are sent once per page (PopupTemplates); features only carry their raw
+values and Leaflet fills the template when a popup is opened.
+
+Templates use {field} and {field|default} placeholders (the default is used
+for missing or empty values); every value is HTML-escaped. render_card() fills
+the same templates in Python, e.g. to check a layout or its size.
+"""
+
+import html
+import json
+import re
+
+from branca.element import MacroElement
+from jinja2 import Template
+
+CARD_CSS = """
+.gst-card { font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif; width: 260px; padding: 8px 10px; }
+.gst-title { font-size: 16px; font-weight: 600; margin-bottom: 2px; }
+.gst-sub { font-size: 12px; color: #666; margin-bottom: 6px; }
+.gst-src { font-size: 10px; color: #999; margin-bottom: 6px; }
+.gst-rule { height: 1px; background-color: #555; margin: 4px 0 8px 0; }
+.gst-ree .gst-sub { margin-bottom: 3px; }
+.gst-ree .gst-rule { background-color: #e33; }
+.gst-box { border-radius: 8px; background: #f7f7f9; padding: 8px; margin-bottom: 6px; font-size: 12px; color: #333; }
+.gst-box-title { font-size: 12px; font-weight: 600; margin-bottom: 4px; color: #000; }
+.gst-tiles { display: flex; justify-content: space-between; margin-bottom: 10px; }
+.gst-tile { flex: 1; margin: 0 4px; padding: 6px 4px; background: #f7f7f9; border-radius: 6px; text-align: center; }
+.gst-tile:first-child { margin-left: 0; }
+.gst-tile:last-child { margin-right: 0; }
+.gst-tile-label { font-size: 10px; color: #888; text-transform: uppercase; }
+.gst-tile-value { font-size: 18px; font-weight: 600; margin-top: 2px; }
+.gst-cap { border-radius: 8px; border-left: 4px solid #ffb01f; background: #fff8e6; padding: 8px 8px 6px 8px; margin-bottom: 8px; }
+.gst-cap-row { display: flex; justify-content: space-between; font-size: 12px; }
+.gst-right { text-align: right; }
+.gst-muted { color: #666; }
+.gst-mw { font-size: 14px; font-weight: 600; color: #111; }
+.gst-occ { color: #d33636; }
+.gst-note { font-size: 10px; color: #888; }
+.gst-nocap { display: none; font-size: 10px; color: #d00; }
+.gst-empty .gst-avail { color: #d00; }
+.gst-empty .gst-nocap { display: block; }
+.gst-foot { font-size: 10px; color: #999; }
+"""
+
+LINE_CARD = """
+<div class="gst-card">
+  <div class="gst-title">{name|Transmission line}</div>
+  <div class="gst-sub">⚙️ Operator: {operator|Unknown}</div>
+  <div class="gst-rule"></div>
+  <div class="gst-box">
+    <div class="gst-box-title">⚡ Electrical characteristics</div>
+    <b>Voltage:</b> {voltage_label|Unknown}<br>
+    <b>Circuits:</b> {circuits|N/A}<br>
+    <b>Cables:</b> {cables|N/A}<br>
+    <b>Frequency:</b> {frequency|N/A}
+  </div>
+  <div class="gst-foot">Data: OpenStreetMap / OpenInfraMap</div>
+</div>
+"""
+
+SUBSTATION_CARD = """
+<b>{name|Substation}</b><br>
+Voltage: {voltage|Unknown}<br>
+Operator: {operator|Unknown}
+"""
+
+REE_CARD = """
+<div class="gst-card gst-ree {state}">
+  <div class="gst-title">{name|Connection point}</div>
+  <div class="gst-sub">📍 {location|Spain}</div>
+  <div class="gst-src">Source: {source}</div>
+  <div class="gst-rule"></div>
+  <div class="gst-tiles">
+    <div class="gst-tile"><div class="gst-tile-label">Voltage level</div><div class="gst-tile-value">{voltage|N/A}</div></div>
+    <div class="gst-tile"><div class="gst-tile-label">Utilization</div><div class="gst-tile-value">{util}</div></div>
+  </div>
+  <div class="gst-cap">
+    <div class="gst-box-title">⚡ Capacity Overview (MW)</div>
+    <div class="gst-cap-row">
+      <div>
+        <div class="gst-muted">Available Capacity</div>
+        <div class="gst-mw gst-avail">{avail}</div>
+        <div class="gst-nocap">● No usable capacity</div>
+      </div>
+      <div class="gst-right">
+        <div class="gst-muted">Occupied Capacity</div>
+        <div class="gst-mw gst-occ">{occ}</div>
+        <div class="gst-note">{util} utilized</div>
+      </div>
+    </div>
+  </div>
+</div>
+"""
+
+CARD_LINE = "line"
+CARD_SUBSTATION = "substation"
+CARD_REE = "ree"
+
+TEMPLATES = {
+    CARD_LINE: LINE_CARD,
+    CARD_SUBSTATION: SUBSTATION_CARD,
+    CARD_REE: REE_CARD,
+}
+
+# markers carry their values as a list in this order (options.card)
+CARD_FIELDS = {
+    CARD_SUBSTATION: ["name", "voltage", "operator"],
+    CARD_REE: ["name", "location", "source", "voltage", "util", "avail", "occ", "state"],
+}
+
+_PLACEHOLDER = re.compile(r"\{(\w+)(?:\|([^}]*))?\}")
+
+
+def _compact(markup: str) -> str:
+    return re.sub(r">\s+<", "><", re.sub(r"\s*\n\s*", "\n", markup.strip())).replace("\n", " ")
+
+
+def render_card(kind: str, values) -> str:
+    """Fill the `kind` template with a dict, or a list in CARD_FIELDS order."""
+    if not isinstance(values, dict):
+        values = dict(zip(CARD_FIELDS[kind], values))
+
+    def fill(match):
+        value = values.get(match.group(1))
+        if value is None or value == "":
+            value = match.group(2) or ""
+        return html.escape(str(value))
+
+    return _PLACEHOLDER.sub(fill, _compact(TEMPLATES[kind]))
+
+
+class PopupTemplates(MacroElement):
+    """
+    Page-level card CSS + templates and window.gstCard(kind, values), the
+    browser counterpart of render_card(). Add it once per map (add_popup_templates).
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            if (!window.gstCard) {
+                var gstStyle = document.createElement("style");
+                gstStyle.textContent = {{ this.css_json }};
+                document.head.appendChild(gstStyle);
+                window.gstTemplates = {{ this.templates_json }};
+                window.gstFields = {{ this.fields_json }};
+                window.gstCard = function (kind, values) {
+                    if (Array.isArray(values)) {
+                        var named = {};
+                        window.gstFields[kind].forEach(function (f, i) { named[f] = values[i]; });
+                        values = named;
+                    }
+                    return window.gstTemplates[kind].replace(/\\{(\\w+)(?:\\|([^}]*))?\\}/g, function (_, key, dflt) {
+                        var v = values[key];
+                        if (v === undefined || v === null || v === "") { v = dflt || ""; }
+                        return String(v).replace(/[&<>"']/g, function (c) { return "&#" + c.charCodeAt(0) + ";"; });
+                    });
+                };
+            }
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self):
+        super().__init__()
+        self._name = "PopupTemplates"
+        self.css_json = json.dumps(re.sub(r"\s*\n\s*", "", CARD_CSS))
+        self.templates_json = json.dumps({k: _compact(t) for k, t in TEMPLATES.items()}, ensure_ascii=False)
+        self.fields_json = json.dumps(CARD_FIELDS)
+
+
+class CardPopups(MacroElement):
+    """
+    Child of a FeatureGroup / MarkerCluster / GeoJson: binds a `kind` card
+    popup to each of its layers, filled from the marker's options.card
+    (markers) or the feature's properties (GeoJson) when it is opened.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            {{ this._parent.get_name() }}.eachLayer(function (layer) {
+                layer.bindPopup(function (l) {
+                    var values = l.feature ? l.feature.properties : l.options.card;
+                    return window.gstCard({{ this.kind_json }}, values || {});
+                }, {maxWidth: {{ this.max_width }}});
+            });
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, kind: str, max_width: int = 300):
+        super().__init__()
+        self._name = "CardPopups"
+        self.kind_json = json.dumps(kind)
+        self.max_width = int(max_width)
+
+
+def add_popup_templates(m):
+    """Add PopupTemplates to map `m` unless it already has them."""
+    if not any(isinstance(child, PopupTemplates) for child in m._children.values()):
+        PopupTemplates().add_to(m)
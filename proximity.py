@@ -0,0 +1,149 @@
+"""
+Radius search over every point layer of the screening map
+(REE connection points, OSM substations, transformers).
+
+Points are stored as unit vectors on the sphere in a KD-tree; the straight
+(chord) distance between unit vectors is monotonic in the great-circle
+distance, so a chord-radius query returns exactly the points within a
+haversine radius, and the great-circle distance is recovered from the chord.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_KM = 6371.0088
+
+POINT_COLUMNS = ["layer", "name", "lat", "lon", "voltage_kv", "available_mw", "detail"]
+
+
+def _unit_vectors(lats, lons) -> np.ndarray:
+    lat = np.radians(np.asarray(lats, dtype="float64"))
+    lon = np.radians(np.asarray(lons, dtype="float64"))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+def _km_to_chord(km):
+    return 2.0 * np.sin(np.minimum(km / EARTH_RADIUS_KM, np.pi) / 2.0)
+
+
+def _chord_to_km(chord):
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2.0, 0.0, 1.0))
+
+
+# ========= Layer -> point table helpers =========
+
+def ree_points(spain_df: pd.DataFrame, name_col=None, volt_col=None, cap_avail_col=None) -> pd.DataFrame:
+    """REE connection points (already converted to lat_wgs / lon_wgs)."""
+    if spain_df is None or spain_df.empty:
+        return pd.DataFrame(columns=POINT_COLUMNS)
+    n = len(spain_df)
+    return pd.DataFrame(
+        {
+            "layer": "REE connection point",
+            "name": spain_df[name_col].to_numpy() if name_col else "Connection point",
+            "lat": spain_df["lat_wgs"].to_numpy(dtype="float64"),
+            "lon": spain_df["lon_wgs"].to_numpy(dtype="float64"),
+            "voltage_kv": spain_df[volt_col].to_numpy(dtype="float64") if volt_col else np.full(n, np.nan),
+            "available_mw": (
+                spain_df[cap_avail_col].to_numpy(dtype="float64") if cap_avail_col else np.full(n, np.nan)
+            ),
+            "detail": spain_df["source_file"].to_numpy() if "source_file" in spain_df.columns else "",
+        }
+    )
+
+
+def substation_points(substations: pd.DataFrame) -> pd.DataFrame:
+    """OSM substations from a osm_geojson.load_substation_table() table."""
+    if substations is None or substations.empty:
+        return pd.DataFrame(columns=POINT_COLUMNS)
+    return pd.DataFrame(
+        {
+            "layer": "OSM substation",
+            "name": substations["name"].astype(object).to_numpy(),
+            "lat": substations["lat"].to_numpy(dtype="float64"),
+            "lon": substations["lon"].to_numpy(dtype="float64"),
+            "voltage_kv": substations["voltage_kv"].to_numpy(dtype="float64"),
+            "available_mw": np.nan,
+            "detail": substations["operator"].astype(object).to_numpy(),
+        }
+    )
+
+
+def transformer_points(df: pd.DataFrame) -> pd.DataFrame:
+    """Transformers with midpoint coordinates (lat_mid / lon_mid), as in transformers_with_coords.xlsx."""
+    if df is None or df.empty or "lat_mid" not in df.columns:
+        return pd.DataFrame(columns=POINT_COLUMNS)
+    df = df.dropna(subset=["lat_mid", "lon_mid"])
+    n = len(df)
+    voltages = (
+        df[["voltage_bus0", "voltage_bus1"]].apply(pd.to_numeric, errors="coerce").max(axis=1).to_numpy()
+        if {"voltage_bus0", "voltage_bus1"} <= set(df.columns)
+        else np.full(n, np.nan)
+    )
+    rating = pd.to_numeric(df["s_nom"], errors="coerce") if "s_nom" in df.columns else pd.Series(np.nan, index=df.index)
+    return pd.DataFrame(
+        {
+            "layer": "Transformer",
+            "name": df["transformer_id"].astype(str).to_numpy() if "transformer_id" in df.columns else "Transformer",
+            "lat": df["lat_mid"].to_numpy(dtype="float64"),
+            "lon": df["lon_mid"].to_numpy(dtype="float64"),
+            "voltage_kv": voltages,
+            "available_mw": np.nan,
+            "detail": [f"{r:.0f} MVA" if pd.notna(r) else "" for r in rating],
+        }
+    )
+
+
+# ========= Index =========
+
+class ProximityIndex:
+    """KD-tree over unit-sphere positions of all point layers."""
+
+    def __init__(self, points: pd.DataFrame):
+        points = points.dropna(subset=["lat", "lon"]).reset_index(drop=True)
+        self.points = points
+        self._tree = cKDTree(_unit_vectors(points["lat"], points["lon"])) if len(points) else None
+
+    @classmethod
+    def from_layers(cls, *layers: pd.DataFrame):
+        layers = [layer for layer in layers if layer is not None and not layer.empty]
+        if not layers:
+            return cls(pd.DataFrame(columns=POINT_COLUMNS))
+        return cls(pd.concat(layers, ignore_index=True))
+
+    def __len__(self):
+        return len(self.points)
+
+    def query(self, lat: float, lon: float, radius_km: float) -> pd.DataFrame:
+        """All points within `radius_km` of (lat, lon), nearest first, with 'distance_km'."""
+        if self._tree is None:
+            return self.points.assign(distance_km=pd.Series(dtype="float64"))
+
+        center = _unit_vectors([lat], [lon])[0]
+        idx = self._tree.query_ball_point(center, r=_km_to_chord(radius_km))
+        idx = np.asarray(idx, dtype="int64")
+
+        chord = np.linalg.norm(self._tree.data[idx] - center, axis=1)
+        found = self.points.iloc[idx].assign(distance_km=_chord_to_km(chord))
+        return found.sort_values("distance_km", kind="stable", ignore_index=True)
+
+
+def filter_ree(results: pd.DataFrame, voltage_range=None, min_capacity=None) -> pd.DataFrame:
+    """Drop REE points outside the sidebar voltage range or below the min available capacity."""
+    keep = results["layer"] != "REE connection point"
+    ree = ~keep
+    if voltage_range is not None:
+        ree &= results["voltage_kv"].between(voltage_range[0], voltage_range[1])
+    if min_capacity is not None:
+        ree &= results["available_mw"] >= min_capacity
+    return results[keep | ree].reset_index(drop=True)
+
+
+def summarize(results: pd.DataFrame) -> dict:
+    """Counts per layer plus the total available MW of the REE points in `results`."""
+    return {
+        "total_available_mw": float(results["available_mw"].fillna(0).clip(lower=0).sum()),
+        "counts": results["layer"].value_counts().to_dict(),
+    }
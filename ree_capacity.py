@@ -0,0 +1,103 @@
+"""
+Loading of REE capacity-map exports (the *_generacion.xlsx files): UTM 30N ->
+WGS84 conversion, coordinate cleaning and the usual REE column names.
+Plain pandas, so the Streamlit apps and offline scripts (map_export.py) share it.
+"""
+
+import os
+
+import pandas as pd
+from pyproj import Transformer
+
+# ========= UTM -> WGS84 (Spain, zone 30N) =========
+utm30_to_wgs84 = Transformer.from_crs("EPSG:32630", "EPSG:4326", always_xy=True)
+
+
+def convert_spain_to_wgs84(df: pd.DataFrame, source_name: str | None = None) -> pd.DataFrame:
+    """
+    Convert standard REE-style Spain capacity file with
+    'Coordenada UTM X' / 'Coordenada UTM Y' to WGS84 lat/lon.
+    Creates 'lon_wgs', 'lat_wgs', and optional 'source_file'.
+    """
+    df = df.copy()
+    required_cols = ["Coordenada UTM X", "Coordenada UTM Y"]
+    for c in required_cols:
+        if c not in df.columns:
+            raise ValueError(f"Missing required column '{c}' in Spain file '{source_name or ''}'.")
+
+    df["Coordenada UTM X"] = pd.to_numeric(df["Coordenada UTM X"], errors="coerce")
+    df["Coordenada UTM Y"] = pd.to_numeric(df["Coordenada UTM Y"], errors="coerce")
+
+    xs = df["Coordenada UTM X"].values
+    ys = df["Coordenada UTM Y"].values
+    lons, lats = utm30_to_wgs84.transform(xs, ys)
+
+    df["lon_wgs"] = lons
+    df["lat_wgs"] = lats
+
+    if source_name is not None:
+        df["source_file"] = source_name
+
+    # keep only valid coords
+    df.loc[
+        ~(
+            (df["lat_wgs"].between(-90, 90))
+            & (df["lon_wgs"].between(-180, 180))
+        ),
+        ["lat_wgs", "lon_wgs"],
+    ] = pd.NA
+
+    return df
+
+
+def keep_valid_coords(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.dropna(subset=["lat_wgs", "lon_wgs"])
+    return df[
+        (df["lat_wgs"].between(-90, 90))
+        & (df["lon_wgs"].between(-180, 180))
+    ]
+
+
+# Typical REE column names (Spanish export headers)
+REE_COLUMNS = {
+    "name": "Nombre Subestación",
+    "voltage": "Nivel de Tensión (kV)",
+    "cap_avail": "Capacidad disponible (MW)",
+    "cap_occ": "Capacidad ocupada (MW)",
+    "province": "Provincia",
+    "municipality": "Municipio",
+}
+NUMERIC_REE_COLUMNS = ["voltage", "cap_avail", "cap_occ"]
+
+
+def ree_columns(df: pd.DataFrame) -> dict:
+    """REE_COLUMNS key -> column name, or None where the export lacks that column."""
+    return {key: col if col in df.columns else None for key, col in REE_COLUMNS.items()}
+
+
+def load_ree_files(paths) -> tuple[pd.DataFrame, list[str]]:
+    """
+    Read and convert several REE exports into one table with numeric voltage /
+    capacity columns and valid coordinates. Returns (table, per-file errors).
+    """
+    converted = []
+    errors = []
+    for path in paths:
+        try:
+            df_raw = pd.read_excel(path)
+            if df_raw.empty:
+                errors.append(f"{path}: file is empty")
+                continue
+            converted.append(convert_spain_to_wgs84(df_raw, source_name=os.path.basename(path)))
+        except Exception as e:
+            errors.append(f"{path}: {e}")
+
+    if not converted:
+        return pd.DataFrame(columns=["lat_wgs", "lon_wgs"]), errors
+
+    df = pd.concat(converted, ignore_index=True)
+    cols = ree_columns(df)
+    for key in NUMERIC_REE_COLUMNS:
+        if cols[key]:
+            df[cols[key]] = pd.to_numeric(df[cols[key]], errors="coerce")
+    return keep_valid_coords(df), errors
@@ -0,0 +1,72 @@
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# the app modules live flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TileUpstream:
+    """Local stand-in tile server: serves a tile body per path and records every request."""
+
+    def __init__(self):
+        self.requests = []       # request paths, query string included
+        self.fail = {}           # path -> number of 503 answers before it succeeds
+        self.missing = set()     # paths answered with 404
+        self.active = self.max_active = 0
+        self.delay = 0.0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.host = f"127.0.0.1:{self._server.server_address[1]}"
+        self.url = f"http://{self.host}"
+        threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def _handler(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                with upstream._lock:
+                    upstream.requests.append(self.path)
+                    upstream.active += 1
+                    upstream.max_active = max(upstream.max_active, upstream.active)
+                    failing = upstream.fail.get(path, 0)
+                    if failing:
+                        upstream.fail[path] = failing - 1
+                try:
+                    if upstream.delay:
+                        threading.Event().wait(upstream.delay)
+                    if path in upstream.missing:
+                        self.send_error(404)
+                    elif failing:
+                        self.send_error(503)
+                    else:
+                        body = f"tile {self.path}".encode()
+                        self.send_response(200)
+                        self.send_header("Content-Type", "image/png")
+                        self.send_header("Content-Length", str(len(body)))
+                        self.end_headers()
+                        self.wfile.write(body)
+                finally:
+                    with upstream._lock:
+                        upstream.active -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def tile_upstream():
+    upstream = TileUpstream()
+    yield upstream
+    upstream.close()
@@ -0,0 +1,34 @@
+"""DatasetRegistry bookkeeping: per-key load locks follow the entries."""
+
+import pytest
+
+from dataset_registry import DatasetRegistry
+
+
+def test_locks_dropped_on_eviction():
+    registry = DatasetRegistry(max_entries=2)
+    for i in range(10):
+        assert registry.get(("ree", i), lambda: i) == i
+    assert set(registry._key_locks) == {("ree", 8), ("ree", 9)}
+
+
+def test_locks_dropped_on_invalidate():
+    registry = DatasetRegistry()
+    for name in ("a", "b", "c"):
+        registry.get(name, lambda: name)
+    assert registry.invalidate(lambda key: key != "c") == 2
+    assert set(registry._key_locks) == {"c"}
+    registry.invalidate()
+    assert registry._key_locks == {}
+
+
+def test_lock_dropped_when_loader_fails():
+    registry = DatasetRegistry()
+
+    def fail():
+        raise OSError("missing")
+
+    with pytest.raises(OSError):
+        registry.get("broken", fail)
+    assert registry._key_locks == {}
+    assert registry.get("broken", lambda: 1) == 1
@@ -0,0 +1,43 @@
+"""The n-gram index returns exactly the rows a plain substring scan finds."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import id_search
+from id_search import SubstringIndex
+
+
+def _ids(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    alphabet = list("abcXYZ019-_ ñ.")
+    ids = pd.Series(["".join(rng.choice(alphabet, rng.integers(0, 12))) for _ in range(n)])
+    ids[::97] = None
+    return ids, pd.Series([f"Bus {i % 50}" for i in range(n)])
+
+
+def _expected(ids, buses, query):
+    q = query.strip().lower()
+    hay = ids.fillna("").str.lower() + "\x1f" + buses.str.lower()
+    return np.flatnonzero(hay.str.contains(q, regex=False).to_numpy())
+
+
+@pytest.mark.parametrize("query", ["", "a", "Xy", "x-1", "bus 4", "abc", "ab.c", "ñ", "zzzz", "q", "0\x1fbus"])
+def test_matches_str_contains(query):
+    ids, buses = _ids()
+    index = SubstringIndex(ids, buses)
+    expected = np.arange(len(ids)) if not query.strip() else _expected(ids, buses, query)
+    if "\x1f" in query:
+        expected = expected[:0]   # no match spans two ID columns
+    assert index.search(query).tolist() == expected.tolist()
+
+
+def test_unpacked_postings_match(monkeypatch):
+    ids, buses = _ids(500, seed=1)
+    packed = SubstringIndex(ids, buses)
+    monkeypatch.setattr(id_search, "_KEY_BITS", 8)   # as if the alphabet were too large to pack
+    unpacked = SubstringIndex(ids, buses)
+
+    assert unpacked.grams.tolist() == packed.grams.tolist()
+    assert unpacked.offsets.tolist() == packed.offsets.tolist()
+    assert unpacked.rows.tolist() == packed.rows.tolist()
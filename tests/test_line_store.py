@@ -0,0 +1,64 @@
+"""Saving / reopening the line store and the segment index on disk."""
+
+import json
+import os
+
+from line_index import LineIndex
+from line_store import CURRENT_FILE, LineStore
+
+
+def _geojson(tmp_path) -> str:
+    path = tmp_path / "line.geojson"
+    features = [
+        {"type": "Feature", "properties": {"name": f"L{i}", "voltage": "220000", "operator": "REE"},
+         "geometry": {"type": "LineString", "coordinates": [[-3.5 + i * 0.01, 40.0], [-3.4 + i * 0.01, 40.1]]}}
+        for i in range(5)
+    ]
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": features}), encoding="utf-8")
+    return str(path)
+
+
+def _versions(store_dir) -> list[str]:
+    return sorted(n for n in os.listdir(store_dir) if n.startswith("data-"))
+
+
+def test_save_switches_versions(tmp_path):
+    src = _geojson(tmp_path)
+    store_dir = str(tmp_path / "line.store")
+    store = LineStore.from_geojson(src)
+
+    for _ in range(3):
+        store.save(store_dir, source_path=src)
+        reopened = LineStore.load(store_dir, source_path=src)
+        assert reopened is not None and len(reopened) == 5
+
+    # the current version plus the one before it for readers still holding it
+    versions = _versions(store_dir)
+    assert len(versions) == 2
+    with open(os.path.join(store_dir, CURRENT_FILE), encoding="utf-8") as f:
+        assert f.read() in versions
+    assert not [n for n in os.listdir(store_dir) if n.startswith("tmp-")]
+
+
+def test_old_flat_layout_is_rebuilt(tmp_path):
+    src = _geojson(tmp_path)
+    store_dir = tmp_path / "line.store"
+    store_dir.mkdir()
+    (store_dir / "meta.json").write_text("{}", encoding="utf-8")
+    (store_dir / "coords.npy").write_bytes(b"")
+
+    assert LineStore.load(str(store_dir), source_path=src) is None
+    assert len(LineStore.load_or_build(src, store_dir=str(store_dir))) == 5
+    assert sorted(os.listdir(store_dir)) == sorted([CURRENT_FILE] + _versions(store_dir))
+
+
+def test_corrupt_index_is_rebuilt(tmp_path):
+    src = _geojson(tmp_path)
+    index_path = tmp_path / "line.segments.npz"
+    index_path.write_bytes(b"not a zip file")
+
+    assert LineIndex.load(str(index_path), source_path=src) is None
+    index = LineIndex.load_or_build(src, index_path=str(index_path))
+    assert LineIndex.load(str(index_path), source_path=src) is not None
+    assert len(index.nearest([40.05], [-3.45])) == 1
+    assert not [n for n in os.listdir(tmp_path) if n.endswith(".tmp.npz")]
@@ -0,0 +1,29 @@
+"""Cached map payloads and the plain st_folium fallback."""
+
+import folium
+
+import map_cache
+from map_cache import MapPayload, show_map
+
+
+def _map():
+    m = folium.Map(location=[40.0, -3.7], zoom_start=6, tiles=None)
+    folium.Marker([40.0, -3.7], popup="REE").add_to(m)
+    return m
+
+
+def test_pinned_streamlit_folium_has_the_internals():
+    assert map_cache.PRIVATE_API_OK
+    payload = MapPayload(_map())
+    assert payload.map is None and "L.marker" in payload.script
+
+
+def test_falls_back_to_st_folium(monkeypatch):
+    calls = []
+    monkeypatch.setattr(map_cache, "PRIVATE_API_OK", False)
+    monkeypatch.setattr(map_cache, "st_folium", lambda fig, **kw: calls.append((fig, kw)) or {"last_clicked": None})
+
+    m = _map()
+    payload = MapPayload(m)
+    assert show_map(payload, key="grid", returned_objects=["last_clicked"]) == {"last_clicked": None}
+    assert calls[0][0] is m and calls[0][1]["key"] == "grid"
@@ -0,0 +1,17 @@
+"""Which tile layers a map export may download on a cache miss."""
+
+from map_export import online_upstreams
+
+
+def test_osm_is_cache_only_by_default():
+    upstreams = online_upstreams({"tile_layers": ["osm", "oim-power"]})
+    assert list(upstreams) == ["oim-power"]
+
+
+def test_osm_online_when_overridden():
+    local = "http://127.0.0.1:9000/{z}/{x}/{y}.png"
+    assert online_upstreams({"tile_layers": ["osm"], "upstreams": {"osm": local}}) == {"osm": local}
+
+
+def test_offline():
+    assert online_upstreams({"tile_layers": ["oim-power"], "offline": True}) == {}
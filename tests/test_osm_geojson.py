@@ -0,0 +1,42 @@
+"""Streaming GeoJSON reader: top-level "features" lookup and degenerate line parts."""
+
+import json
+
+import pytest
+
+from osm_geojson import iter_features, load_line_arrays
+
+
+def _write(tmp_path, obj) -> str:
+    path = tmp_path / "data.geojson"
+    path.write_text(json.dumps(obj), encoding="utf-8")
+    return str(path)
+
+
+def _line(coords, name="L"):
+    return {"type": "Feature", "properties": {"name": name, "voltage": "220000"},
+            "geometry": {"type": "MultiLineString", "coordinates": coords}}
+
+
+@pytest.mark.parametrize("chunk_size", [4, 7, 1 << 20])
+def test_nested_features_key_is_ignored(tmp_path, chunk_size):
+    path = _write(tmp_path, {"metadata": {"features": [1], "count": 12345}, "type": "FeatureCollection",
+                             "features": [_line([[[0, 0], [1, 1]]], "a"), _line([[[2, 2], [3, 3]]], "b")]})
+    names = [f["properties"]["name"] for f in iter_features(path, chunk_size=chunk_size)]
+    assert names == ["a", "b"]
+
+
+def test_no_top_level_features(tmp_path):
+    assert list(iter_features(_write(tmp_path, {"metadata": {"features": [1]}}))) == []
+
+
+def test_one_point_parts_are_dropped(tmp_path):
+    path = _write(tmp_path, {"type": "FeatureCollection", "features": [
+        _line([[[0, 0]], [[1, 1], [2, 2]], [[5, 5]]], "mixed"),
+        _line([[[9, 9]]], "single point"),
+    ]})
+    arrays = load_line_arrays(path)
+    assert arrays["coords"].tolist() == [[1, 1], [2, 2]]
+    assert arrays["part_offsets"].tolist() == [0, 2]
+    assert arrays["feature_parts"].tolist() == [0, 1]
+    assert arrays["properties"]["name"].tolist() == ["mixed"]
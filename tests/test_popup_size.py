@@ -0,0 +1,107 @@
+"""Page size of the REE / line layers with shared popup templates vs. inline cards."""
+
+import folium
+import pytest
+
+from map_layers import add_line_layer, add_ree_layer, enrich_lines, line_voltage_label, ree_card_values
+from popup_templates import CARD_LINE, CARD_REE, render_card
+
+N_FEATURES = 500
+MAX_BYTES_PER_REE_MARKER = 1100   # Leaflet marker, icon and tooltip JS included
+MAX_BYTES_PER_LINE = 600
+MAX_RATIO_TO_INLINE = 0.6
+
+
+def _page_bytes(m: folium.Map) -> int:
+    return len(m.get_root().render().encode("utf-8"))
+
+
+def _empty_map_bytes() -> int:
+    return _page_bytes(folium.Map(tiles=None))
+
+
+def _ree_markers(n: int) -> list[tuple]:
+    return [
+        (
+            i,
+            40.0 + i * 1e-3,
+            -3.5 + i * 1e-3,
+            ree_card_values(f"SET Subestación {i}", "Madrid, Getafe", "2025_11_05_R1008_generacion.xlsx",
+                            "220 kV", float(i % 50), 12.5),
+            f"SET Subestación {i}",
+        )
+        for i in range(n)
+    ]
+
+
+def _lines(n: int) -> dict:
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "id": i,
+                "properties": {"name": f"Línea {i}", "operator": "Red Eléctrica", "voltage": "400000;220000",
+                               "circuits": "2", "cables": "6", "frequency": "50"},
+                "geometry": {"type": "LineString",
+                             "coordinates": [[-3.5 + i * 1e-3, 40.0], [-3.4 + i * 1e-3, 40.1]]},
+            }
+            for i in range(n)
+        ],
+    }
+
+
+@pytest.fixture(scope="module")
+def baseline() -> int:
+    return _empty_map_bytes()
+
+
+def test_ree_marker_bytes(baseline):
+    markers = _ree_markers(N_FEATURES)
+
+    m = folium.Map(tiles=None)
+    add_ree_layer(m, markers)
+    per_marker = (_page_bytes(m) - baseline) / N_FEATURES
+
+    # the same markers with the card HTML inlined in every popup (previous behaviour)
+    inline = folium.Map(tiles=None)
+    for _, lat, lon, card, name in markers:
+        folium.Marker([lat, lon], popup=folium.Popup(render_card(CARD_REE, card), max_width=300),
+                      tooltip=name).add_to(inline)
+    per_inline_marker = (_page_bytes(inline) - baseline) / N_FEATURES
+
+    assert per_marker < MAX_BYTES_PER_REE_MARKER
+    assert per_marker < per_inline_marker * MAX_RATIO_TO_INLINE
+
+
+def test_line_feature_bytes(baseline):
+    lines = enrich_lines(_lines(N_FEATURES))
+    assert all("popup_html" not in f["properties"] for f in lines["features"])
+
+    m = folium.Map(tiles=None)
+    add_line_layer(m, lines)
+    per_line = (_page_bytes(m) - baseline) / N_FEATURES
+
+    # the same features each carrying their rendered card (previous behaviour)
+    inline_lines = _lines(N_FEATURES)
+    for feat in inline_lines["features"]:
+        props = enrich_lines({"features": [feat]})["features"][0]["properties"]
+        props["popup_html"] = render_card(CARD_LINE, {**props, "voltage_label": line_voltage_label(props)})
+    inline = folium.Map(tiles=None)
+    folium.GeoJson(
+        inline_lines,
+        popup=folium.GeoJsonPopup(fields=["popup_html"], aliases=[""], labels=False),
+    ).add_to(inline)
+    per_inline_line = (_page_bytes(inline) - baseline) / N_FEATURES
+
+    assert per_line < MAX_BYTES_PER_LINE
+    assert per_line < per_inline_line * MAX_RATIO_TO_INLINE
+
+
+def test_templates_sent_once(baseline):
+    m = folium.Map(tiles=None)
+    add_ree_layer(m, _ree_markers(10))
+    add_line_layer(m, enrich_lines(_lines(10)))
+    html = m.get_root().render()
+    assert html.count("window.gstTemplates =") == 1
+    assert html.count("Capacity Overview") == 1   # the REE card layout appears only in the template
@@ -0,0 +1,17 @@
+"""Slider filters applied to a proximity query over every REE point."""
+
+import pandas as pd
+
+from proximity import ProximityIndex, filter_ree, ree_points, substation_points
+
+
+def test_sliders_mask_ree_points_only():
+    spain = pd.DataFrame({"lat_wgs": [40.0, 40.01, 40.02], "lon_wgs": [-3.7, -3.7, -3.7],
+                          "kv": [220.0, 400.0, None], "mw": [10.0, 50.0, 80.0]})
+    subs = pd.DataFrame({"name": ["S"], "lat": [40.0], "lon": [-3.71], "voltage_kv": [66.0], "operator": ["REE"]})
+    index = ProximityIndex.from_layers(ree_points(spain, volt_col="kv", cap_avail_col="mw"), substation_points(subs))
+
+    found = index.query(40.0, -3.7, 10)
+    assert len(filter_ree(found)) == 4
+    masked = filter_ree(found, voltage_range=(300, 400), min_capacity=20)
+    assert sorted(zip(masked["layer"], masked["voltage_kv"])) == [("OSM substation", 66.0), ("REE connection point", 400.0)]
@@ -0,0 +1,76 @@
+"""Bulk tile fetching stays off / throttled for tile.openstreetmap.org; prefetch against a local server."""
+
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+import tile_prefetch
+import tile_proxy
+from tile_prefetch import prefetch
+from tile_proxy import HOST_LIMITS, TileStore, default_bulk_layers, host_limit, tile_bbox_3857, upstream_templates
+
+
+def test_osm_not_seeded_by_default():
+    assert "osm" not in default_bulk_layers(upstream_templates())
+    assert "oim-power" in default_bulk_layers(upstream_templates())
+    local = upstream_templates({"osm": "http://127.0.0.1:9000/{z}/{x}/{y}.png"})
+    assert "osm" in default_bulk_layers(local)
+
+
+def test_host_limit():
+    assert host_limit(tile_proxy.UPSTREAMS["osm"], 8) == HOST_LIMITS["tile.openstreetmap.org"]
+    assert host_limit(tile_proxy.UPSTREAMS["oim-power"], 8) == 8
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(tile_prefetch, "RETRY_BACKOFF", 0.01)
+
+
+def test_prefetch_caps_limited_host(tmp_path, tile_upstream, monkeypatch):
+    # treat the local server like tile.openstreetmap.org
+    monkeypatch.setitem(HOST_LIMITS, tile_upstream.host, 2)
+    monkeypatch.setitem(tile_proxy._host_slots, tile_upstream.host, threading.BoundedSemaphore(2))
+    tile_upstream.delay = 0.01
+
+    store = TileStore(str(tmp_path))
+    upstreams = {"osm": tile_upstream.url + "/{z}/{x}/{y}.png"}
+    stats = prefetch(store, upstreams, ["osm"], [(-4.0, 40.0, -3.4, 40.7)], 8, 10, per_host=8)
+
+    assert stats["failed"] == 0 and stats["fetched"] == len(tile_upstream.requests) > 10
+    assert tile_upstream.max_active <= 2
+    assert store.get("osm", 8, 125, 96) == b"tile /8/125/96.png"
+
+
+def test_prefetch_retries_then_gives_up(tmp_path, tile_upstream, fast_retries):
+    tile_upstream.fail["/6/31/24.png"] = 1   # one 503, then served
+    tile_upstream.fail["/6/31/23.png"] = 10  # fails every attempt
+    store = TileStore(str(tmp_path))
+    upstreams = {"oim-power": tile_upstream.url + "/{z}/{x}/{y}.png"}
+    bbox = (-5.0, 38.0, -4.0, 42.0)   # tiles 6/31/23 and 6/31/24
+
+    stats = prefetch(store, upstreams, ["oim-power"], [bbox], 6, 6, retries=2)
+
+    assert stats["fetched"] == 1 and stats["failed"] == 1
+    assert stats["errors"] == ["oim-power 6/31/23: HTTP Error 503: Service Unavailable"]
+    assert tile_upstream.requests.count("/6/31/24.png") == 2
+    assert tile_upstream.requests.count("/6/31/23.png") == 3
+    assert store.has("oim-power", 6, 31, 24) and not store.has("oim-power", 6, 31, 23)
+
+    # the next run only asks for the tile that is still missing
+    tile_upstream.fail.clear()
+    stats = prefetch(store, upstreams, ["oim-power"], [bbox], 6, 6)
+    assert (stats["cached"], stats["fetched"]) == (1, 1)
+
+
+def test_prefetch_natura2000_wms_bbox(tmp_path, tile_upstream):
+    template = tile_proxy.UPSTREAMS["natura2000"].replace(tile_proxy.NATURA_2000_WMS_URL, tile_upstream.url + "/wms")
+    store = TileStore(str(tmp_path))
+
+    stats = prefetch(store, {"natura2000": template}, ["natura2000"], [(-5.0, 38.0, -4.0, 42.0)], 6, 6)
+
+    assert stats["fetched"] == 2
+    queries = sorted(parse_qs(urlsplit(path).query)["BBOX"][0] for path in tile_upstream.requests)
+    assert queries == sorted([tile_bbox_3857(6, 31, 23), tile_bbox_3857(6, 31, 24)])
+    assert store.has("natura2000", 6, 31, 24)
@@ -0,0 +1,73 @@
+"""The caching proxy end to end, against a local upstream tile server."""
+
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from tile_proxy import TileStore, make_server
+
+
+@pytest.fixture
+def proxy(tmp_path, tile_upstream):
+    def start(max_bytes=1 << 20):
+        store = TileStore(str(tmp_path / "tiles"), max_bytes=max_bytes)
+        server = make_server(store, {"oim-power": tile_upstream.url + "/power/{z}/{x}/{y}.png"}, port=0)
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        servers.append(server)
+        return store, f"http://127.0.0.1:{server.server_address[1]}"
+
+    servers = []
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _get(url):
+    with urllib.request.urlopen(url, timeout=5) as resp:
+        return resp.headers["X-Tile-Cache"], resp.read()
+
+
+def test_miss_then_hit(proxy, tile_upstream):
+    store, base = proxy()
+    assert _get(f"{base}/oim-power/6/31/24.png") == ("MISS", b"tile /power/6/31/24.png")
+    assert _get(f"{base}/oim-power/6/31/24.png") == ("HIT", b"tile /power/6/31/24.png")
+    assert tile_upstream.requests == ["/power/6/31/24.png"]
+    assert store.has("oim-power", 6, 31, 24)
+
+
+def test_unknown_layer_and_missing_upstream_tile(proxy, tile_upstream):
+    store, base = proxy()
+    with pytest.raises(urllib.error.HTTPError) as err:
+        _get(f"{base}/no-such-layer/6/31/24.png")
+    assert err.value.code == 404
+    assert tile_upstream.requests == []
+
+    tile_upstream.missing.add("/power/6/31/25.png")
+    with pytest.raises(urllib.error.HTTPError) as err:
+        _get(f"{base}/oim-power/6/31/25.png")
+    assert err.value.code == 502
+    assert not store.has("oim-power", 6, 31, 25)
+
+
+def test_least_recently_used_tiles_are_evicted(proxy, tile_upstream):
+    tile_size = len(b"tile /power/6/31/24.png")
+    store, base = proxy(max_bytes=int(tile_size * 2.5))
+
+    for y in (24, 25):
+        _get(f"{base}/oim-power/6/31/{y}.png")
+        time.sleep(0.02)
+    assert _get(f"{base}/oim-power/6/31/24.png")[0] == "HIT"   # 25 is now the least recently used
+    time.sleep(0.02)
+    _get(f"{base}/oim-power/6/31/26.png")
+
+    assert store.has("oim-power", 6, 31, 24) and store.has("oim-power", 6, 31, 26)
+    assert not store.has("oim-power", 6, 31, 25)
+    assert store.size <= store.max_bytes
+    assert store.size == sum(
+        os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(store.root) for f in files
+    )
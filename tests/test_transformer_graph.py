@@ -0,0 +1,56 @@
+"""Bus / transformer graph: topology columns and rows with missing buses."""
+
+import numpy as np
+import pandas as pd
+
+from transformer_graph import TransformerGraph
+
+
+def _frame():
+    # A-B-C chain plus a separate D-E pair; row 3 has no bus1, row 5 text in s_nom / voltage
+    return pd.DataFrame(
+        {
+            "bus0": ["A", "B", "D", "C", "", "E"],
+            "bus1": ["B", "C", "E", None, "A", "D"],
+            "voltage_bus0": [400, 220, 220, 400, 400, "n/a"],
+            "voltage_bus1": [220, 132, 400, 220, 220, 400],
+            "s_nom": [600, 300, 500, 100, 200, "?"],
+        }
+    )
+
+
+def test_components_and_bus_mva():
+    graph = TransformerGraph.from_frame(_frame())
+    table = graph.topology_table()
+
+    assert len(graph) == 6 and graph.n_unconnected == 2
+    assert graph.n_components == 2
+    assert table["component_buses"].tolist()[:3] == [3, 3, 2]
+    assert table.loc[0, "bus0_mva"] == 600 and table.loc[0, "bus1_mva"] == 900   # B: 600 + 300
+    assert table.loc[2, "component_mva"] == 500                                   # D-E, s_nom "?" -> 0
+    assert table.loc[0, "interface"] == "400/220 kV"
+
+
+def test_rows_without_buses_are_left_out():
+    table = TransformerGraph.from_frame(_frame()).topology_table()
+
+    assert len(table) == 6
+    for row in (3, 4):
+        assert np.isnan(table.loc[row, "component"])
+        assert np.isnan(table.loc[row, "bus0_mva"])
+    assert pd.isna(table.loc[5, "interface"])   # voltage "n/a"
+
+
+def test_no_valid_rows():
+    graph = TransformerGraph([None], [""], [400], [220], [100])
+    assert graph.n_components == 0
+    assert np.isnan(graph.topology_table().loc[0, "component"])
+
+
+def test_interfaces_in_bbox():
+    graph = TransformerGraph.from_frame(_frame())
+    lats = [40.0, 40.0, 41.0, 45.0, 40.0, 40.0]
+    lons = [-3.0, -3.0, -3.0, -3.0, -3.0, -3.0]
+    # 400/220 kV rows: 0, 2 (reversed), 3 (outside the box) and 4 (interfaces need no buses)
+    assert graph.interfaces_in_bbox(lats, lons, (-4, 39, -2, 42)).tolist() == [0, 2, 4]
+    assert graph.interfaces_in_bbox(lats, lons, (-4, 39, -2, 42), 220, 132).tolist() == [1]
@@ -0,0 +1,137 @@
+"""
+Concurrent pre-fetch of map tiles (OSM / OpenInfraMap tiles and Natura 2000
+WMS GetMap images) for a list of regions into the tile_proxy.py cache, so map
+exports render from disk instead of waiting on each tile server in turn.
+
+Downloads run on a bounded thread pool (stdlib urllib, no extra dependency)
+driven by asyncio; a semaphore per upstream host caps how many requests hit
+any one server at a time (tile_proxy.HOST_LIMITS lowers it further for
+tile.openstreetmap.org, and `osm` is only in the default layers when it is
+pointed at another server with --upstream).
+
+    python tile_prefetch.py --bbox -4.0 40.0 -3.4 40.7 --bbox -0.6 39.3 -0.2 39.6 --zoom 6 12
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from tile_proxy import (
+    DEFAULT_CACHE_DIR,
+    DEFAULT_MAX_MB,
+    UPSTREAMS,
+    TileStore,
+    default_bulk_layers,
+    fetch_tile,
+    host_limit,
+    parse_upstream_overrides,
+    tiles_in_bbox,
+    upstream_templates,
+    warn_bulk_layers,
+)
+
+MAX_CONNECTIONS = 16   # size of the download pool
+PER_HOST = 4           # concurrent requests per upstream host
+RETRIES = 2
+RETRY_BACKOFF = 0.5    # seconds, doubled per attempt
+
+
+def plan_tiles(layers, bboxes, min_zoom: int, max_zoom: int) -> list[tuple]:
+    """Unique (layer, z, x, y) covering every bbox; overlapping regions are fetched once."""
+    seen = set()
+    plan = []
+    for layer in layers:
+        for bbox in bboxes:
+            for z, x, y in tiles_in_bbox(bbox, min_zoom, max_zoom):
+                key = (layer, z, x, y)
+                if key not in seen:
+                    seen.add(key)
+                    plan.append(key)
+    return plan
+
+
+async def _fetch_one(loop, pool, semaphores, store, upstreams, stats, layer, z, x, y, retries):
+    template = upstreams[layer]
+    async with semaphores[urlsplit(template).netloc]:
+        for attempt in range(retries + 1):
+            try:
+                data = await loop.run_in_executor(pool, fetch_tile, template, z, x, y)
+                break
+            except (urllib.error.URLError, OSError) as e:
+                if attempt == retries:
+                    stats["failed"] += 1
+                    stats["errors"].append(f"{layer} {z}/{x}/{y}: {e}")
+                    return
+                await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt * (1 + random.random()))
+    await loop.run_in_executor(pool, store.put, layer, z, x, y, data)
+    stats["fetched"] += 1
+
+
+async def prefetch_async(store: TileStore, upstreams: dict, layers, bboxes, min_zoom: int, max_zoom: int,
+                         max_connections: int = MAX_CONNECTIONS, per_host: int = PER_HOST,
+                         retries: int = RETRIES) -> dict:
+    """Fetch every tile of `layers` over `bboxes` / zoom range that is not cached yet."""
+    stats = {"planned": 0, "cached": 0, "fetched": 0, "failed": 0, "errors": []}
+    plan = plan_tiles(layers, bboxes, min_zoom, max_zoom)
+    stats["planned"] = len(plan)
+
+    todo = [key for key in plan if not store.has(*key)]
+    stats["cached"] = len(plan) - len(todo)
+
+    loop = asyncio.get_running_loop()
+    semaphores = {
+        urlsplit(upstreams[layer]).netloc: asyncio.Semaphore(host_limit(upstreams[layer], per_host))
+        for layer in layers
+    }
+    with ThreadPoolExecutor(max_workers=max_connections) as pool:
+        await asyncio.gather(*(
+            _fetch_one(loop, pool, semaphores, store, upstreams, stats, *key, retries)
+            for key in todo
+        ))
+    return stats
+
+
+def prefetch(store: TileStore, upstreams: dict, layers, bboxes, min_zoom: int, max_zoom: int, **kwargs) -> dict:
+    """Blocking wrapper around prefetch_async (for scripts and export jobs)."""
+    return asyncio.run(prefetch_async(store, upstreams, layers, bboxes, min_zoom, max_zoom, **kwargs))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-fetch map tiles for a list of regions into the tile cache.")
+    parser.add_argument(
+        "--bbox", type=float, nargs=4, action="append", required=True,
+        metavar=("MIN_LON", "MIN_LAT", "MAX_LON", "MAX_LAT"), help="Region to cover (repeatable).",
+    )
+    parser.add_argument("--zoom", type=int, nargs=2, required=True, metavar=("MIN", "MAX"))
+    parser.add_argument(
+        "--layers", nargs="+", choices=list(UPSTREAMS),
+        help="Default: every layer except osm, unless osm is pointed elsewhere with --upstream.",
+    )
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--max-mb", type=int, default=DEFAULT_MAX_MB)
+    parser.add_argument("--connections", type=int, default=MAX_CONNECTIONS)
+    parser.add_argument("--per-host", type=int, default=PER_HOST)
+    parser.add_argument("--upstream", action="append", metavar="LAYER=URL", help="Override an upstream URL template.")
+    args = parser.parse_args(argv)
+
+    store = TileStore(args.cache_dir, max_bytes=args.max_mb * 1024 * 1024)
+    upstreams = upstream_templates(parse_upstream_overrides(args.upstream))
+    layers = args.layers or default_bulk_layers(upstreams)
+    warn_bulk_layers(upstreams, layers)
+
+    t0 = time.perf_counter()
+    stats = prefetch(
+        store, upstreams, layers, args.bbox, args.zoom[0], args.zoom[1],
+        max_connections=args.connections, per_host=args.per_host,
+    )
+    for err in stats.pop("errors")[:20]:
+        print(err)
+    print(f"Prefetched into {args.cache_dir} in {time.perf_counter() - t0:.1f}s: {stats}")
+
+
+if __name__ == "__main__":
+    main()
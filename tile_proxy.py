@@ -0,0 +1,354 @@
+"""
+Local caching proxy for the raster tiles used by the map apps
+(OpenStreetMap base map, OpenInfraMap overlays and the Natura 2000 WMS).
+
+Tiles are kept in a z/x/y tree on disk (`tile_cache/<layer>/<z>/<x>/<y>.png`),
+served from there on repeat views and fetched upstream only on a miss. The
+cache is size-bounded: when it grows past `--max-mb` the least recently used
+tiles are deleted.
+
+    python tile_proxy.py serve --port 8765
+    python tile_proxy.py seed --bbox -10 35.5 4.5 44 --zoom 5 10 --layers oim-power
+
+The apps use the proxy when GST_TILE_PROXY is set (e.g. http://localhost:8765),
+see proxy_url(). Upstream URLs can be overridden (`--upstream osm=http://...`
+or GST_TILE_UPSTREAM_OSM=...), e.g. to run against a local stand-in server.
+
+The OpenStreetMap tile servers do not allow bulk downloads, so `seed` (and
+tile_prefetch.py) leave `osm` out unless it points at another server, and at
+most HOST_LIMITS requests per process go to tile.openstreetmap.org.
+"""
+
+import argparse
+import contextlib
+import math
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+TILE_PROXY_ENV = "GST_TILE_PROXY"
+UPSTREAM_ENV_PREFIX = "GST_TILE_UPSTREAM_"
+
+NATURA_2000_WMS_URL = "https://wms.mapama.gob.es/sig/Biodiversidad/RedNatura"
+NATURA_2000_WMS_LAYER = "PS.ProtectedSite"
+
+# layer key -> upstream URL template; {bbox} is the tile's EPSG:3857 extent, so
+# WMS GetMap requests are cached as z/x/y tiles like the others
+UPSTREAMS = {
+    "osm": "https://tile.openstreetmap.org/{z}/{x}/{y}.png",
+    "oim-power": "https://tiles.openinframap.org/power/{z}/{x}/{y}.png",
+    "oim-lowvoltage": "https://tiles.openinframap.org/power-lowvoltage/{z}/{x}/{y}.png",
+    "oim-substations": "https://tiles.openinframap.org/substations/{z}/{x}/{y}.png",
+    "natura2000": (
+        f"{NATURA_2000_WMS_URL}?SERVICE=WMS&REQUEST=GetMap&VERSION=1.3.0"
+        f"&LAYERS={NATURA_2000_WMS_LAYER}&STYLES=&FORMAT=image/png&TRANSPARENT=true"
+        "&CRS=EPSG:3857&WIDTH=256&HEIGHT=256&BBOX={bbox}"
+    ),
+}
+WEB_MERCATOR_HALF = 20037508.342789244
+
+# concurrent requests per process to servers whose usage policy forbids bulk
+# downloading (https://operations.osmfoundation.org/policies/tiles/); layers
+# pointing at them are not seeded / pre-fetched unless asked for explicitly
+HOST_LIMITS = {"tile.openstreetmap.org": 2}
+_host_slots = {host: threading.BoundedSemaphore(n) for host, n in HOST_LIMITS.items()}
+
+DEFAULT_CACHE_DIR = "tile_cache"
+DEFAULT_MAX_MB = 2048
+DEFAULT_PORT = 8765
+USER_AGENT = "GridScreeningTool-tile-cache/1.0"   # required by the OSM tile usage policy
+FETCH_TIMEOUT = 20
+
+_TILE_PATH_RE = re.compile(r"^/([\w-]+)/(\d+)/(\d+)/(\d+)\.png$")
+
+
+# ========= App side: where TileLayers should point =========
+
+def proxy_url(layer: str) -> str | None:
+    """Leaflet URL template for `layer` through the proxy, or None if GST_TILE_PROXY is unset."""
+    base = os.environ.get(TILE_PROXY_ENV, "").rstrip("/")
+    if not base:
+        return None
+    return f"{base}/{layer}/{{z}}/{{x}}/{{y}}.png"
+
+
+def tile_url(layer: str) -> str:
+    """Proxy URL for `layer` if a proxy is configured, otherwise the upstream URL."""
+    return proxy_url(layer) or UPSTREAMS[layer]
+
+
+def upstream_templates(overrides=None) -> dict:
+    """UPSTREAMS with GST_TILE_UPSTREAM_<LAYER> env vars and explicit overrides applied."""
+    templates = dict(UPSTREAMS)
+    for layer in UPSTREAMS:
+        env_key = UPSTREAM_ENV_PREFIX + layer.upper().replace("-", "_")
+        if os.environ.get(env_key):
+            templates[layer] = os.environ[env_key]
+    templates.update(overrides or {})
+    return templates
+
+
+def bulk_fetch_allowed(template: str) -> bool:
+    """False for upstreams on a HOST_LIMITS server (e.g. tile.openstreetmap.org)."""
+    return urlsplit(template).netloc not in HOST_LIMITS
+
+
+def default_bulk_layers(upstreams: dict) -> list[str]:
+    """Layers seed / prefetch fetch when none are given: osm only if it is overridden."""
+    return [layer for layer in UPSTREAMS if bulk_fetch_allowed(upstreams[layer])]
+
+
+def host_limit(template: str, requested: int) -> int:
+    """`requested` concurrent requests, capped by HOST_LIMITS for the template's host."""
+    return min(requested, HOST_LIMITS.get(urlsplit(template).netloc, requested))
+
+
+# ========= On-disk z/x/y store =========
+
+class TileStore:
+    """
+    z/x/y tile tree with LRU eviction by total size. A tile's mtime is its
+    last access time, so eviction removes the tiles not viewed for longest.
+    """
+
+    def __init__(self, root: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self.size = sum(os.path.getsize(p) for p, _ in self._iter_tiles())
+
+    def path(self, layer: str, z: int, x: int, y: int) -> str:
+        return os.path.join(self.root, layer, str(z), str(x), f"{y}.png")
+
+    def _iter_tiles(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for fn in filenames:
+                if fn.endswith(".png"):
+                    p = os.path.join(dirpath, fn)
+                    try:
+                        yield p, os.path.getmtime(p)
+                    except OSError:
+                        continue
+
+    def has(self, layer: str, z: int, x: int, y: int) -> bool:
+        return os.path.exists(self.path(layer, z, x, y))
+
+    def get(self, layer: str, z: int, x: int, y: int) -> bytes | None:
+        p = self.path(layer, z, x, y)
+        try:
+            with open(p, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(p)   # mark as recently used
+        except OSError:
+            pass
+        return data
+
+    def put(self, layer: str, z: int, x: int, y: int, data: bytes):
+        p = self.path(layer, z, x, y)
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        tmp = f"{p}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        with self._lock:
+            old = os.path.getsize(p) if os.path.exists(p) else 0
+            os.replace(tmp, p)
+            self.size += len(data) - old
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Delete least recently used tiles until the store is at 90% of max_bytes."""
+        target = int(self.max_bytes * 0.9)
+        for p, _ in sorted(self._iter_tiles(), key=lambda item: item[1]):
+            if self.size <= target:
+                break
+            try:
+                size = os.path.getsize(p)
+                os.remove(p)
+                self.size -= size
+            except OSError:
+                continue
+
+
+def tile_bbox_3857(z: int, x: int, y: int) -> str:
+    """'minx,miny,maxx,maxy' of a slippy-map tile in EPSG:3857 metres (WMS BBOX)."""
+    size = 2 * WEB_MERCATOR_HALF / (2 ** z)
+    minx = -WEB_MERCATOR_HALF + x * size
+    maxy = WEB_MERCATOR_HALF - y * size
+    return f"{minx},{maxy - size},{minx + size},{maxy}"
+
+
+def upstream_url(template: str, z: int, x: int, y: int) -> str:
+    """Upstream URL of one tile ({z}/{x}/{y}, optional {s} subdomain and WMS {bbox})."""
+    bbox = tile_bbox_3857(z, x, y) if "{bbox}" in template else ""
+    return template.format(s="a", z=z, x=x, y=y, bbox=bbox)
+
+
+def fetch_tile(template: str, z: int, x: int, y: int, timeout: float = FETCH_TIMEOUT) -> bytes:
+    """Download one tile from an upstream URL template (see upstream_url)."""
+    url = upstream_url(template, z, x, y)
+    req = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+    with _host_slots.get(urlsplit(url).netloc) or contextlib.nullcontext():
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.read()
+
+
+# ========= Proxy server =========
+
+class TileProxyHandler(BaseHTTPRequestHandler):
+    store: TileStore = None
+    upstreams: dict = {}
+
+    def do_GET(self):
+        match = _TILE_PATH_RE.match(self.path.split("?")[0])
+        if not match or match.group(1) not in self.upstreams:
+            self.send_error(404, "Unknown tile path")
+            return
+        layer = match.group(1)
+        z, x, y = (int(v) for v in match.groups()[1:])
+
+        data = self.store.get(layer, z, x, y)
+        status = "HIT"
+        if data is None:
+            status = "MISS"
+            try:
+                data = fetch_tile(self.upstreams[layer], z, x, y)
+            except (urllib.error.URLError, OSError) as e:
+                self.send_error(502, f"Upstream tile fetch failed: {e}")
+                return
+            self.store.put(layer, z, x, y, data)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "public, max-age=86400")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("X-Tile-Cache", status)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass   # one line per tile is too noisy
+
+
+def make_server(store: TileStore, upstreams: dict, host: str = "127.0.0.1", port: int = DEFAULT_PORT):
+    handler = type("BoundTileProxyHandler", (TileProxyHandler,), {"store": store, "upstreams": upstreams})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+# ========= Seeding =========
+
+def lonlat_to_tile(lon: float, lat: float, z: int) -> tuple[int, int]:
+    """Slippy-map tile (x, y) containing lon/lat at zoom z."""
+    lat = max(min(lat, 85.0511), -85.0511)
+    n = 2 ** z
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tiles_in_bbox(bbox, min_zoom: int, max_zoom: int):
+    """Yield (z, x, y) for every tile covering bbox (min_lon, min_lat, max_lon, max_lat)."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    for z in range(min_zoom, max_zoom + 1):
+        x0, y0 = lonlat_to_tile(min_lon, max_lat, z)
+        x1, y1 = lonlat_to_tile(max_lon, min_lat, z)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                yield z, x, y
+
+
+def seed(store: TileStore, upstreams: dict, layers, bbox, min_zoom: int, max_zoom: int,
+         delay: float = 0.0, log=print) -> dict:
+    """Fetch every missing tile of `layers` in bbox/zoom range into the store."""
+    stats = {"cached": 0, "fetched": 0, "failed": 0}
+    for layer in layers:
+        for z, x, y in tiles_in_bbox(bbox, min_zoom, max_zoom):
+            if store.has(layer, z, x, y):
+                stats["cached"] += 1
+                continue
+            try:
+                store.put(layer, z, x, y, fetch_tile(upstreams[layer], z, x, y))
+                stats["fetched"] += 1
+            except (urllib.error.URLError, OSError) as e:
+                stats["failed"] += 1
+                log(f"{layer} {z}/{x}/{y}: {e}")
+            if delay:
+                time.sleep(delay)
+    return stats
+
+
+# ========= CLI =========
+
+def parse_upstream_overrides(values) -> dict:
+    overrides = {}
+    for item in values or []:
+        layer, _, url = item.partition("=")
+        if not url:
+            raise SystemExit(f"--upstream expects layer=url, got {item!r}")
+        overrides[layer] = url
+    return overrides
+
+
+def warn_bulk_layers(upstreams: dict, layers, log=print):
+    for layer in layers:
+        if not bulk_fetch_allowed(upstreams[layer]):
+            log(f"Note: {layer} tiles come from {urlsplit(upstreams[layer]).netloc}, which does not allow bulk "
+                f"downloads; keep the area small or use --upstream {layer}=<your tile server>.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Caching proxy for OSM / OpenInfraMap raster tiles.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--max-mb", type=int, default=DEFAULT_MAX_MB, help="Evict LRU tiles above this size.")
+    parser.add_argument(
+        "--upstream", action="append", metavar="LAYER=URL",
+        help="Override an upstream URL template, e.g. osm=http://127.0.0.1:9000/{z}/{x}/{y}.png",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_serve = sub.add_parser("serve", help="Run the tile proxy.")
+    p_serve.add_argument("--host", default="127.0.0.1")
+    p_serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+
+    p_seed = sub.add_parser("seed", help="Pre-fetch tiles for a bounding box and zoom range.")
+    p_seed.add_argument("--bbox", type=float, nargs=4, required=True, metavar=("MIN_LON", "MIN_LAT", "MAX_LON", "MAX_LAT"))
+    p_seed.add_argument("--zoom", type=int, nargs=2, required=True, metavar=("MIN", "MAX"))
+    p_seed.add_argument(
+        "--layers", nargs="+", choices=list(UPSTREAMS),
+        help="Default: every layer except osm, unless osm is pointed elsewhere with --upstream.",
+    )
+    p_seed.add_argument("--delay", type=float, default=0.0, help="Seconds between upstream requests.")
+
+    args = parser.parse_args(argv)
+    store = TileStore(args.cache_dir, max_bytes=args.max_mb * 1024 * 1024)
+    upstreams = upstream_templates(parse_upstream_overrides(args.upstream))
+
+    if args.command == "serve":
+        server = make_server(store, upstreams, args.host, args.port)
+        print(f"Tile proxy on http://{args.host}:{args.port} (cache: {args.cache_dir}, {store.size / 1e6:.1f} MB)")
+        print(f"Point the apps at it with {TILE_PROXY_ENV}=http://{args.host}:{args.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+    else:
+        layers = args.layers or default_bulk_layers(upstreams)
+        warn_bulk_layers(upstreams, layers)
+        stats = seed(store, upstreams, layers, args.bbox, args.zoom[0], args.zoom[1], delay=args.delay)
+        print(f"Seeded {args.cache_dir}: {stats} ({store.size / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
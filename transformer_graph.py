@@ -0,0 +1,132 @@
+"""
+Bus / transformer topology from transformers.xlsx (bus0, bus1, voltage_bus0,
+voltage_bus1, s_nom).
+
+Buses are the nodes and transformers the edges, held as compressed sparse row
+(CSR) arrays: the buses on the other side of the transformers touching bus b
+are neighbors[indptr[b]:indptr[b + 1]]. Per-bus / per-transformer results
+(MVA per bus, connected components, voltage interface) are computed once in
+NumPy so the viewer can filter on them without walking the graph.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+VOLTAGE_TOLERANCE = 0.1   # 380 and 420 kV count as "400 kV", 225 kV as "220 kV"
+
+
+def _near(values, nominal_kv: float) -> np.ndarray:
+    return np.abs(np.asarray(values, dtype="float64") - nominal_kv) <= nominal_kv * VOLTAGE_TOLERANCE
+
+
+def _numeric(values) -> np.ndarray:
+    """float64 column; blanks and text become NaN."""
+    return pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype="float64")
+
+
+def _bus_names(values) -> pd.Series:
+    """Bus IDs as strings, with blank cells as <NA>."""
+    names = pd.Series(values).astype("string").str.strip()
+    return names.mask(names == "")
+
+
+def _per_row(per_bus: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    """per_bus[codes] as float64, NaN where a row has no bus (code -1)."""
+    out = np.full(len(codes), np.nan)
+    ok = codes >= 0
+    out[ok] = per_bus[codes[ok]]
+    return out
+
+
+class TransformerGraph:
+    """
+    Rows with a blank bus0 / bus1 are kept (same length and order as the input)
+    but are not part of the graph: their bus codes are -1 and their topology
+    columns NaN.
+    """
+
+    def __init__(self, bus0, bus1, voltage_bus0, voltage_bus1, s_nom):
+        bus0 = _bus_names(bus0)
+        bus1 = _bus_names(bus1)
+        self.rows = np.flatnonzero(bus0.notna().to_numpy() & bus1.notna().to_numpy())
+        rows = self.rows
+        bus_codes, bus_names = pd.factorize(pd.concat([bus0.iloc[rows], bus1.iloc[rows]], ignore_index=True))
+        self.bus_names = pd.Index(bus_names.astype(object))
+        n_edges = len(rows)
+        self.bus0 = np.full(len(bus0), -1, dtype="int64")
+        self.bus1 = np.full(len(bus1), -1, dtype="int64")
+        self.bus0[rows] = bus_codes[:n_edges]
+        self.bus1[rows] = bus_codes[n_edges:]
+        self.s_nom = np.nan_to_num(_numeric(s_nom))
+        self.voltage_bus0 = _numeric(voltage_bus0)
+        self.voltage_bus1 = _numeric(voltage_bus1)
+        n_bus = len(self.bus_names)
+
+        # CSR adjacency: every transformer appears once from each end
+        ends = np.concatenate([self.bus0[rows], self.bus1[rows]])
+        others = np.concatenate([self.bus1[rows], self.bus0[rows]])
+        order = np.argsort(ends, kind="stable")
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(ends, minlength=n_bus))]).astype("int64")
+        self.neighbors = others[order]
+
+        # precomputed queries
+        s_nom_edges = self.s_nom[rows]
+        self.bus_mva = np.bincount(ends, weights=np.concatenate([s_nom_edges, s_nom_edges]), minlength=n_bus)
+        self.bus_degree = np.diff(self.indptr)
+        adjacency = csr_matrix(
+            (np.ones(len(self.neighbors)), self.neighbors, self.indptr), shape=(n_bus, n_bus)
+        )
+        self.n_components, self.bus_component = connected_components(adjacency, directed=False)
+        self.component_size = np.bincount(self.bus_component, minlength=self.n_components)
+        self.component_mva = np.bincount(
+            self.bus_component[self.bus0[rows]], weights=s_nom_edges, minlength=self.n_components
+        )
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame):
+        return cls(df["bus0"], df["bus1"], df["voltage_bus0"], df["voltage_bus1"], df["s_nom"])
+
+    def __len__(self):
+        return len(self.bus0)
+
+    @property
+    def n_unconnected(self) -> int:
+        """Rows left out of the graph (blank bus0 or bus1)."""
+        return len(self.bus0) - len(self.rows)
+
+    # ------ queries ------
+
+    def interface_mask(self, high_kv: float = 400, low_kv: float = 220) -> np.ndarray:
+        """Transformers between the two voltage levels (either orientation, ±10%)."""
+        v_hi = np.maximum(self.voltage_bus0, self.voltage_bus1)
+        v_lo = np.minimum(self.voltage_bus0, self.voltage_bus1)
+        return _near(v_hi, high_kv) & _near(v_lo, low_kv)
+
+    def interfaces_in_bbox(self, lats, lons, bbox, high_kv: float = 400, low_kv: float = 220) -> np.ndarray:
+        """Row positions of high/low kV interfaces whose location (lats/lons per row) is inside bbox."""
+        min_lon, min_lat, max_lon, max_lat = bbox
+        lats = np.asarray(lats, dtype="float64")
+        lons = np.asarray(lons, dtype="float64")
+        inside = (lons >= min_lon) & (lons <= max_lon) & (lats >= min_lat) & (lats <= max_lat)
+        return np.flatnonzero(self.interface_mask(high_kv, low_kv) & inside)
+
+    def topology_table(self) -> pd.DataFrame:
+        """One row per transformer (same order as the input) with the precomputed topology columns."""
+        comp = _per_row(self.bus_component, self.bus0)
+        comp_codes = np.nan_to_num(comp, nan=-1).astype("int64")
+        v_hi = np.maximum(self.voltage_bus0, self.voltage_bus1)
+        v_lo = np.minimum(self.voltage_bus0, self.voltage_bus1)
+        return pd.DataFrame(
+            {
+                "interface": pd.Categorical(
+                    [None if np.isnan(hi) or np.isnan(lo) else f"{hi:g}/{lo:g} kV" for hi, lo in zip(v_hi, v_lo)]
+                ),
+                "bus0_mva": _per_row(self.bus_mva, self.bus0),
+                "bus1_mva": _per_row(self.bus_mva, self.bus1),
+                "component": comp,
+                "component_buses": _per_row(self.component_size, comp_codes),
+                "component_mva": _per_row(self.component_mva, comp_codes),
+            }
+        )
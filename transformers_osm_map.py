@@ -1,4 +1,7 @@
+import io
+
 import streamlit as st
+import numpy as np
 import pandas as pd
 from shapely import wkt
 from shapely.geometry import LineString
@@ -6,11 +9,23 @@ import folium
 from folium.plugins import MarkerCluster
 from streamlit_folium import st_folium
 
+from id_search import SubstringIndex
+from map_cache import bytes_version, file_version
+from tile_proxy import tile_url
+from transformer_graph import TransformerGraph
+
+TOPOLOGY_COLUMNS = ["bus0", "bus1", "voltage_bus0", "voltage_bus1", "s_nom"]
+ID_COLUMNS = ["transformer_id", "bus0", "bus1"]
+SORT_COLUMNS = ["s_nom", "voltage_bus0", "voltage_bus1"]
+PAGE_SIZES = [25, 50, 100, 250]
+# label -> (high, low) kV, matched ±10% (TransformerGraph.interface_mask)
+REGION_INTERFACES = {"400/220 kV": (400, 220), "400/132 kV": (400, 132), "220/132 kV": (220, 132)}
+LOCAL_FILE = "transformers.xlsx"
+
 # --------------------------------------------------
 # Helpers
 # --------------------------------------------------
 
-@st.cache_data
 def add_coordinates(df: pd.DataFrame) -> pd.DataFrame:
     """
     Take the dataframe with 'geometry' (and possibly 'Unnamed: 7')
@@ -58,13 +73,60 @@ def add_coordinates(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+def build_sort_orders(df: pd.DataFrame) -> dict:
+    """(ascending, descending) row orders per sortable column (stable, NaN last)."""
+    orders = {}
+    for col in SORT_COLUMNS:
+        if col in df.columns:
+            values = df[col].to_numpy(dtype="float64")
+            orders[col] = (np.argsort(values, kind="stable"), np.argsort(-values, kind="stable"))
+    return orders
+
+
+def page_positions(mask: np.ndarray, order: np.ndarray | None, page: int, page_size: int) -> np.ndarray:
+    """Row positions of one page of the masked table, in `order` (file order if None)."""
+    positions = np.flatnonzero(mask) if order is None else order[mask[order]]
+    start = (page - 1) * page_size
+    return positions[start:start + page_size]
+
+
+class TransformerTable:
+    """
+    One transformers file with everything derived from it: coordinates,
+    topology columns (interface, bus MVA, connected component), the bus graph,
+    the ID search index and the sort orders. Built once per file and shared
+    by every rerun, so a keystroke only computes masks and a page slice.
+    """
+
+    def __init__(self, df_raw: pd.DataFrame):
+        df = add_coordinates(df_raw)
+        for col in SORT_COLUMNS:   # blanks / text in numeric cells -> NaN
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors="coerce")
+        self.has_topology = all(c in df.columns for c in TOPOLOGY_COLUMNS)
+        self.graph = TransformerGraph.from_frame(df) if self.has_topology else None
+        if self.graph is not None:
+            topology = self.graph.topology_table()
+            topology.index = df.index
+            df = pd.concat([df, topology], axis=1)
+        self.df = df
+        self.id_index = SubstringIndex.from_frame(df, ID_COLUMNS)
+        self.sort_orders = build_sort_orders(df)
+
+
+@st.cache_resource(max_entries=4)
+def load_transformer_table(version: str, _data: bytes | None = None) -> TransformerTable:
+    """TransformerTable of an upload (`_data`) or of LOCAL_FILE, keyed on its version stamp only."""
+    return TransformerTable(pd.read_excel(io.BytesIO(_data) if _data is not None else LOCAL_FILE))
+
+
 def make_osm_map(df: pd.DataFrame):
     """
     Create a Folium map (OpenStreetMap) with transformer markers.
     Uses the midpoint (lon_mid, lat_mid) as the transformer location.
     """
 
-    df_valid = df.dropna(subset=["lat_mid", "lon_mid"]).copy()
+    df_valid = df.dropna(subset=["lat_mid", "lon_mid"])
     if df_valid.empty:
         st.warning("No valid coordinates found after parsing geometry.")
         return None
@@ -76,7 +138,8 @@ def make_osm_map(df: pd.DataFrame):
     m = folium.Map(
         location=[center_lat, center_lon],
         zoom_start=6,
-        tiles="OpenStreetMap",
+        tiles=tile_url("osm"),
+        attr="&copy; OpenStreetMap contributors",
     )
 
     marker_cluster = MarkerCluster().add_to(m)
@@ -125,24 +188,25 @@ uploaded_file = st.sidebar.file_uploader(
 )
 
 if uploaded_file is not None:
-    df_raw = pd.read_excel(uploaded_file)
+    data = uploaded_file.getvalue()
+    table = load_transformer_table(bytes_version(uploaded_file.name, data), data)
 else:
     # Try local file as fallback
     try:
-        df_raw = pd.read_excel("transformers.xlsx")
+        table = load_transformer_table(file_version(LOCAL_FILE))
         st.sidebar.info("Using local file: transformers.xlsx")
     except Exception:
         st.error("No file uploaded and could not find 'transformers.xlsx' locally.")
         st.stop()
 
-# Add coordinates
-df = add_coordinates(df_raw)
+df = table.df
+has_topology = table.has_topology
 
 # --- Sidebar filters ---
 st.sidebar.header("🔎 Filters")
 
 # Transformer ID search
-search_id = st.sidebar.text_input("Search Transformer ID (contains):", "")
+search_id = st.sidebar.text_input("Search Transformer / bus ID (contains):", "")
 
 # Voltage filters
 voltage_cols = [c for c in ["voltage_bus0", "voltage_bus1"] if c in df.columns]
@@ -179,33 +243,129 @@ if "s_nom" in df.columns:
 else:
     rating_slider = None
 
-# --- Apply filters ---
-df_filtered = df.copy()
+# Topology filters (precomputed from bus0/bus1)
+selected_interfaces = None
+min_bus_mva = None
+min_component_buses = None
+
+if has_topology:
+    st.sidebar.header("🕸️ Topology")
+    if table.graph.n_unconnected:
+        st.sidebar.caption(f"{table.graph.n_unconnected} transformers without bus0 / bus1 are not in the graph.")
+    interface_counts = df["interface"].value_counts()
+    selected_interfaces = st.sidebar.multiselect(
+        "Voltage interface (high/low kV):",
+        options=interface_counts.index.tolist(),
+        default=[],
+        help="Leave empty to keep all interfaces.",
+    )
+    max_bus_mva = float(df[["bus0_mva", "bus1_mva"]].max().max())
+    if max_bus_mva > 0:
+        min_bus_mva = st.sidebar.slider(
+            "Min total transformation at a connected bus (MVA):",
+            min_value=0.0,
+            max_value=max_bus_mva,
+            value=0.0,
+        )
+    max_component = int(np.nan_to_num(df["component_buses"].max()))
+    if max_component > 2:
+        min_component_buses = st.sidebar.slider(
+            "Min buses in connected group:",
+            min_value=2,
+            max_value=max_component,
+            value=2,
+        )
+
+# Region filter: a bounding box around the transformer midpoints, optionally
+# only the high/low kV interfaces inside it
+region_bbox = None
+region_interface = None
+lats_mid = pd.to_numeric(df["lat_mid"], errors="coerce").to_numpy(dtype="float64")
+lons_mid = pd.to_numeric(df["lon_mid"], errors="coerce").to_numpy(dtype="float64")
+
+st.sidebar.header("📍 Region")
+if np.isfinite(lats_mid).any() and st.sidebar.checkbox("Only transformers inside a bounding box"):
+    r1, r2 = st.sidebar.columns(2)
+    region_bbox = (
+        r1.number_input("Min lon", value=float(np.nanmin(lons_mid)), format="%.4f"),
+        r2.number_input("Min lat", value=float(np.nanmin(lats_mid)), format="%.4f"),
+        r1.number_input("Max lon", value=float(np.nanmax(lons_mid)), format="%.4f"),
+        r2.number_input("Max lat", value=float(np.nanmax(lats_mid)), format="%.4f"),
+    )
+    if has_topology:
+        interface_label = st.sidebar.selectbox(
+            "Interfaces in the region",
+            options=["All transformers"] + list(REGION_INTERFACES),
+            help="Matches nominal levels within ±10% (e.g. 380/225 kV counts as 400/220 kV).",
+        )
+        region_interface = REGION_INTERFACES.get(interface_label)
+
+# --- Apply filters (boolean masks over the cached table, no copies) ---
+mask = np.ones(len(df), dtype=bool)
 
 if search_id:
-    df_filtered = df_filtered[
-        df_filtered["transformer_id"].astype(str).str.contains(search_id, case=False, na=False)
-    ]
+    mask &= table.id_index.mask(search_id)
 
 if selected_voltages is not None and len(selected_voltages) > 0:
-    mask_voltage = False
+    mask_voltage = np.zeros(len(df), dtype=bool)
     for col in voltage_cols:
-        mask_voltage = mask_voltage | df_filtered[col].isin(selected_voltages)
-    df_filtered = df_filtered[mask_voltage]
+        mask_voltage |= df[col].isin(selected_voltages).to_numpy()
+    mask &= mask_voltage
 
-if rating_slider is not None and "s_nom" in df_filtered.columns:
-    df_filtered = df_filtered[df_filtered["s_nom"] >= rating_slider]
+if rating_slider is not None and "s_nom" in df.columns:
+    mask &= (df["s_nom"] >= rating_slider).to_numpy()
+
+if selected_interfaces:
+    mask &= df["interface"].isin(selected_interfaces).to_numpy()
+
+if min_bus_mva:
+    mask &= ((df["bus0_mva"] >= min_bus_mva) | (df["bus1_mva"] >= min_bus_mva)).to_numpy()
+
+if min_component_buses:
+    mask &= (df["component_buses"] >= min_component_buses).to_numpy()
+
+if region_bbox is not None:
+    if region_interface is not None:
+        in_region = np.zeros(len(df), dtype=bool)
+        in_region[table.graph.interfaces_in_bbox(lats_mid, lons_mid, region_bbox, *region_interface)] = True
+    else:
+        min_lon, min_lat, max_lon, max_lat = region_bbox
+        in_region = (lons_mid >= min_lon) & (lons_mid <= max_lon) & (lats_mid >= min_lat) & (lats_mid <= max_lat)
+    mask &= in_region
+
+n_filtered = int(mask.sum())
 
 st.subheader("📊 Filtered transformers")
-st.write(f"Number of transformers: **{len(df_filtered)}**")
-st.dataframe(df_filtered.head(50))  # show a preview
+st.write(f"Number of transformers: **{n_filtered}**")
+if has_topology:
+    st.write(
+        f"Connected bus groups: **{df['component'][mask].nunique()}** "
+        f"(of {table.graph.n_components} in the file)"
+    )
 
-# --- Map ---
+# --- Paginated table (slices of the cached table, sorted by precomputed orders) ---
+sort_orders = table.sort_orders
+c1, c2, c3, c4 = st.columns(4)
+sort_col = c1.selectbox("Sort by", options=["(file order)"] + list(sort_orders))
+descending = c2.checkbox("Descending", value=True)
+page_size = c3.selectbox("Rows per page", options=PAGE_SIZES, index=1)
+n_pages = max(1, -(-n_filtered // page_size))
+if st.session_state.get("page", 1) > n_pages:
+    st.session_state["page"] = n_pages   # filters shrank the table
+page = int(c4.number_input(f"Page (1–{n_pages})", min_value=1, max_value=n_pages, step=1, key="page"))
+
+order = sort_orders[sort_col][1 if descending else 0] if sort_col in sort_orders else None
+positions = page_positions(mask, order, page, page_size)
+df_page = df.iloc[positions]
+st.dataframe(df_page)
+
+# --- Map (current page only) ---
 st.subheader("🗺️ Map (OpenStreetMap)")
+st.caption(f"Showing the {len(df_page)} transformers of page {page}.")
 
-if df_filtered.empty:
+if df_page.empty:
     st.warning("No transformers match the current filters.")
 else:
-    m = make_osm_map(df_filtered)
+    m = make_osm_map(df_page)
     if m is not None:
         st_folium(m, width="100%", height=600)